@@ -1,17 +1,102 @@
 import os
 import json
-import psycopg2
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Any, List
 from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from db import PG_CONFIG
 
 # Load environment variables
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
 
-app = FastAPI(title="IPECD Analytics API")
+# Async pool for the write path (bounded; the batch writer only needs one connection at a time)
+LOG_POOL_MIN_SIZE = 1
+LOG_POOL_MAX_SIZE = int(os.getenv('API_DB_POOL_SIZE', 4))
+LOG_POOL_TIMEOUT = 10.0
+
+# Write-behind queue: events are accepted immediately (202) and written in batches of
+# up to LOG_BATCH_SIZE rows, at most LOG_FLUSH_MS after the first event of the batch arrived.
+# When LOG_QUEUE_MAX events are pending, new ones get a 503 with Retry-After.
+LOG_BATCH_SIZE = int(os.getenv('API_LOG_BATCH_SIZE', 200))
+LOG_FLUSH_MS = int(os.getenv('API_LOG_FLUSH_MS', 1000))
+LOG_QUEUE_MAX = int(os.getenv('API_LOG_QUEUE_MAX', 10000))
+# Maximum number of events accepted in one /api/log/batch request
+LOG_REQUEST_MAX_EVENTS = 100
+RETRY_AFTER_SECONDS = 5
+
+COPY_LOG_QUERY = """
+    COPY public.coparticipacion_registros
+    (id_usuario, seccion_tablero, accion, detalle_interaccion, ip_cliente)
+    FROM STDIN
+"""
+
+async def write_log_batch(pool, rows):
+    """Writes a batch of event rows with a single COPY (one round trip, one commit)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(COPY_LOG_QUERY) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+
+async def log_writer(app):
+    """
+    Drains the event queue, flushing every LOG_BATCH_SIZE events or LOG_FLUSH_MS milliseconds.
+    A None in the queue asks the writer to flush what it has and stop.
+    Failed batches are reported and dropped; telemetry never blocks the dashboard.
+    """
+    queue = app.state.log_queue
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        row = await queue.get()
+        if row is None:
+            break
+        batch = [row]
+        deadline = loop.time() + LOG_FLUSH_MS / 1000
+        while len(batch) < LOG_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                row = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                stopping = True
+                break
+            batch.append(row)
+        try:
+            await write_log_batch(app.state.pg_pool, batch)
+        except Exception as e:
+            print(f"Error inserting {len(batch)} logs: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Opened without waiting so the API starts even if the database is momentarily down
+    conninfo = make_conninfo(**{k: v for k, v in PG_CONFIG.items() if v is not None})
+    app.state.pg_pool = AsyncConnectionPool(
+        conninfo,
+        min_size=LOG_POOL_MIN_SIZE,
+        max_size=LOG_POOL_MAX_SIZE,
+        timeout=LOG_POOL_TIMEOUT,
+        open=False
+    )
+    await app.state.pg_pool.open()
+    app.state.log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAX)
+    writer = asyncio.create_task(log_writer(app))
+    yield
+    # Flush pending events before closing the pool
+    await app.state.log_queue.put(None)
+    await writer
+    await app.state.pg_pool.close()
+
+app = FastAPI(title="IPECD Analytics API", lifespan=lifespan)
 
 # Enable CORS so the static frontend can call this API
 app.add_middleware(
@@ -19,6 +104,7 @@ app.add_middleware(
     allow_origins=["*"], # In production, restrict this to your domain
     allow_methods=["POST"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 class AnalyticsLog(BaseModel):
@@ -27,50 +113,38 @@ class AnalyticsLog(BaseModel):
     accion: str
     detalle_interaccion: Optional[dict] = {}
 
-def get_pg_connection():
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('PG_HOST'),
-            port=os.getenv('PG_PORT'),
-            user=os.getenv('PG_USER'),
-            password=os.getenv('PG_PASSWORD'),
-            database=os.getenv('PG_DATABASE')
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+class AnalyticsLogBatch(BaseModel):
+    eventos: List[AnalyticsLog] = Field(..., max_length=LOG_REQUEST_MAX_EVENTS)
 
-@app.post("/api/log")
-async def log_activity(log: AnalyticsLog, request: Request):
+def enqueue_logs(request: Request, logs):
+    """Queues the events for the batch writer, or answers 503 if the queue has no room for all of them."""
+    queue = request.app.state.log_queue
+    if queue.maxsize - queue.qsize() < len(logs):
+        print(f"Log queue saturated ({queue.qsize()} pending)")
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics queue full",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
     client_ip = request.client.host
-    
-    conn = get_pg_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    try:
-        cur = conn.cursor()
-        query = """
-            INSERT INTO public.coparticipacion_registros 
-            (id_usuario, seccion_tablero, accion, detalle_interaccion, ip_cliente)
-            VALUES (%s, %s, %s, %s, %s);
-        """
-        cur.execute(query, (
+    for log in logs:
+        queue.put_nowait((
             log.id_usuario,
             log.seccion_tablero,
             log.accion,
             json.dumps(log.detalle_interaccion),
             client_ip
         ))
-        conn.commit()
-        return {"status": "success", "message": "Activity logged"}
-    except Exception as e:
-        print(f"Error inserting log: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
+
+@app.post("/api/log", status_code=202)
+async def log_activity(log: AnalyticsLog, request: Request):
+    enqueue_logs(request, [log])
+    return {"status": "accepted", "message": "Activity queued"}
+
+@app.post("/api/log/batch", status_code=202)
+async def log_activity_batch(batch: AnalyticsLogBatch, request: Request):
+    enqueue_logs(request, batch.eventos)
+    return {"status": "accepted", "message": f"{len(batch.eventos)} activities queued"}
 
 if __name__ == "__main__":
     import uvicorn
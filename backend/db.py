@@ -0,0 +1,278 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import mysql.connector
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Seconds a single ETL query may run before the driver gives up: statement_timeout on
+# PostgreSQL, socket read_timeout on MySQL. This is what actually ends a hung call inside a
+# fetch worker; run_fetch_stage's ETL_FETCH_TIMEOUT only stops waiting for it.
+QUERY_TIMEOUT = int(os.getenv('DB_QUERY_TIMEOUT', os.getenv('ETL_FETCH_TIMEOUT', 600)))
+
+# MySQL (plantilla_personal_provincia, ripte)
+DB_CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'host': os.getenv('DB_HOST'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_DATABASE'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'connect_timeout': 20,
+    'read_timeout': QUERY_TIMEOUT
+}
+
+# PostgreSQL (copa_* tables, usuarios_tableros, coparticipacion_registros)
+PG_CONFIG = {
+    'host': os.getenv('PG_HOST'),
+    'port': os.getenv('PG_PORT'),
+    'user': os.getenv('PG_USER'),
+    'password': os.getenv('PG_PASSWORD'),
+    'dbname': os.getenv('PG_DATABASE'),
+    'connect_timeout': 20
+}
+
+# PostgreSQL, same server: IPC and REM series
+PG_IPC_CONFIG = dict(PG_CONFIG, dbname='datalake_economico')
+
+# Applied to the ETL pools only (api_analytics builds its own connections from PG_CONFIG)
+PG_ETL_OPTIONS = f'-c statement_timeout={QUERY_TIMEOUT * 1000}'
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+# Seconds to wait for a free connection when the pool is exhausted
+POOL_TIMEOUT = 120
+MAX_RETRIES = 3
+# Rows per fetchmany() batch in read_mysql
+MYSQL_BATCH_SIZE = int(os.getenv('MYSQL_BATCH_SIZE', 20000))
+# First retry waits RETRY_DELAY seconds, doubling on every attempt
+RETRY_DELAY = 5
+
+
+def connect_with_retry(connect, label, max_retries=MAX_RETRIES, delay=RETRY_DELAY):
+    """
+    Opens a connection with `connect()`, retrying with exponential backoff on failure.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            return connect()
+        except (mysql.connector.Error, psycopg2.OperationalError) as e:
+            print(f"  [{label}] Connection attempt {attempt} failed: {e}")
+            if attempt == max_retries:
+                print(f"  [{label}] Max retries reached.")
+                raise
+            wait = delay * 2 ** (attempt - 1)
+            print(f"  [{label}] Retrying in {wait} seconds...")
+            time.sleep(wait)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool that opens connections lazily (only when every idle one is in use)
+    up to `max_size`, and reuses them across checkouts.
+    """
+
+    def __init__(self, label, connect, is_alive, max_size=POOL_SIZE):
+        self.label = label
+        self._connect = connect
+        self._is_alive = is_alive
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self, timeout=POOL_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"[{self.label}] No hay conexiones libres tras {timeout}s")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return connect_with_retry(self._connect, self.label)
+                if self._is_alive(conn):
+                    return conn
+                _close_quietly(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        try:
+            if discard or not self._is_alive(conn):
+                _close_quietly(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _mysql_alive(conn):
+    try:
+        return conn.is_connected()
+    except Exception:
+        return False
+
+
+def _pg_alive(conn):
+    return conn.closed == 0
+
+
+def _reset(conn):
+    """Leaves no open transaction behind before the connection goes back to the pool."""
+    if isinstance(conn, psycopg2.extensions.connection):
+        if conn.status != psycopg2.extensions.STATUS_READY:
+            conn.rollback()
+    elif getattr(conn, 'in_transaction', False):
+        conn.rollback()
+
+
+_POOL_FACTORIES = {
+    'mysql': lambda: ConnectionPool('mysql', lambda: mysql.connector.connect(**DB_CONFIG), _mysql_alive),
+    'pg': lambda: ConnectionPool('pg', lambda: psycopg2.connect(**PG_CONFIG, options=PG_ETL_OPTIONS), _pg_alive),
+    'pg_ipc': lambda: ConnectionPool('pg_ipc', lambda: psycopg2.connect(**PG_IPC_CONFIG, options=PG_ETL_OPTIONS), _pg_alive),
+}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """
+    Returns the pool for `name` ('mysql', 'pg' or 'pg_ipc'), creating it on first use.
+    """
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = _POOL_FACTORIES[name]()
+        return _pools[name]
+
+
+@contextmanager
+def connection(name):
+    """
+    Checks a connection out of the `name` pool for the duration of the block.
+    Open transactions are rolled back on exit; broken connections are discarded.
+    """
+    pool = get_pool(name)
+    conn = pool.acquire()
+    discard = False
+    try:
+        yield conn
+    finally:
+        try:
+            _reset(conn)
+        except Exception:
+            discard = True
+        pool.release(conn, discard=discard)
+
+
+def mysql_connection():
+    return connection('mysql')
+
+
+def pg_connection():
+    return connection('pg')
+
+
+def pg_ipc_connection():
+    return connection('pg_ipc')
+
+
+def _typed_batch(rows, columns, dtypes, categories):
+    """
+    Converts a batch of row tuples into {column: np.ndarray}. Numeric dtypes are cast directly
+    (NULL becomes NaN for floats); 'category' columns become int32 codes into the running
+    `categories` dictionaries (-1 for NULL); columns without a dtype stay object.
+    """
+    out = {}
+    for name, values in zip(columns, zip(*rows)):
+        dtype = dtypes.get(name)
+        if dtype == 'category':
+            lookup = categories.setdefault(name, {})
+            out[name] = np.fromiter(
+                (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values),
+                dtype=np.int32, count=len(values)
+            )
+        elif dtype is None:
+            out[name] = np.array(values, dtype=object)
+        else:
+            out[name] = np.array(values, dtype=float).astype(dtype)
+    return out
+
+
+def _batch_frame(arrays, columns, dtypes, categories):
+    frame = {}
+    for name in columns:
+        if dtypes.get(name) == 'category':
+            # Categories sorted, as astype('category') leaves them
+            cat = pd.Categorical.from_codes(arrays[name], categories=list(categories.get(name, {})))
+            frame[name] = cat.reorder_categories(cat.categories.sort_values())
+        else:
+            frame[name] = arrays[name]
+    return pd.DataFrame(frame, columns=columns)
+
+
+def read_mysql(query, dtypes, params=None, batch_size=MYSQL_BATCH_SIZE, fold=None):
+    """
+    Runs `query` on MySQL with an unbuffered cursor and reads it in fetchmany() batches, so
+    only one batch of Python tuples is alive at a time. Columns are typed as they arrive with
+    `dtypes` ({column: 'int16' | 'float64' | 'category' | ...}).
+    
+    Without `fold`, returns the whole result as one typed DataFrame. With `fold`, calls
+    fold(acc, batch_df) for every batch (acc starts as None) and returns the final acc, so a
+    running aggregate never materializes the rows.
+    """
+    categories = {}
+    parts = []
+    acc = None
+    with mysql_connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                arrays = _typed_batch(rows, columns, dtypes, categories)
+                del rows
+                if fold is None:
+                    parts.append(arrays)
+                else:
+                    acc = fold(acc, _batch_frame(arrays, columns, dtypes, categories))
+        finally:
+            cursor.close()
+    
+    if fold is not None:
+        return acc
+    if parts:
+        arrays = {name: np.concatenate([part[name] for part in parts]) for name in columns}
+    else:
+        arrays = {name: np.empty(0, dtype=np.int32 if dtypes.get(name) == 'category' else dtypes.get(name, object))
+                  for name in columns}
+    del parts
+    return _batch_frame(arrays, columns, dtypes, categories)
+
+
+@atexit.register
+def close_all():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
@@ -0,0 +1,260 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from db import pg_ipc_connection
+
+# IPC Nación (region 1, general level) extended with the latest REM survey, shared by
+# etl_main and etl_personal. Loaded once per process; the series is also kept in a Parquet
+# file that is reused while younger than IPC_CACHE_MAX_AGE (etl_personal runs right after
+# etl_main) and as a fallback when datalake_economico cannot be reached.
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', '.cache')
+IPC_CACHE_PATH = os.path.join(CACHE_DIR, 'ipc_deflator.parquet')
+IPC_CACHE_MAX_AGE = int(os.getenv('IPC_CACHE_MAX_AGE', 6 * 3600))
+
+IPC_QUERY = """
+SELECT
+    EXTRACT(YEAR FROM fecha)::int AS year,
+    EXTRACT(MONTH FROM fecha)::int AS month,
+    valor AS ipc_valor,
+    var_mensual AS ipc_var_mensual
+FROM ipc
+WHERE id_region = 1 AND id_categoria = 1 AND id_division = 1
+ORDER BY fecha
+"""
+
+REM_QUERY = """
+SELECT fecha, mediana
+FROM rem_precios_minoristas
+WHERE fecha_consulta = (SELECT MAX(fecha_consulta) FROM rem_precios_minoristas)
+ORDER BY fecha ASC
+"""
+
+SERIES_COLUMNS = ['year', 'month', 'ipc_valor', 'ipc_var_mensual', 'proyectado']
+
+_deflator = None
+_deflator_lock = threading.Lock()
+
+
+def _period(year, month):
+    """Months since year 0: consecutive periods are consecutive integers."""
+    return np.asarray(year, dtype=np.int64) * 12 + np.asarray(month, dtype=np.int64) - 1
+
+
+class Deflator:
+    """
+    Monthly IPC index held in NumPy arrays indexed by period, so every lookup is O(1).
+    Accessors take scalars or arrays of years/months and return NaN where the index is
+    missing (or zero, for ratios).
+    """
+
+    def __init__(self, first_period, values, var_mensual=None, projected=None):
+        self.first_period = int(first_period)
+        self.values = np.asarray(values, dtype=float)
+        n = len(self.values)
+        self.var_mensual = np.full(n, np.nan) if var_mensual is None else np.asarray(var_mensual, dtype=float)
+        self.projected = np.zeros(n, dtype=bool) if projected is None else np.asarray(projected, dtype=bool)
+
+    @classmethod
+    def from_frame(cls, df, year_col='year', month_col='month'):
+        """
+        Builds the deflator from a frame with ipc_valor (and optionally ipc_var_mensual and
+        proyectado) by period. Gaps become NaN; for repeated periods the first row is kept.
+        """
+        if df is None or df.empty:
+            return cls(0, [])
+        periods = _period(df[year_col].astype(int), df[month_col].astype(int))
+        first = periods.min()
+        # Reversed so that, for a repeated period, the first row is the one that stays
+        pos = (periods - first)[::-1]
+        n = periods.max() - first + 1
+
+        def spread(col):
+            out = np.full(n, np.nan)
+            if col in df.columns:
+                out[pos] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)[::-1]
+            return out
+
+        projected = np.zeros(n, dtype=bool)
+        if 'proyectado' in df.columns:
+            projected[pos] = df['proyectado'].fillna(False).to_numpy(dtype=bool)[::-1]
+        return cls(first, spread('ipc_valor'), spread('ipc_var_mensual'), projected)
+
+    def _take(self, arr, year, month, fill=np.nan):
+        pos = _period(year, month) - self.first_period
+        valid = (pos >= 0) & (pos < len(arr))
+        if not len(arr):
+            out = np.full(np.shape(pos), fill)
+        else:
+            out = np.where(valid, arr[np.clip(pos, 0, len(arr) - 1)], fill)
+        return out if out.ndim else out.item()
+
+    def index(self, year, month):
+        """IPC index of (year, month)."""
+        return self._take(self.values, year, month)
+
+    def yoy_factor(self, year, month):
+        """index(year, month) / index(year - 1, month): 1 + year-over-year inflation."""
+        curr = np.asarray(self.index(year, month), dtype=float)
+        prev = np.asarray(self.index(np.asarray(year) - 1, month), dtype=float)
+        ok = ~np.isnan(curr) & ~np.isnan(prev) & (curr != 0) & (prev != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = np.where(ok, curr / prev, np.nan)
+        return out if out.ndim else out.item()
+
+    def to_base(self, year, month, base):
+        """Factor that expresses pesos of (year, month) in pesos of `base` = (year, month)."""
+        base_val = self.index(*base)
+        curr = np.asarray(self.index(year, month), dtype=float)
+        ok = ~np.isnan(curr) & (curr != 0) & (not np.isnan(base_val)) & (base_val != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = np.where(ok, base_val / curr, np.nan)
+        return out if out.ndim else out.item()
+
+    def first_available(self):
+        """(year, month) of the first period with an index value, or None."""
+        known = np.flatnonzero(~np.isnan(self.values))
+        if not len(known):
+            return None
+        year, month = divmod(int(known[0]) + self.first_period, 12)
+        return (year, month + 1)
+
+    def since(self, year):
+        """The same series restricted to periods from January `year` onwards."""
+        start = max(int(_period(year, 1)) - self.first_period, 0)
+        return Deflator(self.first_period + start, self.values[start:], self.var_mensual[start:], self.projected[start:])
+
+    def extend(self, projections):
+        """
+        Extends the series after its last value with the monthly variations in `projections`
+        ({(year, month): decimal}), compounding them with a cumulative product. Only the run
+        of consecutive months right after the last value is used.
+        """
+        known = np.flatnonzero(~np.isnan(self.values))
+        if not len(known) or not projections:
+            return self
+        last = known[-1]
+        start = self.first_period + last + 1
+
+        items = sorted((int(_period(y, m)) - start, rate) for (y, m), rate in projections.items())
+        offsets = np.array([o for o, _ in items])
+        rates = np.array([r for _, r in items], dtype=float)
+        rates = rates[offsets >= 0]
+        offsets = offsets[offsets >= 0]
+        # Consecutive months from `start` have offsets 0, 1, 2, ...
+        consecutive = offsets == np.arange(len(offsets))
+        run = len(offsets) if consecutive.all() else int(consecutive.argmin())
+        if run == 0:
+            return self
+        rates = rates[:run]
+
+        return Deflator(
+            self.first_period,
+            np.concatenate([self.values[:last + 1], self.values[last] * np.cumprod(1 + rates)]),
+            np.concatenate([self.var_mensual[:last + 1], rates]),
+            np.concatenate([self.projected[:last + 1], np.ones(run, dtype=bool)])
+        )
+
+    def to_frame(self, year_col='year', month_col='month'):
+        """Periods with an index value as a frame (SERIES_COLUMNS, with the given year/month names)."""
+        pos = np.flatnonzero(~np.isnan(self.values))
+        years, months = np.divmod(pos + self.first_period, 12)
+        return pd.DataFrame({
+            year_col: years.astype(int),
+            month_col: (months + 1).astype(int),
+            'ipc_valor': self.values[pos],
+            'ipc_var_mensual': self.var_mensual[pos],
+            'proyectado': self.projected[pos]
+        })
+
+
+def fetch_rem_projections(conn=None):
+    """
+    Fetch REM (Relevamiento de Expectativas de Mercado) monthly CPI projections from PostgreSQL.
+
+    Data Source: datalake_economico.rem_precios_minoristas
+    Uses the latest survey (max fecha_consulta) which typically contains 6-7 months
+    of projections (1-2 backward, 4-5 forward).
+
+    Returns:
+        dict: {(year, month): decimal_variation} e.g. {(2026, 3): 0.027} for 2.7%
+    """
+    if conn is None:
+        with pg_ipc_connection() as conn:
+            return fetch_rem_projections(conn)
+    try:
+        df = pd.read_sql(REM_QUERY, conn)
+        fechas = pd.to_datetime(df['fecha'])
+        # mediana comes as percentage (e.g. 2.7 for 2.7%), convert to decimal
+        rates = pd.to_numeric(df['mediana'], errors='coerce').to_numpy(dtype=float) / 100
+        projections = dict(zip(zip(fechas.dt.year.tolist(), fechas.dt.month.tolist()), rates.tolist()))
+        print(f"  REM: Loaded {len(projections)} monthly projections from latest survey")
+        return projections
+    except Exception as e:
+        print(f"  WARNING: Could not fetch REM projections: {e}")
+        return {}
+
+
+def _read_database():
+    with pg_ipc_connection() as conn:
+        df = pd.read_sql(IPC_QUERY, conn)
+        rem_projections = fetch_rem_projections(conn)
+    deflator = Deflator.from_frame(df)
+    if not len(deflator.values):
+        return deflator
+
+    official = deflator.to_frame()
+    last = official.iloc[-1]
+    print(f"  IPC: Last official data: {int(last['year'])}-{int(last['month']):02d} (valor={last['ipc_valor']:.2f})")
+    deflator = deflator.extend(rem_projections)
+    for row in deflator.to_frame().iloc[len(official):].itertuples():
+        print(f"  IPC: Projected {row.year}-{row.month:02d} with REM {row.ipc_var_mensual*100:.1f}% -> {row.ipc_valor:.2f}")
+    return deflator
+
+
+def _load_cache(max_age):
+    try:
+        age = time.time() - os.path.getmtime(IPC_CACHE_PATH)
+    except OSError:
+        return None
+    if max_age is not None and age > max_age:
+        return None
+    try:
+        df = pd.read_parquet(IPC_CACHE_PATH)
+        print(f"  [ipc] Usando serie IPC + REM de hace {age / 60:.0f} min")
+        return Deflator.from_frame(df[SERIES_COLUMNS])
+    except Exception as e:
+        print(f"  [ipc] WARNING: No se pudo leer {IPC_CACHE_PATH}: {e}")
+        return None
+
+
+def _save_cache(deflator):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        deflator.to_frame().to_parquet(IPC_CACHE_PATH, index=False)
+    except Exception as e:
+        print(f"  [ipc] WARNING: No se pudo escribir {IPC_CACHE_PATH}: {e}")
+
+
+def load_deflator(refresh=False):
+    """
+    Returns the shared Deflator (IPC Nación + REM projections). Thread-safe; read from
+    datalake_economico at most once per process. If the database fails, the last cached
+    series is used whatever its age.
+    """
+    global _deflator
+    with _deflator_lock:
+        if _deflator is None or refresh:
+            deflator = None if refresh else _load_cache(IPC_CACHE_MAX_AGE)
+            if deflator is None:
+                try:
+                    deflator = _read_database()
+                    _save_cache(deflator)
+                except Exception as e:
+                    deflator = _load_cache(None)
+                    if deflator is None:
+                        raise
+                    print(f"  [ipc] WARNING: No se pudo leer IPC/REM ({e}); se usa la última serie guardada")
+            _deflator = deflator
+        return _deflator
@@ -1,16 +1,24 @@
 import os
-import json
+import time
 import calendar
-import mysql.connector
-import psycopg2
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 from dotenv import load_dotenv
+from db import pg_connection
+from plantilla import load_payroll, payroll_by_period
+from deflator import Deflator, load_deflator
+from json_output import write_json, remove_json, update_manifest
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+# Extract stage: worker threads and maximum seconds per source. The limit makes the run fail
+# fast; the calls themselves are bounded by the driver timeouts (db.QUERY_TIMEOUT, requests timeout=)
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = int(os.getenv('ETL_FETCH_TIMEOUT', 600))
+
 def find_column(df, patterns):
     """
     Finds a column in a DataFrame that matches any of the given patterns (lowercase).
@@ -31,94 +39,102 @@ def find_column(df, patterns):
     return None
 
 
-# DB Configuration from Environment Variables (Fix 1-C: Remove hardcoded defaults)
-DB_CONFIG = {
-    'user': os.getenv('DB_USER'),
-    'host': os.getenv('DB_HOST'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_DATABASE'),
-    'port': int(os.getenv('DB_PORT', 3306)),
-    'connect_timeout': 20
-}
-
-def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+# Columns of copa_recursos_origen_nacional used by the ETL: (ordinal position, column name, label).
+# Columns are resolved by name; the ordinal position (1-based, as in information_schema) is the
+# fallback if a name ever changes.
+# Full layout: 1: fecha, 2: cfi_neta_ley_26075, 3: financ_educativo_ley_26075, 4: subtotal,
+# 5: transf_servicios_educacion, 6: transf_servicios_posoco, 7: transf_servicios_prosonu,
+# 8: transf_servicios_hospitales, 9: transf_servicios_minoridad, 10: transf_servicios_total,
+# 11: imp_bienes_personales_ley_24699, 12: imp_bienes_personales_ley_23966, 13: imp_activos_fdo_educativo,
+# 14: iva_ley_23966, 15: imp_combustibles_infraestructura, 16: imp_combustibles_vialidad,
+# 17: imp_combustibles_fonavi, 18: fondo_compensador_deseq_fisc, 19: reg_simplif_monotributo,
+# 20: total_recursos_origen_nacional, 21: compensacion_consenso_fiscal, 22: total_general, 23: punto_estadistico
+RON_TABLE = 'copa_recursos_origen_nacional'
+RON_COLUMNS = [
+    (1, 'fecha', 'Fecha'),
+    (2, 'cfi_neta_ley_26075', 'CFI (Neta de Ley 26075)'),
+    (3, 'financ_educativo_ley_26075', 'Financ. Educativo (Ley 26075)'),
+    (12, 'imp_bienes_personales_ley_23966', 'Imp. Bienes Personales (Ley 23.966 Art. 30)'),
+    (14, 'iva_ley_23966', 'I.V.A. (Ley 23.966 Art. 5 Pto. 2)'),
+    (16, 'imp_combustibles_vialidad', 'Imp. Combustibles (Ley N.23966 Vialidad Provincial)'),
+    (17, 'imp_combustibles_fonavi', 'Imp. Combustibles (FO.NA.VI.)'),
+    (19, 'reg_simplif_monotributo', 'Reg.Simplif. p/Pequenos Contribuyentes (Ley N.24.977)'),
+    (21, 'compensacion_consenso_fiscal', 'Compensacion Consenso Fiscal (2)'),
+    (22, 'total_general', 'Total - (1)+(2)'),
+    (23, 'punto_estadistico', 'Punto Estadistico')
+]
+DATE_TYPES = ('date', 'timestamp without time zone', 'timestamp with time zone')
 
-def get_pg_connection():
-    return psycopg2.connect(
-        host=os.getenv("PG_HOST"),
-        port=os.getenv("PG_PORT"),
-        user=os.getenv("PG_USER"),
-        password=os.getenv("PG_PASSWORD"),
-        dbname=os.getenv("PG_DATABASE")
-    )
+# Local cache of derived daily RON rows (incremental extract)
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', '.cache')
+RON_CACHE_PATH = os.path.join(CACHE_DIR, 'ron_daily.parquet')
+RON_CACHE_COLUMNS = ['fecha', 'recaudacion', 'recaudacion_bruta', 'recaudacion_neta', 'distribucion_municipal']
+# Days before the cache watermark that are re-read on every run to pick up late corrections
+RON_REFRESH_DAYS = 15
 
-def get_pg_ipc_connection():
-    return psycopg2.connect(
-        host=os.getenv("PG_HOST"),
-        port=os.getenv("PG_PORT"),
-        user=os.getenv("PG_USER"),
-        password=os.getenv("PG_PASSWORD"),
-        dbname="datalake_economico"
-    )
+_ron_columns_cache = {}
 
-def fetch_coparticipacion_daily():
+def resolve_ron_columns(conn):
     """
-    Fetches daily coparticipation data for Current and Previous Year.
+    Resolves the physical columns (name and type) of copa_recursos_origen_nacional from information_schema.
+    The lookup runs only once per process.
     
-    Data Source: PostgreSQL database 'copa_recursos_origen_nacional'.
-    Metric: CFI (Neta de Ley 26075) + Reg.Simplif. p/Pequenos Contribuyentes (Ley N.24.977) + Compensacion Consenso Fiscal (2).
+    Returns:
+        dict: {label: (column_name, data_type)} for every entry in RON_COLUMNS.
+    """
+    if not _ron_columns_cache:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_name = %s AND table_schema = current_schema()
+                ORDER BY ordinal_position
+            """, (RON_TABLE,))
+            table_columns = cursor.fetchall()
+        finally:
+            cursor.close()
+            
+        types_by_name = dict(table_columns)
+        for position, name, label in RON_COLUMNS:
+            if name in types_by_name:
+                _ron_columns_cache[label] = (name, types_by_name[name])
+            elif position <= len(table_columns):
+                print(f"  [ron] WARNING: Columna '{name}' no encontrada, usando posición {position} ({table_columns[position - 1][0]})")
+                _ron_columns_cache[label] = table_columns[position - 1]
+            else:
+                _ron_columns_cache.clear()
+                raise ValueError(f"{RON_TABLE}: no se encontró la columna '{name}' (posición {position})")
+    return _ron_columns_cache
+
+def build_ron_query(columns, since=None):
+    """
+    Builds the SELECT for copa_recursos_origen_nacional projecting only the resolved columns.
+    If `since` is given and the date column is a real date type, a `fecha >= since` window is
+    pushed to the database (text dates are left to the pandas filter).
     
     Returns:
-        pd.DataFrame: A dataframe containing 'fecha', 'recaudacion' (Net), 'recaudacion_bruta' (Gross), and parsed date parts.
+        tuple: (query, params) ready for pd.read_sql.
     """
-    conn = get_pg_connection()
-    try:
-        # Load data from PostgreSQL
-        query = "SELECT * FROM copa_recursos_origen_nacional"
-        df_raw = pd.read_sql(query, conn)
-        
-        # Mapping by POSITION based on CSV structure
-        # CSV order: Fecha, CFI (Neta), Financ. Educativo, SUBTOTAL, Transf. Serv..., 
-        # Imp. B. Personales (24699), Imp. B. Personales (23966), Imp. s/ Activos...,
-        # I.V.A (23966), Imp. Combustibles (Vialidad), Imp. Combustibles (FONAVI), ...
-        
-        # Column names from search result:
-        # 0: fecha, 1: cfi_neta_ley_26075, 2: financ_educativo_ley_26075, 3: subtotal, 
-        # 4: transf_servicios_educacion, 5: transf_servicios_posoco, 6: transf_servicios_prosonu, 
-        # 7: transf_servicios_hospitales, 8: transf_servicios_minoridad, 9: transf_servicios_total, 
-        # 10: imp_bienes_personales_ley_24699, 11: imp_bienes_personales_ley_23966, 12: imp_activos_fdo_educativo, 
-        # 13: iva_ley_23966, 14: imp_combustibles_infraestructura, 15: imp_combustibles_vialidad, 
-        # 16: imp_combustibles_fonavi, 17: fondo_compensador_deseq_fisc, 18: reg_simplif_monotributo, 
-        # 19: total_recursos_origen_nacional, 20: compensacion_consenso_fiscal, 21: total_general, 22: punto_estadistico
-        
-        col_mapping = {
-            df_raw.columns[0]: 'Fecha',
-            df_raw.columns[1]: 'CFI (Neta de Ley 26075)',
-            df_raw.columns[2]: 'Financ. Educativo (Ley 26075)',
-            df_raw.columns[11]: 'Imp. Bienes Personales (Ley 23.966 Art. 30)', # Index 11 is ley 23966
-            df_raw.columns[13]: 'I.V.A. (Ley 23.966 Art. 5 Pto. 2)',
-            df_raw.columns[15]: 'Imp. Combustibles (Ley N.23966 Vialidad Provincial)',
-            df_raw.columns[16]: 'Imp. Combustibles (FO.NA.VI.)',
-            df_raw.columns[18]: 'Reg.Simplif. p/Pequenos Contribuyentes (Ley N.24.977)',
-            df_raw.columns[20]: 'Compensacion Consenso Fiscal (2)',
-            df_raw.columns[21]: 'Total - (1)+(2)',
-            df_raw.columns[22]: 'Punto Estadistico'
-        }
-        
-        df = df_raw.rename(columns=col_mapping).copy()
+    select_cols = ", ".join(f'"{name}"' for name, _ in columns.values())
+    query = f"SELECT {select_cols} FROM {RON_TABLE}"
+    params = None
+    
+    date_col, date_type = columns['Fecha']
+    if since is not None and date_type in DATE_TYPES:
+        query += f' WHERE "{date_col}" >= %s'
+        params = (since,)
         
-    finally:
-        conn.close()
+    return query, params
 
-    # Parse dates
-    df['fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
-    
-    # Filter for last 5 years
-    current_year = datetime.now().year
-    mask = (df['fecha'].dt.year >= current_year - 4)
-    df = df.loc[mask].copy()
+def derive_ron_measures(df):
+    """
+    Derives the RON measures (Bruta, Neta, Distribucion Municipal, Disponible) from the raw
+    copa_recursos_origen_nacional columns (already renamed to their RON_COLUMNS labels).
     
+    Returns:
+        pd.DataFrame: Columns RON_CACHE_COLUMNS, one row per day.
+    """
     # Ensure numeric columns
     cols_to_parse = [
         'CFI (Neta de Ley 26075)', 
@@ -157,8 +173,80 @@ def fetch_coparticipacion_daily():
     # Coparticipacion Disponible (RON Disponible)
     df['recaudacion'] = df['recaudacion_neta'] - df['distribucion_municipal']
     
+    return df[RON_CACHE_COLUMNS]
+
+def load_ron_cache():
+    """
+    Loads the local cache of derived daily RON rows, or None if it is missing or unreadable.
+    """
+    if not os.path.exists(RON_CACHE_PATH):
+        return None
+    try:
+        df_cache = pd.read_parquet(RON_CACHE_PATH)
+        df_cache['fecha'] = pd.to_datetime(df_cache['fecha'])
+        return df_cache[RON_CACHE_COLUMNS]
+    except Exception as e:
+        print(f"  [ron] WARNING: No se pudo leer la caché {RON_CACHE_PATH}: {e}. Se hará una carga completa.")
+        return None
+
+def save_ron_cache(df):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df[RON_CACHE_COLUMNS].to_parquet(RON_CACHE_PATH, index=False)
+    except Exception as e:
+        print(f"  [ron] WARNING: No se pudo escribir la caché {RON_CACHE_PATH}: {e}")
+
+def fetch_coparticipacion_daily(full_refresh=False):
+    """
+    Fetches daily coparticipation data for Current and Previous Year.
+    
+    Data Source: PostgreSQL database 'copa_recursos_origen_nacional'.
+    Metric: CFI (Neta de Ley 26075) + Reg.Simplif. p/Pequenos Contribuyentes (Ley N.24.977) + Compensacion Consenso Fiscal (2).
+    Only the columns in RON_COLUMNS and the last 5 years are read from the database.
+    
+    Incremental extract: the derived daily rows are kept in a local Parquet cache (data/.cache/).
+    Each run only reads rows from the cache watermark minus RON_REFRESH_DAYS (to pick up late
+    corrections) onwards. `full_refresh=True` ignores the cache and reloads the whole window.
+    
+    Returns:
+        pd.DataFrame: A dataframe containing 'fecha', 'recaudacion' (Net), 'recaudacion_bruta' (Gross), and parsed date parts.
+    """
+    current_year = datetime.now().year
+    window_start = pd.Timestamp(year=current_year - 4, month=1, day=1)
+    
+    df_cache = None if full_refresh else load_ron_cache()
+    if df_cache is not None and not df_cache.empty:
+        since = max(window_start, df_cache['fecha'].max().normalize() - pd.Timedelta(days=RON_REFRESH_DAYS))
+        print(f"  [ron] Caché hasta {df_cache['fecha'].max():%Y-%m-%d}; leyendo desde {since:%Y-%m-%d}")
+    else:
+        df_cache = None
+        since = window_start
+        print(f"  [ron] Carga completa desde {since:%Y-%m-%d}")
+    
+    with pg_connection() as conn:
+        columns = resolve_ron_columns(conn)
+        query, params = build_ron_query(columns, since.date())
+        df_raw = pd.read_sql(query, conn, params=params)
+    
+    col_mapping = {name: label for label, (name, _) in columns.items()}
+    df = df_raw.rename(columns=col_mapping).copy()
+
+    # Parse dates
+    df['fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+    
+    # Keep the requested window (already applied in SQL when 'fecha' is a date column)
+    mask = (df['fecha'] >= since)
+    df = derive_ron_measures(df.loc[mask].copy())
+    print(f"  [ron] {len(df)} filas leídas de {RON_TABLE}.")
+    
+    if df_cache is not None:
+        # New rows replace everything the cache had from `since` onwards
+        df_cache = df_cache[(df_cache['fecha'] >= window_start) & (df_cache['fecha'] < since)]
+        df = pd.concat([df_cache, df], ignore_index=True)
+    
     # Sort
     df = df.sort_values('fecha')
+    save_ron_cache(df)
     
     # Add auxiliary columns
     df['day'] = df['fecha'].dt.day
@@ -194,40 +282,119 @@ def fetch_copa_esperada():
         print(f"  [copa_esperada] ERROR: No se encontró columna de mes/año en {excel_path}")
         return pd.DataFrame(columns=['fecha', 'esperada', 'esperada_prov', 'day', 'month', 'year'])
 
-    import calendar
-    new_rows = []
-    
-    for _, row in df_budget.iterrows():
-        y = int(row[col_year])
-        m = int(row[col_month])
-        
-        val_ron_millions = float(row.get(col_ron, 0)) if col_ron else 0
-        val_rop_millions = float(row.get(col_rop, 0)) if col_rop else 0
-        
-        # Convert to pesos
-        val_ron_pesos = val_ron_millions * 1_000_000
-        val_rop_pesos = val_rop_millions * 1_000_000
-        
-        days_in_month = calendar.monthrange(y, m)[1]
-        
-        daily_ron = val_ron_pesos / days_in_month
-        daily_rop = val_rop_pesos / days_in_month
-        
-        for d in range(1, days_in_month + 1):
-            new_rows.append({
-                'fecha': pd.Timestamp(year=y, month=m, day=d),
-                'esperada': daily_ron,
-                'esperada_prov': daily_rop,
-                'day': d,
-                'month': m,
-                'year': y
-            })
-            
-    df = pd.DataFrame(new_rows)
-    df = df.sort_values('fecha')
+    # Vectorized daily expansion: each budget month is repeated once per day and its
+    # RON/ROP amount (millions -> pesos) is spread evenly over the days of the month
+    years = df_budget[col_year].astype(int).to_numpy()
+    months = df_budget[col_month].astype(int).to_numpy()
+    val_ron_pesos = (df_budget[col_ron].astype(float).to_numpy() if col_ron else np.zeros(len(df_budget))) * 1_000_000
+    val_rop_pesos = (df_budget[col_rop].astype(float).to_numpy() if col_rop else np.zeros(len(df_budget))) * 1_000_000
+    
+    month_start = pd.to_datetime(pd.DataFrame({'year': years, 'month': months, 'day': 1}))
+    days_in_month = month_start.dt.days_in_month.to_numpy()
+    
+    row_idx = np.repeat(np.arange(len(df_budget)), days_in_month)
+    day = np.arange(days_in_month.sum()) - np.repeat(np.cumsum(days_in_month) - days_in_month, days_in_month) + 1
+    
+    df = pd.DataFrame({
+        'fecha': month_start.to_numpy()[row_idx] + pd.to_timedelta(day - 1, unit='D'),
+        'esperada': (val_ron_pesos / days_in_month)[row_idx],
+        'esperada_prov': (val_rop_pesos / days_in_month)[row_idx],
+        'day': day,
+        'month': months[row_idx],
+        'year': years[row_idx]
+    })
+    df = df.sort_values('fecha', kind='stable')
     
     return df[['fecha', 'esperada', 'esperada_prov', 'day', 'month', 'year']]
 
+# copa_gastos is read through build_gasto_query: partida and jurisdiccion are normalized in
+# PostgreSQL by joining a lookup relation built from these maps, and only aggregated rows are
+# returned. The gasto dashboard and fetch_masa_salarial share the query, so they share the names.
+GASTO_FUENTES = ('10', '11', '12', '13', '14')
+
+GASTO_PARTIDA_MAP = {
+    "GASTO EN PERSONAL": "GASTOS EN PERSONAL",
+    "SERVICIO DE LA DEUDA Y DISMINUCION DE OTROS": "SERVICIO DE LA DEUDA"
+}
+
+# Mapeo de jurisdicciones debido a diferencias y truncados en la Base
+GASTO_JURISDICCION_MAP = {
+    "MINISTERIO DE EDUCACION": "MINISTERIO DE EDUCACIÓN",
+    "MINISTERIO DE SALUD PUBLICA": "MINISTERIO DE SALUD PÚBLICA",
+    "MINISTERIO DE PRODUCCION": "MINISTERIO DE PRODUCCIÓN",
+    "MINISTERIO DE OBRAS Y SERVICIOS PUBLICOS": "MINISTERIO DE OBRAS Y SERVICIOS PÚBLICOS",
+    "MINISTERIO DE COORDINACION Y": "MINISTERIO DE COORDINACIÓN Y PLANIFICACIÓN",
+    "MINISTERIO DE JUSTICIA Y DERECHOS": "MINISTERIO DE JUSTICIA Y DERECHOS HUMANOS",
+    "MINISTERIO DE INDUSTRIA TRABAJO Y": "MINISTERIO DE INDUSTRIA TRABAJO Y COMERCIO",
+    "INSTITUTO CORRENTINO DEL AGUA Y DEL": "INSTITUTO CORRENTINO DEL AGUA Y DEL AMBIENTE",
+    "DIRECCION PROVINCIAL DE VIALIDAD": "DIRECCIÓN PROVINCIAL DEL VIALIDAD",
+    "ADMINIST. DE OBRAS SANITARIAS DE": "ADMINISTRACIÓN DE OBRAS SANITARIAS DE CORRIENTES",
+    "INSTITUTO DE DESARROLLO RURAL DE": "INSTITUTO DE DESARROLLO RURAL DE CORRIENTES",
+    "CENTRO DE ONCOLOGIA \"ANNA ROCCA DE": "CENTRO DE ONCOLOGIA 'ANNA ROCCA DE BONATTI'",
+    "AGENCIA CORRENTINA DE BIENES DEL": "AGENCIA CORRENTINA DE BIENES DEL ESTADO"
+}
+
+def build_gasto_query(select, group_by, filters=None, order_by=None):
+    """
+    Builds an aggregate query over copa_gastos (without Saldo rows nor 'Total de la Fuente',
+    fuentes GASTO_FUENTES) in which `partida` and `jurisdiccion` already carry the normalized
+    names. `filters` ({column: [values]}) are applied to the normalized columns.
+    
+    Returns:
+        tuple: (sql, params) for cursor.execute / pd.read_sql.
+    """
+    params = []
+    
+    def lookup(mapping):
+        for pair in mapping.items():
+            params.extend(pair)
+        return ',\n            '.join(['(%s, %s)'] * len(mapping))
+    
+    partida_values = lookup(GASTO_PARTIDA_MAP)
+    jurisdiccion_values = lookup(GASTO_JURISDICCION_MAP)
+    
+    conditions = []
+    for column, values in (filters or {}).items():
+        conditions.append(f"{column} IN %s")
+        params.append(tuple(values))
+    where = f"\n    WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = f"\n    ORDER BY {', '.join(order_by)}" if order_by else ''
+    columns = ',\n        '.join(select)
+    fuentes = ', '.join(f"'{f}'" for f in GASTO_FUENTES)
+    # Python's str.strip() of the old pandas normalization: spaces, tabs and line breaks
+    trimmed = "BTRIM(g.jurisdiccion, E' \\t\\r\\n')"
+    
+    sql = f"""
+    WITH partida_map (original, normalizada) AS (
+        VALUES
+            {partida_values}
+    ),
+    jurisdiccion_map (original, normalizada) AS (
+        VALUES
+            {jurisdiccion_values}
+    ),
+    gastos AS (
+        SELECT
+            g.periodo,
+            COALESCE(j.normalizada, {trimmed}) AS jurisdiccion,
+            g.tipo_financ,
+            COALESCE(p.normalizada, g.partida) AS partida,
+            g.estado,
+            g.monto
+        FROM copa_gastos g
+        LEFT JOIN jurisdiccion_map j ON j.original = {trimmed}
+        LEFT JOIN partida_map p ON p.original = g.partida
+        WHERE g.estado != 'Saldo'
+          AND g.partida != 'Total de la Fuente'
+          AND g.tipo_financ IN ({fuentes})
+    )
+    SELECT
+        {columns}
+    FROM gastos{where}
+    GROUP BY {', '.join(group_by)}{order}
+    """
+    return sql, params
+
 def fetch_masa_salarial(target_years):
     """
     Fetches monthly salary bill (Masa Salarial) for specified years.
@@ -235,7 +402,7 @@ def fetch_masa_salarial(target_years):
     Data sources (in order of priority):
       1. PostgreSQL table 'copa_gastos' (GASTOS EN PERSONAL, fuentes 10+14, estado=Comprometido)
          → Primary source. Most up-to-date and authoritative.
-      2. MySQL table 'plantilla_personal_provincia' (SUM(importe_gral))
+      2. MySQL table 'plantilla_personal_provincia' (SUM(importe_gral), see plantilla.load_payroll)
          → Fallback for historical months not available in copa_gastos.
     
     Args:
@@ -247,21 +414,15 @@ def fetch_masa_salarial(target_years):
     # --- Source 1 (PRIMARY): PostgreSQL copa_gastos ---
     df_pg = pd.DataFrame(columns=['anio', 'mes', 'masa_salarial'])
     print("  [masa_salarial] Leyendo copa_gastos desde PostgreSQL (fuentes 10+14, Comprometido) [FUENTE PRINCIPAL]...")
+    query_pg, params_pg = build_gasto_query(
+        select=["EXTRACT(YEAR FROM periodo)::int AS anio", "EXTRACT(MONTH FROM periodo)::int AS mes", "SUM(monto) AS masa_salarial"],
+        group_by=["EXTRACT(YEAR FROM periodo)", "EXTRACT(MONTH FROM periodo)"],
+        filters={'partida': ['GASTOS EN PERSONAL'], 'tipo_financ': ['10', '14'], 'estado': ['Comprometido']},
+        order_by=['anio', 'mes']
+    )
     try:
-        conn_pg = get_pg_connection()
-        query_pg = """
-        SELECT 
-            EXTRACT(YEAR FROM periodo)::int AS anio,
-            EXTRACT(MONTH FROM periodo)::int AS mes,
-            SUM(monto) AS masa_salarial
-        FROM copa_gastos
-        WHERE partida IN ('GASTOS EN PERSONAL', 'GASTO EN PERSONAL')
-          AND tipo_financ IN ('10', '14')
-          AND estado = 'Comprometido'
-        GROUP BY EXTRACT(YEAR FROM periodo), EXTRACT(MONTH FROM periodo)
-        ORDER BY anio, mes
-        """
-        df_pg = pd.read_sql(query_pg, conn_pg)
+        with pg_connection() as conn_pg:
+            df_pg = pd.read_sql(query_pg, conn_pg, params=params_pg)
         df_pg['masa_salarial'] = pd.to_numeric(df_pg['masa_salarial'], errors='coerce').fillna(0)
         df_pg['anio'] = df_pg['anio'].astype(int)
         df_pg['mes'] = df_pg['mes'].astype(int)
@@ -269,36 +430,18 @@ def fetch_masa_salarial(target_years):
         print(f"  [masa_salarial] {len(df_pg)} registros cargados desde copa_gastos (PostgreSQL).")
     except Exception as e:
         print(f"  [masa_salarial] WARNING: No se pudo leer copa_gastos: {e}.")
-    finally:
-        if 'conn_pg' in locals() and conn_pg:
-            conn_pg.close()
 
     # --- Source 2 (FALLBACK): MySQL plantilla_personal_provincia ---
     df_mysql = pd.DataFrame(columns=['anio', 'mes', 'masa_salarial'])
     print("  [masa_salarial] Leyendo tabla histórica desde MySQL (plantilla_personal_provincia) [FALLBACK]...")
-    years_str = ",".join(map(str, target_years))
-    query = f"""
-    SELECT anio, mes, SUM(importe_gral) AS masa_salarial
-    FROM plantilla_personal_provincia
-    WHERE anio IN ({years_str})
-    GROUP BY anio, mes
-    ORDER BY anio, mes
-    """
-    conn = get_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
-        df_mysql = pd.DataFrame(data, columns=columns)
-        df_mysql['masa_salarial'] = pd.to_numeric(df_mysql['masa_salarial'], errors='coerce').fillna(0)
+        df_payroll = load_payroll()
+        df_mysql = df_payroll.loc[df_payroll['anio'].isin(target_years), ['anio', 'mes', 'masa_salarial']].reset_index(drop=True)
         df_mysql['anio'] = df_mysql['anio'].astype(int)
         df_mysql['mes'] = df_mysql['mes'].astype(int)
         print(f"  [masa_salarial] {len(df_mysql)} registros cargados desde MySQL.")
     except Exception as e:
         print(f"  [masa_salarial] ERROR al leer MySQL: {e}.")
-    finally:
-        conn.close()
 
     # --- Combine: copa_gastos (primary) > MySQL (fallback) ---
     # MySQL first (lower priority), then copa_gastos on top (higher priority via keep='last')
@@ -363,127 +506,330 @@ def fetch_recaudacion_provincial():
     
     return grouped
 
-def fetch_rem_projections():
+# IPC (Nación) is published from this year onwards
+IPC_SINCE_YEAR = 2020
+
+def fetch_ipc():
     """
-    Fetch REM (Relevamiento de Expectativas de Mercado) monthly CPI projections from PostgreSQL.
+    Fetch IPC (Índice de Precios al Consumidor), Region 1 (Nación) only, for all deflation
+    calculations. Months after the last official one are estimated with the REM projections
+    (BCRA survey); see deflator.load_deflator.
     
-    Data Source: datalake_economico.rem_precios_minoristas
-    Uses the latest survey (max fecha_consulta) which typically contains 6-7 months
-    of projections (1-2 backward, 4-5 forward).
+    Returns:
+        pd.DataFrame: IPC values by year and month since 2020 (Nación only).
+    """
+    return load_deflator().since(IPC_SINCE_YEAR).to_frame()[['year', 'month', 'ipc_valor']]
+
+import calendar
+
+RON_MEASURES = ['recaudacion', 'recaudacion_bruta', 'recaudacion_neta', 'distribucion_municipal']
+# Measures of the daily charts, by source (see build_daily_cube)
+DAILY_MEASURES = {'daily': ['recaudacion', 'recaudacion_neta'], 'esperada': ['esperada']}
+# Months published in the Monitor Mensual
+MONITOR_MONTHS = 12
+# A month with RON data through this day counts as complete for the interannual charts
+COMPLETE_DAY = 25
+
+def build_period_store(df_daily, df_salary=None, df_ipc=None, df_esperada=None, df_reca_prov=None):
+    """
+    Indexes every source by (year, month) once per run, so the process_* functions can read a
+    month's daily series, its totals or its completeness in O(1) instead of rescanning the
+    DataFrames on every pass. Sources passed as None are left out (their lookups return the default).
     
     Returns:
-        dict: {(year, month): decimal_variation} e.g. {(2026, 3): 0.027} for 2.7%
+        dict: {
+            'completeness': pd.DataFrame indexed by the (year, month) periods of df_daily (build_completeness),
+            'daily_cube': daily chart measures as year x month x day arrays (build_daily_cube),
+            'monthly': pd.DataFrame indexed by (year, month) with the monthly totals of every source,
+            'totals': the same totals as {(year, month): {column: value}}
+        }
     """
-    query = """
-    SELECT fecha, mediana
-    FROM rem_precios_minoristas
-    WHERE fecha_consulta = (SELECT MAX(fecha_consulta) FROM rem_precios_minoristas)
-    ORDER BY fecha ASC
+    def monthly_index(df, year_col, month_col):
+        return pd.MultiIndex.from_arrays(
+            [df[year_col].astype(int), df[month_col].astype(int)], names=['year', 'month']
+        )
+    
+    # Daily RON: monthly sums + last day with actual data
+    daily_totals = df_daily.groupby(['year', 'month'])[RON_MEASURES].sum()
+    daily_totals['max_day'] = df_daily[df_daily['recaudacion'] > 0].groupby(['year', 'month'])['day'].max()
+    daily_totals['max_day'] = daily_totals['max_day'].fillna(0).astype(int)
+    daily_totals.index = daily_totals.index.set_names(['year', 'month'])
+    
+    frames = [daily_totals]
+    
+    if df_esperada is not None:
+        esperada_cols = [c for c in ['esperada', 'esperada_prov'] if c in df_esperada.columns]
+        esperada_totals = df_esperada.groupby(['year', 'month'])[esperada_cols].sum()
+        esperada_totals = esperada_totals.reindex(columns=['esperada', 'esperada_prov'], fill_value=0)
+        esperada_totals.index = esperada_totals.index.set_names(['year', 'month'])
+        frames.append(esperada_totals)
+    
+    # One row per period in these sources: keep the first one, as the lookups did
+    if df_salary is not None:
+        salary = df_salary[['masa_salarial']].set_axis(monthly_index(df_salary, 'anio', 'mes'))
+        frames.append(salary.groupby(level=[0, 1]).first())
+    if df_reca_prov is not None:
+        reca_prov = df_reca_prov[['recaudacion_provincial', 'distribucion_municipal_prov']].set_axis(monthly_index(df_reca_prov, 'year', 'month'))
+        frames.append(reca_prov.groupby(level=[0, 1]).first())
+    if df_ipc is not None:
+        ipc = df_ipc[['ipc_valor']].set_axis(monthly_index(df_ipc, 'year', 'month'))
+        frames.append(ipc.groupby(level=[0, 1]).first())
+    
+    monthly = pd.concat(frames, axis=1).sort_index()
+    monthly.index = pd.MultiIndex.from_tuples([(int(y), int(m)) for y, m in monthly.index], names=['year', 'month'])
+    # The fetchers' empty fallbacks are object-dtype frames: cast the measures so the
+    # monthly ratios are float divisions (NaN/inf) instead of int / int raising ZeroDivisionError
+    measures = [c for c in monthly.columns if c != 'max_day']
+    monthly[measures] = monthly[measures].apply(pd.to_numeric, errors='coerce').astype('float64')
+
+    return {
+        'completeness': build_completeness(daily_totals['max_day']),
+        'daily_cube': build_daily_cube(df_daily, df_esperada),
+        'monthly': monthly,
+        'totals': monthly.to_dict('index')
+    }
+
+def build_completeness(max_day):
     """
-    conn = get_pg_ipc_connection()
-    try:
-        df = pd.read_sql(query, conn)
-        projections = {}
-        for _, row in df.iterrows():
-            fecha = pd.to_datetime(row['fecha'])
-            # mediana comes as percentage (e.g. 2.7 for 2.7%), convert to decimal
-            projections[(fecha.year, fecha.month)] = float(row['mediana']) / 100
-        print(f"  REM: Loaded {len(projections)} monthly projections from latest survey")
-        return projections
-    except Exception as e:
-        print(f"  WARNING: Could not fetch REM projections: {e}")
-        return {}
-    finally:
-        conn.close()
+    Completeness of every RON period, decided once for all the process_* functions.
+    `max_day` is the last day with recaudacion > 0 of each (year, month) of df_daily (0 if none).
+    
+    Returns:
+        pd.DataFrame indexed by (year, month), sorted, with columns:
+            max_day          last day with data
+            has_data         max_day > 0
+            has_next_month   the following month has data (Monitor Mensual: month closed)
+            day_rule         data through COMPLETE_DAY (interannual charts)
+            year_closed      December of the year has data (Monitor Anual, annual analysis)
+    """
+    max_day = max_day.fillna(0).astype(int).sort_index()
+    max_day.index = pd.MultiIndex.from_tuples([(int(y), int(m)) for y, m in max_day.index], names=['year', 'month'])
+    years = max_day.index.get_level_values('year')
+    months = max_day.index.get_level_values('month')
+    
+    next_periods = pd.MultiIndex.from_arrays(
+        [np.where(months == 12, years + 1, years), months % 12 + 1], names=['year', 'month']
+    )
+    closed_years = set(years[(months == 12) & (max_day.to_numpy() > 0)])
+    
+    return pd.DataFrame({
+        'max_day': max_day,
+        'has_data': max_day > 0,
+        'has_next_month': max_day.reindex(next_periods).fillna(0).to_numpy() > 0,
+        'day_rule': max_day >= COMPLETE_DAY,
+        'year_closed': years.isin(closed_years)
+    }, index=max_day.index)
 
-def fetch_ipc():
+def build_daily_cube(df_daily, df_esperada=None):
     """
-    Fetch IPC (Índice de Precios al Consumidor) from the database.
-    Uses only Region 1 (Nación) for all deflation calculations.
-    If official data for recent months is missing, it seamlessly estimates using
-    REM projections from rem_precios_minoristas (BCRA survey).
+    Dense year x month x day arrays (shape years x 12 x 31) of the daily chart measures,
+    filled once by scatter-adding the rows of df_daily and df_esperada. Days without rows
+    are 0; `mask` marks the days that exist in the calendar.
     
     Returns:
-        pd.DataFrame: IPC values by year and month since 2020 (Nación only).
+        dict: {
+            'first_year': year of the first row of the arrays,
+            'values': {measure: np.ndarray} for the DAILY_MEASURES present in the sources,
+            'mask': bool np.ndarray, True for valid calendar days
+        }
     """
-    query = """
-    SELECT 
-        EXTRACT(YEAR FROM fecha)::int as year, 
-        EXTRACT(MONTH FROM fecha)::int as month, 
-        valor as ipc_valor
-    FROM ipc
-    WHERE id_region = 1 AND id_categoria = 1 AND id_division = 1
-      AND EXTRACT(YEAR FROM fecha) >= 2020
+    sources = [(df_daily, DAILY_MEASURES['daily'])]
+    if df_esperada is not None:
+        sources.append((df_esperada, DAILY_MEASURES['esperada']))
+    
+    years = np.concatenate([df['year'].to_numpy(dtype=np.int64) for df, _ in sources])
+    first_year = int(years.min()) if len(years) else 0
+    n_years = int(years.max()) - first_year + 1 if len(years) else 0
+    shape = (n_years, 12, 31)
+    
+    values = {}
+    for df, measures in sources:
+        cell = np.ravel_multi_index((
+            df['year'].to_numpy(dtype=np.int64) - first_year,
+            df['month'].to_numpy(dtype=np.int64) - 1,
+            df['day'].to_numpy(dtype=np.int64) - 1
+        ), shape)
+        for col in measures:
+            if col in df.columns:
+                weights = np.nan_to_num(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float))
+                values[col] = np.bincount(cell, weights=weights, minlength=int(np.prod(shape))).reshape(shape)
+    
+    days_in_month = np.array([[calendar.monthrange(first_year + i, m)[1] for m in range(1, 13)] for i in range(n_years)], dtype=int)
+    mask = np.arange(1, 32)[None, None, :] <= days_in_month.reshape(n_years, 12)[:, :, None]
+    
+    return {'first_year': first_year, 'values': values, 'mask': mask}
+
+def cube_days(cube, year, month):
+    """Number of days of (year, month)."""
+    i = year - cube['first_year']
+    if 0 <= i < len(cube['mask']):
+        return int(cube['mask'][i, month - 1].sum())
+    return calendar.monthrange(year, month)[1]
+
+def cube_slice(cube, values, year, month, n_days):
+    """Days 1..n_days of (year, month) from a cube array (zeros outside its years)."""
+    i = year - cube['first_year']
+    if values is None or not 0 <= i < len(values):
+        return np.zeros(n_days)
+    return values[i, month - 1, :n_days]
+
+def _millions(values, keep=None):
+    """Values in millions as a list; None where `keep` is False."""
+    out = (values / 1_000_000).tolist()
+    if keep is not None:
+        out = [v if k else None for v, k in zip(out, keep)]
+    return out
+
+def period_value(store, year, month, col, default=0):
     """
-    conn = get_pg_ipc_connection()
-    try:
-        df = pd.read_sql(query, conn)
-        
-        # --- PROYECCIONES REM (COMPOUNDING) ---
-        rem_projections = fetch_rem_projections()
-        
-        df_sorted = df.sort_values(['year', 'month'])
-        if df_sorted.empty:
-            return df
-            
-        # Find the last official entry
-        last_row = df_sorted.iloc[-1]
-        last_year = int(last_row['year'])
-        last_month = int(last_row['month'])
-        current_val = float(last_row['ipc_valor'])
-        
-        print(f"  IPC: Last official data: {last_year}-{last_month:02d} (valor={current_val:.2f})")
-        
-        # Walk forward from last official month, compounding REM projections
-        new_ipc_rows = []
-        curr_y = last_year
-        curr_m = last_month
-        
-        while True:
-            curr_m += 1
-            if curr_m > 12:
-                curr_m = 1
-                curr_y += 1
-            
-            if (curr_y, curr_m) in rem_projections:
-                monthly_var = rem_projections[(curr_y, curr_m)]
-                current_val = current_val * (1 + monthly_var)
-                new_ipc_rows.append({
-                    'year': curr_y,
-                    'month': curr_m,
-                    'ipc_valor': current_val
-                })
-                print(f"  IPC: Projected {curr_y}-{curr_m:02d} with REM {monthly_var*100:.1f}% -> {current_val:.2f}")
-            else:
-                break
-                    
-        if new_ipc_rows:
-            df_new = pd.DataFrame(new_ipc_rows)
-            df = pd.concat([df, df_new], ignore_index=True)
-            
-        return df
-    finally:
-        conn.close()
+    Returns the monthly total `col` for (year, month) from the period store, or `default` if the
+    period or the value is missing.
+    """
+    row = store['totals'].get((year, month))
+    if row is None:
+        return default
+    val = row.get(col)
+    return default if val is None or pd.isna(val) else val
 
-import calendar
+def previous_month(year, month):
+    return (year, month - 1) if month > 1 else (year - 1, 12)
+
+def _growth(curr, prev):
+    """curr / prev - 1 where prev > 0, else 0 (the guard the monitor has always applied)."""
+    return (curr / prev - 1).where(prev > 0, 0.0)
 
-def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
+def _optional(value):
+    """NaN marks a KPI that cannot be computed (e.g. missing IPC) and is published as null."""
+    return None if pd.isna(value) else value
+
+def build_monthly_facts(store, deflator):
+    """
+    Month-level fact table for the Monitor Mensual.
+    
+    One row per (year, month) in the period store holding RON, ROP, masa salarial, IPC and
+    expected values for the month, the same month of the previous year ('*_prev') and every KPI
+    (nominal/real year-over-year variations, brechas, coberturas, recursos post sueldos), all
+    computed column-wise. Real variations use the IPC year-over-year factor from `deflator`.
+    KPIs that cannot be computed (missing IPC) are NaN.
+    
+    Returns:
+        pd.DataFrame: Indexed by (year, month).
+    """
+    monthly = store['monthly']
+    value_cols = RON_MEASURES + ['esperada', 'esperada_prov', 'masa_salarial', 'recaudacion_provincial', 'distribucion_municipal_prov']
+    
+    f = monthly.reindex(columns=value_cols).fillna(0)
+    f['max_day'] = monthly['max_day'].fillna(0).astype(int)
+    f['has_salary'] = monthly.reindex(columns=['masa_salarial'])['masa_salarial'].notna()
+    
+    years = f.index.get_level_values('year')
+    months = f.index.get_level_values('month')
+    
+    def aligned(index_years, index_months):
+        df = f.reindex(pd.MultiIndex.from_arrays([index_years, index_months], names=['year', 'month']))
+        df.index = f.index
+        return df
+    
+    prev = aligned(years - 1, months)
+    prev_month = aligned(np.where(months == 1, years - 1, years), np.where(months == 1, 12, months - 1))
+    
+    for col in value_cols:
+        f[f'{col}_prev'] = prev[col].fillna(0)
+    f['masa_salarial_prev_month'] = prev_month['masa_salarial'].fillna(0)
+    f['has_salary_prev_month'] = prev_month['has_salary'].fillna(False).astype(bool)
+    
+    # IPC (Nación) year-over-year
+    ipc_yoy = pd.Series(deflator.yoy_factor(years.to_numpy(), months.to_numpy()), index=f.index)
+    ipc_ok = ipc_yoy.notna()
+    f['ipc_missing'] = ~ipc_ok
+    f['var_ipc_ia'] = (ipc_yoy - 1).where(ipc_ok, 0.0)
+    ipc_factor = 1 + f['var_ipc_ia']
+    
+    # ROP Disponible and combined totals
+    f['rop_disponible'] = f['recaudacion_provincial'] - f['distribucion_municipal_prov']
+    f['rop_disponible_prev'] = f['recaudacion_provincial_prev'] - f['distribucion_municipal_prov_prev']
+    f['total_disponible'] = f['recaudacion'] + f['rop_disponible']
+    f['total_disponible_prev'] = f['recaudacion_prev'] + f['rop_disponible_prev']
+    f['dist_muni_total'] = f['distribucion_municipal'] + f['distribucion_municipal_prov']
+    f['dist_muni_total_prev'] = f['distribucion_municipal_prev'] + f['distribucion_municipal_prov_prev']
+    
+    # Salary (falls back to the previous month while the current one is not loaded)
+    f['masa_incompleta'] = f['masa_salarial'] == 0
+    f['salary_for_calc'] = f['masa_salarial'].where(~f['masa_incompleta'], f['masa_salarial_prev_month'])
+    f['post_sueldos'] = f['total_disponible'] - f['salary_for_calc']
+    f['post_sueldos_prev'] = f['total_disponible_prev'] - f['masa_salarial_prev']
+    
+    # RON
+    f['rec_var_nom'] = _growth(f['recaudacion'], f['recaudacion_prev'])
+    f['rec_diff_nom'] = (f['recaudacion'] - f['recaudacion_prev']).where(f['recaudacion_prev'] > 0, 0.0)
+    f['rec_var_real'] = ((1 + f['rec_var_nom']) / ipc_factor - 1).where(ipc_ok)
+    f['brecha_abs'] = f['recaudacion_neta'] - f['esperada']
+    f['brecha_pct'] = _growth(f['recaudacion_neta'], f['esperada']) * 100
+    
+    # ROP
+    f['rop_var_nom'] = _growth(f['recaudacion_provincial'], f['recaudacion_provincial_prev'])
+    f['rop_diff_nom'] = (f['recaudacion_provincial'] - f['recaudacion_provincial_prev']).where(f['recaudacion_provincial_prev'] > 0, 0.0)
+    f['rop_var_real'] = ((1 + f['rop_var_nom']) / ipc_factor - 1).where(ipc_ok)
+    f['rop_diff_real'] = (f['rop_var_real'] * (f['recaudacion_provincial_prev'] / ipc_factor)).where(ipc_ok, 0.0)
+    f['brecha_abs_prov'] = f['recaudacion_provincial'] - f['esperada_prov']
+    f['brecha_pct_prov'] = _growth(f['recaudacion_provincial'], f['esperada_prov']) * 100
+    
+    # Distribucion Municipal (Nación + Provincia)
+    dm_real_ok = (f['dist_muni_total_prev'] > 0) & ipc_ok
+    dm_prev_adj = f['dist_muni_total_prev'] * ipc_factor
+    f['dm_var_nom'] = _growth(f['dist_muni_total'], f['dist_muni_total_prev'])
+    f['dm_diff_nom'] = (f['dist_muni_total'] - f['dist_muni_total_prev']).where(f['dist_muni_total_prev'] > 0, 0.0)
+    f['dm_var_real'] = (f['dist_muni_total'] / dm_prev_adj - 1).where(dm_real_ok)
+    f['dm_diff_real'] = (f['dist_muni_total'] - dm_prev_adj).where(dm_real_ok)
+    f['dm_real_fallback'] = ~dm_real_ok
+    
+    # Masa Salarial
+    sal_ok = ~f['masa_incompleta'] & (f['masa_salarial_prev'] > 0)
+    f['sal_var_nom'] = _growth(f['masa_salarial'], f['masa_salarial_prev']).where(sal_ok, 0.0)
+    f['sal_var_real'] = ((1 + f['sal_var_nom']) / ipc_factor - 1).where(ipc_ok).where(sal_ok, 0.0)
+    f['sal_diff_nom'] = (f['masa_salarial'] - f['masa_salarial_prev']).where(sal_ok, 0.0)
+    
+    # Recursos Totales Brutos (RON Bruta + ROP Bruta) and Cobertura (Masa Salarial / Recursos Brutos)
+    f['bruta_total'] = f['recaudacion_bruta'] + f['recaudacion_provincial']
+    f['bruta_total_prev'] = f['recaudacion_bruta_prev'] + f['recaudacion_provincial_prev']
+    f['total_recursos_var_real'] = (f['bruta_total'] / (f['bruta_total_prev'] * ipc_factor) - 1).where((f['bruta_total_prev'] > 0) & ipc_ok)
+    f['cobertura'] = (f['masa_salarial'] / f['bruta_total']).where(f['bruta_total'] > 0, 0.0)
+    f['cobertura_prev'] = (f['masa_salarial_prev'] / f['bruta_total_prev']).where(f['bruta_total_prev'] > 0, 0.0)
+    
+    return f
+
+def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov, store=None, n_months=MONITOR_MONTHS, deflator=None):
     """
     Core business logic processor for the 'Monitor Mensual' dashboard.
     
-    Takes the raw pandas DataFrames and aggregates them month by month.
-    It calculates nominal variations, real variations (adjusting by IPC), and Coverage (Masa Salarial vs Coparticipacion).
-    It handles logic for running/incomplete months (comparing current days vs same amount of days in the previous year).
+    Publishes the last `n_months` months with data. Every KPI comes from the month-level fact
+    table (build_monthly_facts); this function only serializes it per period and builds the
+    daily charts. Running/incomplete months are compared against the full previous-year month.
+    Monthly slices and totals are read from the period store, IPC from the deflator (both built
+    here from the sources if not given).
     
     Returns:
         dict: A heavily nested dictionary structured precisely for the frontend JSON consumption.
     """
-    # Dynamic year detection fallback
-    current_year = int(df_daily['year'].max()) if not df_daily.empty else datetime.now().year
-    
-    # Find up to last 12 distinct months in the dataset
-    df_daily_months = df_daily[['year', 'month']].drop_duplicates().sort_values(['year', 'month'])
-    target_months = df_daily_months.tail(12)
+    if store is None:
+        store = build_period_store(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov)
+    if deflator is None:
+        deflator = Deflator.from_frame(df_ipc)
+    
+    facts = build_monthly_facts(store, deflator)
+    
+    # Daily charts: slices of the daily cube; cumulative series are one cumsum along the day axis
+    cube = store['daily_cube']
+    daily_rec = cube['values'].get('recaudacion')
+    daily_esperada = cube['values'].get('esperada')
+    cum_rec = np.cumsum(daily_rec, axis=2)
+    cum_neta = np.cumsum(cube['values']['recaudacion_neta'], axis=2) if 'recaudacion_neta' in cube['values'] else cum_rec
+    cum_esperada = np.cumsum(daily_esperada, axis=2) if daily_esperada is not None else None
+    
+    # Find up to last n_months distinct months in the dataset
+    completeness = store['completeness']
+    target_months = list(completeness.index)[-n_months:]
+    facts_by_period = facts.loc[target_months].to_dict('index') if target_months else {}
     
     available_periods = []
     data_by_period = {}
@@ -493,22 +839,17 @@ def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
         7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
     }
 
-    # 1. Daily Data Template is now created per-month inside the loop
-    #    using calendar.monthrange() to get the correct number of days.
-
     # Track completeness to find default
     default_period_id = None
     last_available_period_id = None
 
-    # Refactored for performance: Using itertuples instead of iterrows (Fix 2-B)
-    for row in target_months.itertuples(index=False):
-        iter_year = int(row.year)
-        m = int(row.month)
+    for iter_year, m in target_months:
         prev_year = iter_year - 1
+        f = facts_by_period[(iter_year, m)]
         
         # Dynamic days-in-month (handles leap years automatically)
-        days_in_month = calendar.monthrange(iter_year, m)[1]
-        all_days = pd.DataFrame({'day': range(1, days_in_month + 1)})
+        days_in_month = cube_days(cube, iter_year, m)
+        day_labels = [str(d) for d in range(1, days_in_month + 1)]
         
         month_label = MONTH_NAMES.get(m, str(m))
         period_id = f"{iter_year}-{m:02d}"
@@ -521,267 +862,100 @@ def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
             "year": iter_year
         })
         
-        # --- Filter Data ---
-        
-        # Daily Data
-        df_daily_prev = df_daily[(df_daily['year'] == prev_year) & (df_daily['month'] == m)].copy()
-        df_daily_curr = df_daily[(df_daily['year'] == iter_year) & (df_daily['month'] == m)].copy()
-
         # Generate required variable for chart truncation
-        real_data_curr = df_daily_curr[df_daily_curr['recaudacion'] > 0]
-        max_day_curr = real_data_curr['day'].max() if not real_data_curr.empty else 0
+        max_day_curr = int(completeness.at[(iter_year, m), 'max_day'])
         
         # Determine Completeness: A month is complete only if the NEXT month has data
-        next_m = m % 12 + 1
-        next_y = iter_year if m < 12 else iter_year + 1
-        has_next_month_data = not df_daily[(df_daily['year'] == next_y) & (df_daily['month'] == next_m) & (df_daily['recaudacion'] > 0)].empty
-        
-        is_complete = bool(has_next_month_data)
+        is_complete = bool(completeness.at[(iter_year, m), 'has_next_month'])
         
         if is_complete:
             default_period_id = period_id
         
-        # --- Aggregates for Variation (FULL vs FULL) ---
-        # User request: "conceptualmente es erroneo ajustar la cantidad de dias de enero, tene en cuenta enero completo"
-        # We compare Total Current vs Total Previous (Complete Month)
-        
-        total_recaudacion_curr = df_daily_curr['recaudacion'].sum()
-        total_bruta_curr = df_daily_curr['recaudacion_bruta'].sum() if 'recaudacion_bruta' in df_daily_curr.columns else total_recaudacion_curr
-        total_neta_curr = df_daily_curr['recaudacion_neta'].sum() if 'recaudacion_neta' in df_daily_curr.columns else total_recaudacion_curr
-        total_dist_muni_curr = df_daily_curr['distribucion_municipal'].sum() if 'distribucion_municipal' in df_daily_curr.columns else 0
-        
-        # Full previous for Variation Calc (and Display)
-        total_recaudacion_prev_full = df_daily_prev['recaudacion'].sum()
-        total_bruta_prev_full = df_daily_prev['recaudacion_bruta'].sum() if 'recaudacion_bruta' in df_daily_prev.columns else total_recaudacion_prev_full
-        total_neta_prev_full = df_daily_prev['recaudacion_neta'].sum() if 'recaudacion_neta' in df_daily_prev.columns else total_recaudacion_prev_full
-        total_dist_muni_prev_full = df_daily_prev['distribucion_municipal'].sum() if 'distribucion_municipal' in df_daily_prev.columns else 0
-        
-        df_esperada_curr = df_esperada[(df_esperada['year'] == iter_year) & (df_esperada['month'] == m)].copy()
-        
-        daily_prev = pd.merge(all_days, df_daily_prev[['day', 'recaudacion']], on='day', how='left').fillna(0)
-        daily_curr = pd.merge(all_days, df_daily_curr[['day', 'recaudacion']], on='day', how='left').fillna(0)
-        
-        # 'esperada' columns in the daily dataframe
-        if 'esperada' in df_esperada_curr.columns and 'esperada_prov' in df_esperada_curr.columns:
-             daily_esperada = pd.merge(all_days, df_esperada_curr[['day', 'esperada', 'esperada_prov']], on='day', how='left').fillna(0)
-             total_esperada_curr = df_esperada_curr['esperada'].sum()
-             total_esperada_prov_curr = df_esperada_curr['esperada_prov'].sum()
-        else:
-             # fallback if structure lacks the columns somehow
-             daily_esperada = pd.merge(all_days, df_esperada_curr[['day', 'esperada']], on='day', how='left').fillna(0)
-             daily_esperada['esperada_prov'] = 0
-             total_esperada_curr = df_esperada_curr['esperada'].sum() if 'esperada' in df_esperada_curr.columns else 0
-             total_esperada_prov_curr = 0
-
-        daily_curr = pd.merge(daily_curr, daily_esperada, on='day', how='left')
-        
-        # Salary
-        salary_prev_row = df_salary[(df_salary['anio'] == prev_year) & (df_salary['mes'] == m)]
-        salary_curr_row = df_salary[(df_salary['anio'] == iter_year) & (df_salary['mes'] == m)]
-        
-        total_salary_prev = salary_prev_row['masa_salarial'].values[0] if not salary_prev_row.empty else 0
-        total_salary_curr = salary_curr_row['masa_salarial'].values[0] if not salary_curr_row.empty else 0
-        
-        is_masa_incomplete = bool(total_salary_curr == 0)
-
-        # ROP (Recaudacion de Origen Provincial)
-        reca_prov_prev_row = df_reca_prov[(df_reca_prov['year'] == prev_year) & (df_reca_prov['month'] == m)]
-        reca_prov_curr_row = df_reca_prov[(df_reca_prov['year'] == iter_year) & (df_reca_prov['month'] == m)]
-        
-        # ROP Bruta (formerly Total)
-        rop_bruta_prev = reca_prov_prev_row['recaudacion_provincial'].values[0] if not reca_prov_prev_row.empty else 0
-        rop_bruta_curr = reca_prov_curr_row['recaudacion_provincial'].values[0] if not reca_prov_curr_row.empty else 0
-        
-        # ROP Disponible (Total - Dist Muni Prov)
-        dist_muni_prov_prev = reca_prov_prev_row['distribucion_municipal_prov'].values[0] if not reca_prov_prev_row.empty else 0
-        dist_muni_prov_curr = reca_prov_curr_row['distribucion_municipal_prov'].values[0] if not reca_prov_curr_row.empty else 0
+        # Previous-year values aligned to this month's days (29/02 has no counterpart)
+        daily_prev = cube_slice(cube, daily_rec, prev_year, m, days_in_month)
+        daily_curr = cube_slice(cube, daily_rec, iter_year, m, days_in_month)
+        daily_esp = cube_slice(cube, daily_esperada, iter_year, m, days_in_month)
         
-        rop_disponible_prev = rop_bruta_prev - dist_muni_prov_prev
-        rop_disponible_curr = rop_bruta_curr - dist_muni_prov_curr
-        
-        # Combined Summary Metrics
-        # RON Disponible is 'total_recaudacion_curr' (refactored from old 'recaudacion')
-        total_disponible_prev = total_recaudacion_prev_full + rop_disponible_prev
-        total_disponible_curr = total_recaudacion_curr + rop_disponible_curr
-        
-        # Salary Fallback Logic for Recursos Post Sueldos
-        salary_for_calc_curr = total_salary_curr
-        if total_salary_curr == 0:
-            # Fallback to previous month
-            prev_m_target = m - 1
-            prev_y_target = iter_year
-            if prev_m_target == 0:
-                prev_m_target = 12
-                prev_y_target = iter_year - 1
-            salary_fallback_row = df_salary[(df_salary['anio'] == prev_y_target) & (df_salary['mes'] == prev_m_target)]
-            salary_for_calc_curr = salary_fallback_row['masa_salarial'].values[0] if not salary_fallback_row.empty else 0
-            
-        recursos_post_sueldos_prev = total_disponible_prev - total_salary_prev
-        recursos_post_sueldos_curr = total_disponible_curr - salary_for_calc_curr
-        
-        # Unified Municipal Distribution (for reference/legacy chart)
-        unified_dist_muni_prev = total_dist_muni_prev_full + dist_muni_prov_prev
-        unified_dist_muni_curr = total_dist_muni_curr + dist_muni_prov_curr
-
-        # IPC & Real Variation (Unified: Nación for all calculations)
-        ipc_prev_row = df_ipc[(df_ipc['year'] == prev_year) & (df_ipc['month'] == m)]
-        ipc_curr_row = df_ipc[(df_ipc['year'] == iter_year) & (df_ipc['month'] == m)]
-        
-        val_ipc_prev = ipc_prev_row['ipc_valor'].values[0] if not ipc_prev_row.empty else None
-        val_ipc_curr = ipc_curr_row['ipc_valor'].values[0] if not ipc_curr_row.empty else None
-
-        var_ipc_ia = 0
-        ipc_missing = True 
-        if val_ipc_prev and val_ipc_curr:
-            var_ipc_ia = (val_ipc_curr / val_ipc_prev) - 1
-            ipc_missing = False
-        
-        # Variations Recaudacion (Using Full Previous)
-        if total_recaudacion_prev_full > 0:
-            rec_var_nom = (total_recaudacion_curr / total_recaudacion_prev_full - 1)
-            rec_diff_nom = total_recaudacion_curr - total_recaudacion_prev_full
-        else:
-            rec_var_nom = 0
-            rec_diff_nom = 0
-            
-        # Real Variation using IPC Nación
-        rec_var_real = ((1 + rec_var_nom) / (1 + var_ipc_ia) - 1) if not ipc_missing else None
-        
-        # Variations ROP (formerly Recaudacion Provincial)
-        if rop_bruta_prev > 0:
-            rop_var_nom = (rop_bruta_curr / rop_bruta_prev - 1)
-            rop_diff_nom = rop_bruta_curr - rop_bruta_prev
-        else:
-            rop_var_nom = 0
-            rop_diff_nom = 0
-            
-        # Real Variation using IPC Nación for ROP
-        rop_var_real = ((1 + rop_var_nom) / (1 + var_ipc_ia) - 1) if not ipc_missing else None
-        
-        # Variations Dist Muni (Unified)
-        if unified_dist_muni_prev > 0:
-            dist_muni_var_nom = (unified_dist_muni_curr / unified_dist_muni_prev - 1)
-            dist_muni_diff_nom = unified_dist_muni_curr - unified_dist_muni_prev
-        else:
-            dist_muni_var_nom = 0
-            dist_muni_diff_nom = 0
-            
-        # Real Variation Dist Muni Unified (using IPC Nación)
-        if unified_dist_muni_prev > 0 and not ipc_missing:
-            unified_dist_muni_prev_adj = unified_dist_muni_prev * (1 + var_ipc_ia)
-            
-            dist_muni_var_real = (unified_dist_muni_curr / unified_dist_muni_prev_adj) - 1
-            dist_muni_diff_real = unified_dist_muni_curr - unified_dist_muni_prev_adj
-            dist_muni_var_real_fallback = False
-        else:
-            dist_muni_var_real = None
-            dist_muni_diff_real = None
-            dist_muni_var_real_fallback = True
-        
-        # Variations Salario
-        if not is_masa_incomplete and total_salary_prev > 0:
-            sal_var_nom = (total_salary_curr / total_salary_prev - 1)
-            # Real Variation using IPC Nación for Masa Salarial
-            sal_var_real = ((1 + sal_var_nom) / (1 + var_ipc_ia) - 1) if not ipc_missing else None
-            sal_diff_nom = total_salary_curr - total_salary_prev
-        else:
-            sal_var_nom = 0
-            sal_var_real = 0
-            sal_diff_nom = 0
-            
-        # Variación Real Recursos Totales (RON Bruta + ROP Bruta)
-        total_bruta_comb_prev = total_bruta_prev_full + rop_bruta_prev
-        total_bruta_comb_curr = total_bruta_curr + rop_bruta_curr
-        
-        if total_bruta_comb_prev > 0 and not ipc_missing:
-             total_bruta_prev_adj = total_bruta_comb_prev * (1 + var_ipc_ia)
-             total_recursos_var_real = (total_bruta_comb_curr / total_bruta_prev_adj) - 1
-        else:
-             total_recursos_var_real = None
-        
-        # Coverage Calculation (Updated formula)
-        # New: Masa Salarial / (RON Bruto + ROP Bruta)
-        denom_prev = total_bruta_prev_full + rop_bruta_prev
-        denom_curr = total_bruta_curr + rop_bruta_curr
-        
-        cov_prev = (total_salary_prev / denom_prev) if denom_prev > 0 else 0
-        cov_curr = (total_salary_curr / denom_curr) if denom_curr > 0 else 0
+        is_masa_incomplete = bool(f['masa_incompleta'])
+        ipc_missing = bool(f['ipc_missing'])
+        var_ipc_ia = f['var_ipc_ia']
+        rop_disponible_curr = f['rop_disponible']
         
         # Build Data Object
         data_by_period[period_id] = {
             "kpi": {
                 "recaudacion": {
-                    "current": total_recaudacion_curr / 1_000_000,
-                    "prev": total_recaudacion_prev_full / 1_000_000, 
-                    "neta_current": total_neta_curr / 1_000_000,
-                    "neta_prev": total_neta_prev_full / 1_000_000,
-                    "bruta_current": total_bruta_curr / 1_000_000,
-                    "bruta_prev": total_bruta_prev_full / 1_000_000,
-                    "disponible_current": total_recaudacion_curr / 1_000_000,
-                    "disponible_prev": total_recaudacion_prev_full / 1_000_000,
-
-                    "var_nom": rec_var_nom * 100,
-                    "var_real": (rec_var_real * 100) if rec_var_real is not None else None,
-                    "diff_nom": rec_diff_nom / 1_000_000,
+                    "current": f['recaudacion'] / 1_000_000,
+                    "prev": f['recaudacion_prev'] / 1_000_000, 
+                    "neta_current": f['recaudacion_neta'] / 1_000_000,
+                    "neta_prev": f['recaudacion_neta_prev'] / 1_000_000,
+                    "bruta_current": f['recaudacion_bruta'] / 1_000_000,
+                    "bruta_prev": f['recaudacion_bruta_prev'] / 1_000_000,
+                    "disponible_current": f['recaudacion'] / 1_000_000,
+                    "disponible_prev": f['recaudacion_prev'] / 1_000_000,
+
+                    "var_nom": f['rec_var_nom'] * 100,
+                    "var_real": _optional(f['rec_var_real'] * 100),
+                    "diff_nom": f['rec_diff_nom'] / 1_000_000,
                     "ipc_missing": ipc_missing,
                     "ipc_used_for_calc": var_ipc_ia * 100,
-                    "esperada": total_esperada_curr / 1_000_000,
-                    "brecha_abs": (total_neta_curr - total_esperada_curr) / 1_000_000,
-                    "brecha_pct": ((total_neta_curr / total_esperada_curr) - 1) * 100 if total_esperada_curr > 0 else 0
+                    "esperada": f['esperada'] / 1_000_000,
+                    "brecha_abs": f['brecha_abs'] / 1_000_000,
+                    "brecha_pct": f['brecha_pct']
                 },
                 "rop": {
-                    "bruta_current": rop_bruta_curr / 1_000_000,
-                    "bruta_prev": rop_bruta_prev / 1_000_000,
+                    "bruta_current": f['recaudacion_provincial'] / 1_000_000,
+                    "bruta_prev": f['recaudacion_provincial_prev'] / 1_000_000,
                     "disponible_current": rop_disponible_curr / 1_000_000,
-                    "disponible_prev": rop_disponible_prev / 1_000_000,
-                    "var_nom": rop_var_nom * 100,
-                    "var_real": (rop_var_real * 100) if rop_var_real is not None else None,
-                    "diff_nom": rop_diff_nom / 1_000_000,
-                    "diff_real": (rop_var_real * (rop_bruta_prev / (1 + var_ipc_ia)) / 1_000_000) if rop_var_real is not None else 0,
+                    "disponible_prev": f['rop_disponible_prev'] / 1_000_000,
+                    "var_nom": f['rop_var_nom'] * 100,
+                    "var_real": _optional(f['rop_var_real'] * 100),
+                    "diff_nom": f['rop_diff_nom'] / 1_000_000,
+                    "diff_real": f['rop_diff_real'] / 1_000_000,
 
                     "ipc_missing": ipc_missing,
                     "ipc_used_for_calc": var_ipc_ia * 100,
-                    "esperada_prov": total_esperada_prov_curr / 1_000_000,
-                    "brecha_abs_prov": (rop_bruta_curr - total_esperada_prov_curr) / 1_000_000,
-                    "brecha_pct_prov": ((rop_bruta_curr / total_esperada_prov_curr) - 1) * 100 if total_esperada_prov_curr > 0 else 0
+                    "esperada_prov": f['esperada_prov'] / 1_000_000,
+                    "brecha_abs_prov": f['brecha_abs_prov'] / 1_000_000,
+                    "brecha_pct_prov": f['brecha_pct_prov']
                 },
                 "resumen": {
-                    "total_disponible_current": total_disponible_curr / 1_000_000,
-                    "total_disponible_prev": total_disponible_prev / 1_000_000,
-                    "total_recursos_brutos_var_real": total_recursos_var_real * 100 if total_recursos_var_real is not None else None,
-                    "ron_disponible": total_recaudacion_curr / 1_000_000,
+                    "total_disponible_current": f['total_disponible'] / 1_000_000,
+                    "total_disponible_prev": f['total_disponible_prev'] / 1_000_000,
+                    "total_recursos_brutos_var_real": _optional(f['total_recursos_var_real'] * 100),
+                    "ron_disponible": f['recaudacion'] / 1_000_000,
                     "rop_disponible": rop_disponible_curr / 1_000_000,
-                    "post_sueldos_current": recursos_post_sueldos_curr / 1_000_000,
-                    "post_sueldos_prev": recursos_post_sueldos_prev / 1_000_000,
-                    "using_fallback_salary": bool(total_salary_curr == 0)
+                    "post_sueldos_current": f['post_sueldos'] / 1_000_000,
+                    "post_sueldos_prev": f['post_sueldos_prev'] / 1_000_000,
+                    "using_fallback_salary": is_masa_incomplete
                 },
                 "distribucion_municipal": {
-                    "current": unified_dist_muni_curr / 1_000_000,
-                    "prev": unified_dist_muni_prev / 1_000_000,
-                    "nacion_current": total_dist_muni_curr / 1_000_000,
-                    "nacion_prev": total_dist_muni_prev_full / 1_000_000,
-                    "provincia_current": dist_muni_prov_curr / 1_000_000,
-                    "provincia_prev": dist_muni_prov_prev / 1_000_000,
-                    "var_nom": dist_muni_var_nom * 100,
-                    "var_real": (dist_muni_var_real * 100) if dist_muni_var_real is not None else None,
-                    "diff_nom": dist_muni_diff_nom / 1_000_000,
-                    "diff_real": (dist_muni_diff_real / 1_000_000) if dist_muni_diff_real is not None else None,
-                    "ipc_missing": dist_muni_var_real_fallback,
+                    "current": f['dist_muni_total'] / 1_000_000,
+                    "prev": f['dist_muni_total_prev'] / 1_000_000,
+                    "nacion_current": f['distribucion_municipal'] / 1_000_000,
+                    "nacion_prev": f['distribucion_municipal_prev'] / 1_000_000,
+                    "provincia_current": f['distribucion_municipal_prov'] / 1_000_000,
+                    "provincia_prev": f['distribucion_municipal_prov_prev'] / 1_000_000,
+                    "var_nom": f['dm_var_nom'] * 100,
+                    "var_real": _optional(f['dm_var_real'] * 100),
+                    "diff_nom": f['dm_diff_nom'] / 1_000_000,
+                    "diff_real": _optional(f['dm_diff_real'] / 1_000_000),
+                    "ipc_missing": bool(f['dm_real_fallback']),
                     "ipc_used_for_calc": 0 # Compound weighting makes this hard to display as a single number
                 },
                 "masa_salarial": {
-                    "current": total_salary_curr / 1_000_000,
-                    "prev": total_salary_prev / 1_000_000,
-                    "var_nom": sal_var_nom * 100,
-                    "var_real": (sal_var_real * 100) if sal_var_real is not None else None,
+                    "current": f['masa_salarial'] / 1_000_000,
+                    "prev": f['masa_salarial_prev'] / 1_000_000,
+                    "var_nom": f['sal_var_nom'] * 100,
+                    "var_real": _optional(f['sal_var_real'] * 100),
                     "ipc_missing": ipc_missing,
                     "ipc_used_for_calc": var_ipc_ia * 100,
-                    "diff_nom": sal_diff_nom / 1_000_000,
-                    "cobertura_current": cov_curr * 100,
-                    "cobertura_prev": cov_prev * 100,
+                    "diff_nom": f['sal_diff_nom'] / 1_000_000,
+                    "cobertura_current": f['cobertura'] * 100,
+                    "cobertura_prev": f['cobertura_prev'] * 100,
                     "is_incomplete": is_masa_incomplete,
-                    "recurso_municipal_total": unified_dist_muni_curr / 1_000_000,
-                    "recurso_municipal_disponible": total_dist_muni_curr / 1_000_000
+                    "recurso_municipal_total": f['dist_muni_total'] / 1_000_000,
+                    "recurso_municipal_disponible": f['distribucion_municipal'] / 1_000_000
                 },
                 "meta": {
                     "periodo": f"{month_label} {iter_year}",
@@ -790,60 +964,52 @@ def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
             },
             "charts": {
                 "daily": {
-                    "labels": all_days['day'].astype(str).tolist(),
-                    "data_prev_nom": (daily_prev['recaudacion'] / 1_000_000).tolist(),
-                    "data_curr": (daily_curr['recaudacion'] / 1_000_000).tolist(),
-                    "data_esperada": (daily_curr['esperada'] / 1_000_000).tolist(),
+                    "labels": day_labels,
+                    "data_prev_nom": _millions(daily_prev),
+                    "data_curr": _millions(daily_curr),
+                    "data_esperada": _millions(daily_esp),
                 }
             }
         }
         
         # Add copa_vs_salario chart data 
-        masa_salarial_target = total_salary_curr
+        masa_salarial_target = f['masa_salarial']
         salary_target_month = month_label
         if is_masa_incomplete:
-            prev_m_target = m - 1
-            prev_y_target = iter_year
-            if prev_m_target == 0:
-                prev_m_target = 12
-                prev_y_target = iter_year - 1
-            salary_imm_prev_row = df_salary[(df_salary['anio'] == prev_y_target) & (df_salary['mes'] == prev_m_target)]
-            if not salary_imm_prev_row.empty:
-                masa_salarial_target = salary_imm_prev_row['masa_salarial'].values[0]
+            prev_y_target, prev_m_target = previous_month(iter_year, m)
+            if f['has_salary_prev_month']:
+                masa_salarial_target = f['masa_salarial_prev_month']
                 # FIX: actualizar el label al mes de donde se toma la masa salarial
                 salary_target_month = MONTH_NAMES.get(prev_m_target, str(prev_m_target))
             else:
-                masa_salarial_target = total_salary_prev # Fallback to same month previous year if immediately previous is also missing
+                masa_salarial_target = f['masa_salarial_prev'] # Fallback to same month previous year if immediately previous is also missing
                 salary_target_month = month_label
             
-        daily_curr['recaudacion_acumulada'] = daily_curr['recaudacion'].cumsum()
-        daily_curr['neta_acumulada'] = (df_daily_curr['recaudacion_neta'].cumsum() if 'recaudacion_neta' in df_daily_curr.columns else daily_curr['recaudacion_acumulada'])
-        daily_curr['esperada_acumulada'] = daily_curr['esperada'].cumsum()
         now = datetime.now()
         is_running_month = (iter_year == now.year and m == now.month)
         
+        # Cumulative series are cut after the last day with data
+        days = np.arange(1, days_in_month + 1)
         if (is_running_month or not is_complete) and max_day_curr > 0:
-            daily_curr.loc[daily_curr['day'] > max_day_curr, 'recaudacion_acumulada'] = None
-            daily_curr.loc[daily_curr['day'] > max_day_curr, 'neta_acumulada'] = None
-            daily_curr.loc[daily_curr['day'] > max_day_curr, 'esperada_acumulada'] = None
+            keep = days <= max_day_curr
         elif not is_running_month and max_day_curr == 0:
-             daily_curr['recaudacion_acumulada'] = None
-             daily_curr['neta_acumulada'] = None
-             daily_curr['esperada_acumulada'] = None
+            keep = np.zeros(days_in_month, dtype=bool)
+        else:
+            keep = None
 
         # ROP: serie mensual concentrada en el último día con datos
-        cumulative_rop = [None] * len(daily_curr)
+        cumulative_rop = [None] * days_in_month
         if max_day_curr > 0:
             cumulative_rop[max_day_curr - 1] = rop_disponible_curr / 1_000_000
 
         data_by_period[period_id]["charts"]["copa_vs_salario"] = {
-            "labels": daily_curr['day'].astype(str).tolist(),
-            "cumulative_copa": [x / 1_000_000 if pd.notna(x) else None for x in daily_curr['recaudacion_acumulada'].tolist()],
-            "cumulative_neta": [x / 1_000_000 if pd.notna(x) else None for x in daily_curr['neta_acumulada'].tolist()],
-            "cumulative_esperada": [x / 1_000_000 if pd.notna(x) else None for x in daily_curr['esperada_acumulada'].tolist()],
+            "labels": day_labels,
+            "cumulative_copa": _millions(cube_slice(cube, cum_rec, iter_year, m, days_in_month), keep),
+            "cumulative_neta": _millions(cube_slice(cube, cum_neta, iter_year, m, days_in_month), keep),
+            "cumulative_esperada": _millions(cube_slice(cube, cum_esperada, iter_year, m, days_in_month), keep),
             "cumulative_rop": cumulative_rop,
             "rop_disponible": rop_disponible_curr / 1_000_000,
-            "salario_target": [(masa_salarial_target / 1_000_000)] * len(daily_curr),
+            "salario_target": [(masa_salarial_target / 1_000_000)] * days_in_month,
             "copa_label": month_label,
             "salario_label": salary_target_month
         }
@@ -863,37 +1029,120 @@ def process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
     
     return data
 
-def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov):
+def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov, store=None, deflator=None):
     """
     Generate data for the Monitor Anual: Years are selectable backward.
     Logic includes YTD for incomplete current year.
-    """
-    all_years = sorted(df_daily['year'].unique(), reverse=True)
-    
-    available_periods = []
-    data_by_period = {}
-    
-    default_period_id = None
     
+    Every measure is pivoted once into a year x month grid (from the period store); cumulative
+    series are a cumsum along the month axis, YTD totals a masked sum over `month <= max_month`,
+    and the IPC-adjusted previous-year values an aligned multiply against the previous grid row.
+    """
+    if store is None:
+        store = build_period_store(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov)
+    if deflator is None:
+        deflator = Deflator.from_frame(df_ipc)
+        
     MONTH_NAMES = {
         1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
         7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
     }
+    labels_months = [MONTH_NAMES[m] for m in range(1, 13)]
+    
+    completeness = store['completeness']
+    data_years = sorted(set(completeness.index.get_level_values('year')))
+    if not data_years:
+        return {"meta": {"available_periods": [], "default_period_id": None}, "data": {}}
+    
+    # --- Year x Month grid (one extra year at the start so every year has its previous row) ---
+    grid_years = list(range(data_years[0] - 1, data_years[-1] + 1))
+    grid = store['monthly'].reindex(
+        index=pd.MultiIndex.from_product([grid_years, range(1, 13)], names=['year', 'month']),
+        columns=RON_MEASURES + ['esperada', 'esperada_prov', 'masa_salarial',
+                                'recaudacion_provincial', 'distribucion_municipal_prov']
+    )
+    
+    def pivot(col, fill=0.0):
+        values = grid[col] if fill is None else grid[col].fillna(fill)
+        return values.to_numpy(dtype=float).reshape(len(grid_years), 12)
+    
+    def curr(arr):
+        return arr[1:]
+    
+    def prev(arr):
+        return arr[:-1]
+    
+    rec = pivot('recaudacion')
+    bruta = pivot('recaudacion_bruta')
+    neta = pivot('recaudacion_neta')
+    muni_nacion = pivot('distribucion_municipal')
+    rop_bruta = pivot('recaudacion_provincial')
+    muni_prov = pivot('distribucion_municipal_prov')
+    muni = muni_nacion + muni_prov
+    esperada = curr(pivot('esperada'))
+    esperada_prov = curr(pivot('esperada_prov'))
+    masa = pivot('masa_salarial')
+    
+    years = np.array(grid_years[1:])
+    months = np.arange(1, 13)
+    
+    # Max month with actual data and YTD mask
+    has_data = completeness['has_data'].reindex(grid.index, fill_value=False).to_numpy(dtype=bool).reshape(len(grid_years), 12)[1:]
+    max_month = np.where(has_data.any(axis=1), 12 - np.argmax(has_data[:, ::-1], axis=1), 0)
+    ytd = months[None, :] <= max_month[:, None]
+    year_closed = completeness['year_closed'].groupby(level='year').any()
+    
+    def ytd_sum(arr):
+        return (arr * ytd).sum(axis=1)
+    
+    # IPC Unified Logic (Nación only): year-over-year factor per month
+    ipc_yoy = deflator.yoy_factor(years[:, None], months[None, :])
+    ipc_ok = ~np.isnan(ipc_yoy)
+    var_ipc = np.where(ipc_ok, ipc_yoy - 1, 0.0)
+    ipc_missing = (ytd & ~ipc_ok).any(axis=1)
+    avg_ipc = np.where(max_month > 0, ytd_sum(var_ipc) / np.maximum(max_month, 1), 0.0)
+    
+    # YTD totals
+    rec_c, rec_p = ytd_sum(curr(rec)), ytd_sum(prev(rec))
+    neta_c, neta_p = ytd_sum(curr(neta)), ytd_sum(prev(neta))
+    bruta_c, bruta_p = ytd_sum(curr(bruta)), ytd_sum(prev(bruta))
+    muni_c, muni_p = ytd_sum(curr(muni)), ytd_sum(prev(muni))
+    muni_nacion_c, muni_nacion_p = ytd_sum(curr(muni_nacion)), ytd_sum(prev(muni_nacion))
+    muni_prov_c, muni_prov_p = ytd_sum(curr(muni_prov)), ytd_sum(prev(muni_prov))
+    rop_c, rop_p = ytd_sum(curr(rop_bruta)), ytd_sum(prev(rop_bruta))
+    masa_c, masa_p = ytd_sum(curr(masa)), ytd_sum(prev(masa))
+    
+    # Previous year adjusted by IPC, month by month
+    real_prev_adjusted = ytd_sum(prev(rec) * (1 + var_ipc))
+    real_muni_prev_adjusted = ytd_sum(prev(muni) * (1 + var_ipc))
+    real_reca_prov_prev_adjusted = ytd_sum(prev(rop_bruta) * (1 + var_ipc))
+    
+    # Cumulative series (full year)
+    cum_copa = np.cumsum(curr(rec), axis=1)
+    cum_bruta = np.cumsum(curr(bruta), axis=1)
+    cum_neta = np.cumsum(curr(neta), axis=1)
+    cum_esperada = np.cumsum(esperada, axis=1)
+    cum_salario = np.cumsum(curr(masa), axis=1)
+    sum_esperada = esperada.sum(axis=1)
+    sum_esperada_prov = esperada_prov.sum(axis=1)
+    
+    def series(values, keep):
+        return [float(v) if k else None for v, k in zip(values, keep)]
+    
+    def pct(num, den):
+        return (num / den * 100) if den > 0 else 0
+    
+    available_periods = []
+    data_by_period = {}
+    default_period_id = None
 
-    for iter_year in all_years:
-        prev_year = iter_year - 1
-        
-        df_y_curr = df_daily[df_daily['year'] == iter_year]
-        if df_y_curr.empty:
-            continue
-            
-        # Determine max month for iter_year with actual data
-        df_y_curr_real = df_y_curr[df_y_curr['recaudacion'] > 0]
-        if df_y_curr_real.empty:
+    for i in range(len(years) - 1, -1, -1):
+        iter_year = int(years[i])
+        max_month_curr = int(max_month[i])
+        if max_month_curr == 0:
             continue
             
-        max_month_curr = int(df_y_curr_real['month'].max())
-        is_complete = (max_month_curr == 12)
+        is_complete = bool(year_closed.get(iter_year, False))
         
         if is_complete and default_period_id is None:
             default_period_id = str(iter_year)
@@ -902,224 +1151,52 @@ def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_rec
         available_periods.append({
             "id": period_id,
             "label": f"Año {iter_year}",
-            "year": int(iter_year),
+            "year": iter_year,
             "incomplete": not is_complete
         })
         
-        df_y_prev = df_daily[df_daily['year'] == prev_year]
-        
-        # YTD KPIs
-        recaudacion_curr = 0
-        recaudacion_prev = 0
-        recaudacion_neta_curr = 0
-        recaudacion_neta_prev = 0
-        recaudacion_bruta_curr = 0
-        recaudacion_bruta_prev = 0
-        avg_ipc_used = 0
-        ipc_count = 0
-        ipc_missing_flag = False
-        distribucion_municipal_curr = 0
-        distribucion_municipal_prev = 0
-        distribucion_municipal_nacion_curr = 0
-        distribucion_municipal_nacion_prev = 0
-        distribucion_municipal_prov_curr = 0
-        distribucion_municipal_prov_prev = 0
-        
-        recaudacion_provincial_curr = 0
-        recaudacion_provincial_prev = 0
-        
-        real_prev_adjusted = 0
-        real_muni_prev_adjusted = 0
-        real_reca_prov_prev_adjusted = 0
-        
-        masa_curr = 0
-        masa_prev = 0
-        
-        # Monthly charts arrays
-        monthly_nom_curr = []
-        monthly_nom_prev = []
-        labels_months = []
-        
-        cumulative_copa = []
-        cumulative_bruta = []
-        cumulative_neta = []
-        cumulative_esperada = []
-        salario_target = []
-        
-        sum_copa = 0
-        sum_bruta = 0
-        sum_neta = 0
-        sum_esperada = 0
-        sum_esperada_prov = 0
-        sum_salario = 0
-
-
-        for m in range(1, 13):
-            labels_months.append(MONTH_NAMES[m])
-            
-            df_m_curr = df_y_curr[df_y_curr['month'] == m]
-            df_m_prev = df_y_prev[df_y_prev['month'] == m]
-            df_m_esp = df_esperada[(df_esperada['year'] == iter_year) & (df_esperada['month'] == m)]
-            
-            val_curr = float(df_m_curr['recaudacion'].sum()) if not df_m_curr.empty else 0.0
-            val_prev = float(df_m_prev['recaudacion'].sum()) if not df_m_prev.empty else 0.0
-            
-            val_bruta_curr = float(df_m_curr['recaudacion_bruta'].sum()) if not df_m_curr.empty else 0.0
-            val_bruta_prev = float(df_m_prev['recaudacion_bruta'].sum()) if not df_m_prev.empty else 0.0
-            
-            # Provincial Distribution - ROP (Recaudacion de Origen Provincial)
-            df_reca_prov_m_curr = df_reca_prov[(df_reca_prov['year'] == iter_year) & (df_reca_prov['month'] == m)]
-            val_rop_bruta_curr = float(df_reca_prov_m_curr['recaudacion_provincial'].sum()) if not df_reca_prov_m_curr.empty else 0.0
-            val_muni_prov_curr = float(df_reca_prov_m_curr['distribucion_municipal_prov'].sum()) if not df_reca_prov_m_curr.empty else 0.0
-            val_rop_disponible_curr = val_rop_bruta_curr - val_muni_prov_curr
-            
-            df_reca_prov_m_prev = df_reca_prov[(df_reca_prov['year'] == prev_year) & (df_reca_prov['month'] == m)]
-            val_rop_bruta_prev = float(df_reca_prov_m_prev['recaudacion_provincial'].sum()) if not df_reca_prov_m_prev.empty else 0.0
-            val_muni_prov_prev = float(df_reca_prov_m_prev['distribucion_municipal_prov'].sum()) if not df_reca_prov_m_prev.empty else 0.0
-            val_rop_disponible_prev = val_rop_bruta_prev - val_muni_prov_prev
-
-            val_muni_nacion_curr = float(df_m_curr['distribucion_municipal'].sum()) if not df_m_curr.empty else 0.0
-            val_muni_nacion_prev = float(df_m_prev['distribucion_municipal'].sum()) if not df_m_prev.empty else 0.0
-
-            val_muni_curr = val_muni_nacion_curr + val_muni_prov_curr
-            val_muni_prev = val_muni_nacion_prev + val_muni_prov_prev
-                
-            if 'recaudacion_neta' in df_m_curr.columns:
-                val_neta_curr = float(df_m_curr['recaudacion_neta'].sum())
-            else:
-                val_neta_curr = val_curr
-
-            val_esp = float(df_m_esp['esperada'].sum()) if not df_m_esp.empty and 'esperada' in df_m_esp.columns else 0.0
-            val_esp_prov = float(df_m_esp['esperada_prov'].sum()) if not df_m_esp.empty and 'esperada_prov' in df_m_esp.columns else 0.0
-            
-            masa_curr_row = df_salary[(df_salary['anio'] == iter_year) & (df_salary['mes'] == m)]
-            masa_prev_row = df_salary[(df_salary['anio'] == prev_year) & (df_salary['mes'] == m)]
-            
-            m_curr = float(masa_curr_row['masa_salarial'].values[0]) if not masa_curr_row.empty else 0.0
-            m_prev = float(masa_prev_row['masa_salarial'].values[0]) if not masa_prev_row.empty else 0.0
-            
-            monthly_nom_curr.append(val_curr if val_curr > 0 else None)
-            monthly_nom_prev.append(val_prev if val_prev > 0 else None)
-            
-            # Cumulative values build up to Month 12 but use None if missing
-            sum_copa += val_curr
-            sum_bruta += val_bruta_curr
-            sum_neta += val_neta_curr
-            sum_esperada += val_esp
-            sum_esperada_prov += val_esp_prov
-            sum_salario += m_curr
-            
-            # Additional logic for Summary row and Salary fallback
-            sal_for_calc_m_curr = m_curr
-            if m_curr == 0 and m <= max_month_curr:
-                # Try fallback for annual calculation
-                prev_m_t = m - 1
-                prev_y_t = iter_year
-                if prev_m_t == 0:
-                    prev_m_t = 12
-                    prev_y_t = iter_year - 1
-                sal_fallback_row = df_salary[(df_salary['anio'] == prev_y_t) & (df_salary['mes'] == prev_m_t)]
-                sal_for_calc_m_curr = sal_fallback_row['masa_salarial'].values[0] if not sal_fallback_row.empty else 0
-
-            # Cumulative build up - using available data
-            cumulative_copa.append(sum_copa if val_curr > 0 else None)
-            cumulative_bruta.append(sum_bruta if val_bruta_curr > 0 else None)
-            cumulative_neta.append(sum_neta if val_neta_curr > 0 else None)
-            cumulative_esperada.append(sum_esperada if val_esp > 0 or (iter_year == 2026 and m <= 12) else None)
-            salario_target.append(sum_salario if m_curr > 0 else None)
-            
-            # YTD Accumulation
-            if m <= max_month_curr:
-                recaudacion_curr += val_curr
-                recaudacion_prev += val_prev
-                recaudacion_neta_curr += val_neta_curr
-                recaudacion_neta_prev += float(df_m_prev['recaudacion_neta'].sum()) if not df_m_prev.empty else 0.0
-                recaudacion_bruta_curr += val_bruta_curr
-                recaudacion_bruta_prev += val_bruta_prev
-                
-                distribucion_municipal_curr += val_muni_curr
-                distribucion_municipal_prev += val_muni_prev
-                distribucion_municipal_nacion_curr += val_muni_nacion_curr
-                distribucion_municipal_nacion_prev += val_muni_nacion_prev
-                distribucion_municipal_prov_curr += val_muni_prov_curr
-                distribucion_municipal_prov_prev += val_muni_prov_prev
-                
-                recaudacion_provincial_curr += val_rop_bruta_curr
-                recaudacion_provincial_prev += val_rop_bruta_prev
-                
-                masa_curr += m_curr
-                # For summary we might need the fallback accumulated
-                # (Skipping deep accumulation fallback for post_sueldos_total for now unless strictly needed)
-                masa_prev += m_prev
-                
-                # IPC Unified Logic (Nación only)
-                ipc_c = df_ipc[(df_ipc['year'] == iter_year) & (df_ipc['month'] == m)]
-                ipc_p = df_ipc[(df_ipc['year'] == prev_year) & (df_ipc['month'] == m)]
-                
-                val_ipc_c = ipc_c['ipc_valor'].values[0] if not ipc_c.empty else None
-                val_ipc_p = ipc_p['ipc_valor'].values[0] if not ipc_p.empty else None
-                
-                var_ipc_ia = 0
-                if val_ipc_c and val_ipc_p:
-                    var_ipc_ia = (val_ipc_c / val_ipc_p) - 1
-                else:
-                    ipc_missing_flag = True
-                    var_ipc_ia = 0
-                
-                avg_ipc_used += var_ipc_ia
-                ipc_count += 1
-                
-                real_prev_adjusted += val_prev * (1 + var_ipc_ia)
-                real_muni_prev_adjusted += val_muni_prev * (1 + var_ipc_ia)
-                real_reca_prov_prev_adjusted += val_rop_bruta_prev * (1 + var_ipc_ia)
-
-        avg_ipc_ia = (avg_ipc_used / ipc_count) if ipc_count > 0 else 0
+        recaudacion_curr, recaudacion_prev = float(rec_c[i]), float(rec_p[i])
+        recaudacion_provincial_curr, recaudacion_provincial_prev = float(rop_c[i]), float(rop_p[i])
+        distribucion_municipal_curr, distribucion_municipal_prev = float(muni_c[i]), float(muni_p[i])
+        masa_curr, masa_prev = float(masa_c[i]), float(masa_p[i])
+        avg_ipc_ia = float(avg_ipc[i])
+        ipc_missing_flag = bool(ipc_missing[i])
+        esp_total = float(sum_esperada[i])
+        esp_prov_total = float(sum_esperada_prov[i])
         
         diff_nom_rec = recaudacion_curr - recaudacion_prev
-        var_nom_rec = (diff_nom_rec / recaudacion_prev * 100) if recaudacion_prev > 0 else 0
-        
-        diff_real_rec = recaudacion_curr - real_prev_adjusted
-        var_real_rec = (diff_real_rec / real_prev_adjusted * 100) if real_prev_adjusted > 0 else 0
+        diff_real_rec = recaudacion_curr - real_prev_adjusted[i]
         
         # Distribucion Municipal Unified
         diff_nom_muni = distribucion_municipal_curr - distribucion_municipal_prev
-        var_nom_muni = (diff_nom_muni / distribucion_municipal_prev * 100) if distribucion_municipal_prev > 0 else 0
+        diff_real_muni = distribucion_municipal_curr - real_muni_prev_adjusted[i]
         
-        real_muni_unified_prev_adjusted = real_muni_prev_adjusted
-        diff_real_muni = distribucion_municipal_curr - real_muni_unified_prev_adjusted
-        var_real_muni = (diff_real_muni / real_muni_unified_prev_adjusted * 100) if real_muni_unified_prev_adjusted > 0 else 0
         # Summary KPIs
         ron_disponible_curr = recaudacion_curr
-        rop_disponible_curr = recaudacion_provincial_curr - distribucion_municipal_prov_curr
+        rop_disponible_curr = recaudacion_provincial_curr - muni_prov_c[i]
         total_disponible_curr = ron_disponible_curr + rop_disponible_curr
         
         ron_disponible_prev = recaudacion_prev
-        rop_disponible_prev = recaudacion_provincial_prev - distribucion_municipal_prov_prev
+        rop_disponible_prev = recaudacion_provincial_prev - muni_prov_p[i]
         total_disponible_prev = ron_disponible_prev + rop_disponible_prev
         
         post_sueldos_curr = total_disponible_curr - masa_curr
         post_sueldos_prev = total_disponible_prev - masa_prev
         
         # Coverage calculation for year (Salary / (RON Bruta + ROP Bruta))
-        denom_y_curr = recaudacion_bruta_curr + recaudacion_provincial_curr
-        denom_y_prev = recaudacion_bruta_prev + recaudacion_provincial_prev
+        denom_y_curr = bruta_c[i] + recaudacion_provincial_curr
+        denom_y_prev = bruta_p[i] + recaudacion_provincial_prev
         
         coverage_y_curr = (masa_curr / denom_y_curr) if denom_y_curr > 0 else 0
         coverage_y_prev = (masa_prev / denom_y_prev) if denom_y_prev > 0 else 0
         
         # Recaudacion Provincial
         diff_nom_reca_prov = recaudacion_provincial_curr - recaudacion_provincial_prev
-        var_nom_reca_prov = (diff_nom_reca_prov / recaudacion_provincial_prev * 100) if recaudacion_provincial_prev > 0 else 0
-        
-        diff_real_reca_prov = recaudacion_provincial_curr - real_reca_prov_prev_adjusted
-        var_real_reca_prov = (diff_real_reca_prov / real_reca_prov_prev_adjusted * 100) if real_reca_prov_prev_adjusted > 0 else 0
+        diff_real_reca_prov = recaudacion_provincial_curr - real_reca_prov_prev_adjusted[i]
 
         diff_nom_masa = masa_curr - masa_prev
-        var_nom_masa = (diff_nom_masa / masa_prev * 100) if masa_prev > 0 else 0
-        
         masa_prev_adjusted = masa_prev * (1 + avg_ipc_ia)
         diff_real_masa = masa_curr - masa_prev_adjusted
-        var_real_masa = (diff_real_masa / masa_prev_adjusted * 100) if masa_prev_adjusted > 0 else 0
         
         data_by_period[period_id] = {
             "kpi": {
@@ -1139,44 +1216,44 @@ def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_rec
                 "recaudacion": {
                     "current": recaudacion_curr / 1_000_000,
                     "prev": recaudacion_prev / 1_000_000,
-                    "neta_current": recaudacion_neta_curr / 1_000_000,
-                    "neta_prev": recaudacion_neta_prev / 1_000_000,
-                    "bruta_current": recaudacion_bruta_curr / 1_000_000,
-                    "bruta_prev": recaudacion_bruta_prev / 1_000_000,
+                    "neta_current": neta_c[i] / 1_000_000,
+                    "neta_prev": neta_p[i] / 1_000_000,
+                    "bruta_current": bruta_c[i] / 1_000_000,
+                    "bruta_prev": bruta_p[i] / 1_000_000,
                     "diff_nom": diff_nom_rec / 1_000_000,
-                    "var_nom": var_nom_rec,
-                    "var_real": var_real_rec,
+                    "var_nom": pct(diff_nom_rec, recaudacion_prev),
+                    "var_real": pct(diff_real_rec, real_prev_adjusted[i]),
                     "ipc_missing": ipc_missing_flag,
                     "avg_ipc_used": avg_ipc_ia * 100,
-                    "esperada": sum_esperada / 1_000_000 if sum_esperada > 0 else 0,
-                    "brecha_abs": (recaudacion_neta_curr - sum_esperada) / 1_000_000 if sum_esperada > 0 else 0,
-                    "brecha_pct": ((recaudacion_neta_curr / sum_esperada) - 1) * 100 if sum_esperada > 0 else 0
+                    "esperada": esp_total / 1_000_000 if esp_total > 0 else 0,
+                    "brecha_abs": (neta_c[i] - esp_total) / 1_000_000 if esp_total > 0 else 0,
+                    "brecha_pct": ((neta_c[i] / esp_total) - 1) * 100 if esp_total > 0 else 0
                 },
                 "rop": {
                     "bruta_current": recaudacion_provincial_curr / 1_000_000,
                     "bruta_prev": recaudacion_provincial_prev / 1_000_000,
                     "disponible_current": rop_disponible_curr / 1_000_000,
                     "disponible_prev": rop_disponible_prev / 1_000_000,
-                    "var_nom": var_nom_reca_prov,
-                    "var_real": var_real_reca_prov,
+                    "var_nom": pct(diff_nom_reca_prov, recaudacion_provincial_prev),
+                    "var_real": pct(diff_real_reca_prov, real_reca_prov_prev_adjusted[i]),
                     "diff_nom": diff_nom_reca_prov / 1_000_000,
                     "ipc_missing": ipc_missing_flag,
                     "avg_ipc_used": avg_ipc_ia * 100,
-                    "esperada_prov": sum_esperada_prov / 1_000_000 if sum_esperada_prov > 0 else 0,
-                    "brecha_abs_prov": (recaudacion_provincial_curr - sum_esperada_prov) / 1_000_000 if sum_esperada_prov > 0 else 0,
-                    "brecha_pct_prov": ((recaudacion_provincial_curr / sum_esperada_prov) - 1) * 100 if sum_esperada_prov > 0 else 0
+                    "esperada_prov": esp_prov_total / 1_000_000 if esp_prov_total > 0 else 0,
+                    "brecha_abs_prov": (recaudacion_provincial_curr - esp_prov_total) / 1_000_000 if esp_prov_total > 0 else 0,
+                    "brecha_pct_prov": ((recaudacion_provincial_curr / esp_prov_total) - 1) * 100 if esp_prov_total > 0 else 0
                 },
                 "distribucion_municipal": {
                     "current": distribucion_municipal_curr / 1_000_000,
                     "prev": distribucion_municipal_prev / 1_000_000,
-                    "nacion_current": distribucion_municipal_nacion_curr / 1_000_000,
-                    "nacion_prev": distribucion_municipal_nacion_prev / 1_000_000,
-                    "provincia_current": distribucion_municipal_prov_curr / 1_000_000,
-                    "provincia_prev": distribucion_municipal_prov_prev / 1_000_000,
+                    "nacion_current": muni_nacion_c[i] / 1_000_000,
+                    "nacion_prev": muni_nacion_p[i] / 1_000_000,
+                    "provincia_current": muni_prov_c[i] / 1_000_000,
+                    "provincia_prev": muni_prov_p[i] / 1_000_000,
                     "diff_nom": diff_nom_muni / 1_000_000,
                     "diff_real": diff_real_muni / 1_000_000,
-                    "var_nom": var_nom_muni,
-                    "var_real": var_real_muni,
+                    "var_nom": pct(diff_nom_muni, distribucion_municipal_prev),
+                    "var_real": pct(diff_real_muni, real_muni_prev_adjusted[i]),
                     "ipc_missing": ipc_missing_flag,
                     "ipc_used_for_calc": 0
                 },
@@ -1184,30 +1261,30 @@ def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_rec
                     "current": masa_curr / 1_000_000,
                     "prev": masa_prev / 1_000_000,
                     "diff_nom": diff_nom_masa / 1_000_000,
-                    "var_nom": var_nom_masa,
-                    "var_real": var_real_masa,
+                    "var_nom": pct(diff_nom_masa, masa_prev),
+                    "var_real": pct(diff_real_masa, masa_prev_adjusted),
                     "ipc_missing": ipc_missing_flag,
                     "avg_ipc_used": avg_ipc_ia * 100,
                     "cobertura_current": coverage_y_curr * 100,
                     "cobertura_prev": coverage_y_prev * 100,
                     "is_incomplete": (masa_curr == 0),
                     "recurso_municipal_total": distribucion_municipal_curr / 1_000_000,
-                    "recurso_municipal_disponible": distribucion_municipal_nacion_curr / 1_000_000
+                    "recurso_municipal_disponible": muni_nacion_c[i] / 1_000_000
                 }
             },
             "charts": {
                 "monthly": {
                     "labels": labels_months,
-                    "data_curr": monthly_nom_curr,
-                    "data_prev": monthly_nom_prev
+                    "data_curr": series(rec[i + 1], rec[i + 1] > 0),
+                    "data_prev": series(rec[i], rec[i] > 0)
                 },
                 "copa_vs_salario": {
                     "labels": labels_months,
-                    "cumulative_copa": cumulative_copa,
-                    "cumulative_bruta": cumulative_bruta,
-                    "cumulative_neta": cumulative_neta,
-                    "salario_target": salario_target,
-                    "cumulative_esperada": cumulative_esperada,
+                    "cumulative_copa": series(cum_copa[i], rec[i + 1] > 0),
+                    "cumulative_bruta": series(cum_bruta[i], bruta[i + 1] > 0),
+                    "cumulative_neta": series(cum_neta[i], neta[i + 1] > 0),
+                    "salario_target": series(cum_salario[i], masa[i + 1] > 0),
+                    "cumulative_esperada": series(cum_esperada[i], (esperada[i] > 0) | (iter_year == 2026)),
                     "copa_label": f"Año {iter_year}",
                     "salario_label": f"Año {iter_year}"
                 }
@@ -1222,18 +1299,18 @@ def process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_rec
         "data": data_by_period
     }
 
-def process_annual_data(df_daily, df_ipc):
+def process_annual_data(df_daily, df_ipc, store=None, deflator=None):
     """
     Process annual data for the last 4 years (regardless of completeness).
     """
+    if store is None:
+        store = build_period_store(df_daily, df_ipc=df_ipc)
+    if deflator is None:
+        deflator = Deflator.from_frame(df_ipc)
+        
     # 1. Identify COMPLETE years (having data for December)
-    all_years = sorted(df_daily['year'].unique())
-    
-    complete_years = []
-    for y in all_years:
-        has_december = not df_daily[(df_daily['year'] == y) & (df_daily['month'] == 12)].empty
-        if has_december:
-            complete_years.append(y)
+    completeness = store['completeness']
+    complete_years = sorted(set(completeness.index[completeness['year_closed']].get_level_values('year')))
             
     # Select last 4 complete years
     target_years = complete_years[-4:] if len(complete_years) > 0 else []
@@ -1243,13 +1320,12 @@ def process_annual_data(df_daily, df_ipc):
     
     # Find Base IPC (Fixed: Jan 2022) or first available year in target
     base_year = target_years[0] if target_years else 2022
-    ipc_base_row = df_ipc[(df_ipc['year'] == base_year) & (df_ipc['month'] == 1)]
+    base_period = (base_year, 1)
     
-    if not ipc_base_row.empty:
-        ipc_base_val = ipc_base_row['ipc_valor'].values[0]
+    if pd.notna(deflator.index(*base_period)):
         base_label = f"Enero {base_year}"
     else:
-        ipc_base_val = df_ipc['ipc_valor'].iloc[0] if not df_ipc.empty else 100
+        base_period = deflator.first_available()
         base_label = "Base Inicial"
         
     prev_nominal = None
@@ -1257,23 +1333,14 @@ def process_annual_data(df_daily, df_ipc):
 
     for y in target_years:
         # Aggregates
-        df_y = df_daily[df_daily['year'] == y]
-        nominal_total = df_y['recaudacion'].sum()
+        nominal_total = sum(period_value(store, y, m, 'recaudacion') for m in range(1, 13))
         
-        # Real Total (Deflated to Base Period)
+        # Real Total (Deflated to Base Period); months without IPC count at nominal value
         real_total = 0
         for m in range(1, 13):
-            month_revRev = df_y[df_y['month'] == m]['recaudacion'].sum()
-            
-            ipc_m_row = df_ipc[(df_ipc['year'] == y) & (df_ipc['month'] == m)]
-            ipc_m_val = ipc_m_row['ipc_valor'].values[0] if not ipc_m_row.empty else None
-            
-            if ipc_m_val and ipc_base_val:
-                factor = ipc_base_val / ipc_m_val
-                real_month = month_revRev * factor
-                real_total += real_month
-            else:
-                real_total += month_revRev
+            month_revRev = period_value(store, y, m, 'recaudacion')
+            factor = deflator.to_base(y, m, base_period) if base_period is not None else np.nan
+            real_total += month_revRev * factor if pd.notna(factor) else month_revRev
 
         # Calculate Variations
         var_nom = None
@@ -1304,30 +1371,22 @@ def process_annual_data(df_daily, df_ipc):
         }
     }
 
-def process_chart_data(df_daily, df_ipc, df_reca_prov=None):
+def process_chart_data(df_daily, df_ipc, df_reca_prov=None, store=None, deflator=None):
     """
     Process interannual variations for Total Resources and inflation for the last 12 COMPLETE months.
     Only includes months where we have complete data (through at least day 25).
     """
-    # 1. Determine completeness for each month
-    completeness_data = []
-    
-    for (year, month), group in df_daily.groupby(['year', 'month']):
-        real_data = group[group['recaudacion'] > 0]
-        max_day = real_data['day'].max() if not real_data.empty else 0
-        is_complete = max_day >= 25
+    if store is None:
+        store = build_period_store(df_daily, df_ipc=df_ipc, df_reca_prov=df_reca_prov)
+    if deflator is None:
+        deflator = Deflator.from_frame(df_ipc)
         
-        completeness_data.append({
-            'year': year,
-            'month': month,
-            'is_complete': is_complete
-        })
-    
-    df_completeness = pd.DataFrame(completeness_data)
+    # 1. Determine completeness for each month (data through COMPLETE_DAY)
+    completeness = store['completeness']
+    df_completeness = completeness[['day_rule']].rename(columns={'day_rule': 'is_complete'}).reset_index()
     
-    # 2. Group daily coparticipation by year and month using Bruta
-    group_cols = ['year', 'month']
-    df_monthly = df_daily.groupby(group_cols)[['recaudacion', 'recaudacion_neta', 'recaudacion_bruta']].sum().reset_index()
+    # 2. Monthly coparticipation totals (Bruta) from the period store
+    df_monthly = store['monthly'].loc[completeness.index, ['recaudacion', 'recaudacion_neta', 'recaudacion_bruta']].reset_index()
     
     # Merge with Provincial Recaudacion (ROP) for "Total Resources"
     if df_reca_prov is not None:
@@ -1346,15 +1405,16 @@ def process_chart_data(df_daily, df_ipc, df_reca_prov=None):
     # 4. Filter only complete months
     df_monthly = df_monthly[df_monthly['is_complete'] == True].copy()
     
-    # 5. Merge with IPC (Nación)
-    df_combined = pd.merge(df_monthly, df_ipc, on=['year', 'month'], how='left')
-    df_combined = df_combined.sort_values(['year', 'month'])
+    # 5. IPC (Nación) year-over-year factor
+    df_combined = df_monthly.sort_values(['year', 'month'])
+    ipc_yoy = deflator.yoy_factor(df_combined['year'].to_numpy(), df_combined['month'].to_numpy())
+    df_combined['ipc_var_interanual'] = (ipc_yoy - 1) * 100
     
     # 6. Calculate interannual variations (year-over-year)
     df_combined['year_prev'] = df_combined['year'] - 1
     
-    df_prev = df_combined[['year', 'month', 'recursos_totales', 'ipc_valor']].copy()
-    df_prev.columns = ['year_prev', 'month', 'recursos_totales_prev', 'ipc_valor_prev']
+    df_prev = df_combined[['year', 'month', 'recursos_totales']].copy()
+    df_prev.columns = ['year_prev', 'month', 'recursos_totales_prev']
     
     df_combined = pd.merge(
         df_combined, 
@@ -1364,7 +1424,6 @@ def process_chart_data(df_daily, df_ipc, df_reca_prov=None):
     )
     
     df_combined['total_var_interanual'] = ((df_combined['recursos_totales'] / df_combined['recursos_totales_prev']) - 1) * 100
-    df_combined['ipc_var_interanual'] = ((df_combined['ipc_valor'] / df_combined['ipc_valor_prev']) - 1) * 100
     
     # 7. Get last 12 complete months
     df_chart = df_combined.dropna(subset=['total_var_interanual', 'ipc_var_interanual']).tail(12)
@@ -1438,33 +1497,11 @@ def fetch_cbt():
 
 def fetch_salary_details(target_years):
     """
-    Fetch detailed salary data for Purchasing Power calculation.
+    Fetch salary data for Purchasing Power calculation: the payroll measures by period
+    (plantilla.load_payroll) for `target_years`.
     """
-    years_str = ",".join(map(str, target_years))
-    query = f"""
-    SELECT 
-        anio, 
-        mes, 
-        liquidacion,
-        importe_gral,
-        total_gral
-    FROM plantilla_personal_provincia
-    WHERE anio IN ({years_str})
-    """
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
-        df = pd.DataFrame(data, columns=columns)
-        
-        df['importe_gral'] = pd.to_numeric(df['importe_gral'], errors='coerce').fillna(0)
-        df['total_gral'] = pd.to_numeric(df['total_gral'], errors='coerce').fillna(0)
-        
-        return df
-    finally:
-        conn.close()
+    df = load_payroll()
+    return df[df['anio'].isin(target_years)].reset_index(drop=True)
 
 def process_new_charts(df_daily, df_salary_details, df_cbt):
     """
@@ -1472,30 +1509,17 @@ def process_new_charts(df_daily, df_salary_details, df_cbt):
     """
     
     # --- 1. Average Salary Calculation ---
-    # Filter SAC for avg salary logic (Strict Regex)
     # User Request: "cuando hablamos de salario promedio no (se incluye sac)"
-    # Regex for SAC variations
-    sac_terms = r'SAC|S\.A\.C|sac|s\.a\.c|Cuota\s*SAC|Aguinaldo'
-    df_no_sac = df_salary_details[~df_salary_details['liquidacion'].str.contains(sac_terms, case=False, na=False)].copy()
-    
-    # Wage amount for Avg Salary (No SAC)
-    masa_avg = df_no_sac.groupby(['anio', 'mes'])['importe_gral'].sum().reset_index()
-    masa_avg.rename(columns={'importe_gral': 'masa_para_promedio'}, inplace=True)
-    
-    # Employee count (from 'sueldo' rows only)
-    # Assuming 'sueldo' identifies main salary rows for counting people
-    df_empleados = df_no_sac[df_no_sac['liquidacion'].str.contains('sueldo', case=False, na=False)].copy()
-    empleados = df_empleados.groupby(['anio', 'mes'])['total_gral'].sum().reset_index()
-    empleados.rename(columns={'total_gral': 'cantidad_empleados'}, inplace=True)
-    
-    # Merge for Avg Salary
-    df_salaries = pd.merge(masa_avg, empleados, on=['anio', 'mes'], how='inner')
+    # masa_sin_sac leaves SAC rows out; cantidad_empleados comes from 'sueldo' rows only
+    payroll = payroll_by_period(df_salary_details)
+    df_salaries = payroll.dropna(subset=['masa_sin_sac', 'cantidad_empleados']).reset_index(drop=True)
+    df_salaries = df_salaries[['anio', 'mes', 'masa_sin_sac', 'cantidad_empleados']].rename(
+        columns={'masa_sin_sac': 'masa_para_promedio'})
     df_salaries['salario_promedio'] = df_salaries['masa_para_promedio'] / df_salaries['cantidad_empleados']
     
     # --- 2. Wage Bill (Total) Calculation ---
     # Include EVERYTHING for coverage (User Request: "todo lo que tenga que ver con masa salarial tiene que incluir el sac")
-    masa_total = df_salary_details.groupby(['anio', 'mes'])['importe_gral'].sum().reset_index()
-    masa_total.rename(columns={'importe_gral': 'masa_salarial_total'}, inplace=True)
+    masa_total = payroll[['anio', 'mes', 'masa_salarial']].rename(columns={'masa_salarial': 'masa_salarial_total'})
     
     # --- 3. Purchasing Power Chart (Last 12 months) ---
     df_pp = pd.merge(df_salaries, df_cbt, left_on=['anio', 'mes'], right_on=['year', 'month'], how='left')
@@ -1542,35 +1566,29 @@ def process_new_charts(df_daily, df_salary_details, df_cbt):
         "coverage": coverage_chart_data
     }
 
-def process_personal_kpis(df_salary_details, df_cbt, df_ipc):
-    sac_terms = r'SAC|S\.A\.C|sac|s\.a\.c|Cuota\s*SAC|Aguinaldo'
-    df_no_sac = df_salary_details[~df_salary_details['liquidacion'].str.contains(sac_terms, case=False, na=False)].copy()
-    
-    masa_avg = df_no_sac.groupby(['anio', 'mes'])['importe_gral'].sum().reset_index()
-    masa_avg.rename(columns={'importe_gral': 'masa_para_promedio'}, inplace=True)
-    
-    df_empleados = df_no_sac[df_no_sac['liquidacion'].str.contains('sueldo', case=False, na=False)].copy()
-    empleados = df_empleados.groupby(['anio', 'mes'])['total_gral'].sum().reset_index()
-    empleados.rename(columns={'total_gral': 'cantidad_empleados'}, inplace=True)
-    
-    df = pd.merge(masa_avg, empleados, on=['anio', 'mes'], how='inner')
+def process_personal_kpis(df_salary_details, df_cbt, df_ipc, deflator=None):
+    payroll = payroll_by_period(df_salary_details)
+    df = payroll.dropna(subset=['masa_sin_sac', 'cantidad_empleados']).reset_index(drop=True)
+    df = df[['anio', 'mes', 'masa_sin_sac', 'cantidad_empleados']].rename(columns={'masa_sin_sac': 'masa_para_promedio'})
     df['cantidad_empleados'] = df['cantidad_empleados'].replace(0, np.nan)
     df['salario_promedio'] = df['masa_para_promedio'] / df['cantidad_empleados']
     
-    # Merge IPC (Nación for salary deflation)
-    df = pd.merge(df, df_ipc, left_on=['anio', 'mes'], right_on=['year', 'month'], how='left')
+    if deflator is None:
+        deflator = Deflator.from_frame(df_ipc)
+    
     df = pd.merge(df, df_cbt, left_on=['anio', 'mes'], right_on=['year', 'month'], how='left')
     
     df.sort_values(by=['anio', 'mes'], inplace=True)
     
     df['anio_prev'] = df['anio'] - 1
-    df_prev = df[['anio', 'mes', 'salario_promedio', 'ipc_valor']].copy()
-    df_prev.columns = ['anio_prev', 'mes', 'salario_promedio_prev', 'ipc_valor_prev']
+    df_prev = df[['anio', 'mes', 'salario_promedio']].copy()
+    df_prev.columns = ['anio_prev', 'mes', 'salario_promedio_prev']
     
     df = pd.merge(df, df_prev, on=['anio_prev', 'mes'], how='left')
     
     df['var_nominal_ia'] = (df['salario_promedio'] / df['salario_promedio_prev']) - 1
-    df['var_ipc_ia'] = (df['ipc_valor'] / df['ipc_valor_prev']) - 1
+    # IPC (Nación for salary deflation)
+    df['var_ipc_ia'] = deflator.yoy_factor(df['anio'].to_numpy(), df['mes'].to_numpy()) - 1
     # Safeguard division by zero
     val_div = 1 + df['var_ipc_ia']
     val_div = val_div.replace(0, np.nan)
@@ -1589,134 +1607,313 @@ def process_personal_kpis(df_salary_details, df_cbt, df_ipc):
         }
     return result
 
-def main():
-    print("Fetching Daily Coparticipation...")
-    df_daily = fetch_coparticipacion_daily()
-    
-    print("Fetching Daily Expected Coparticipation...")
-    df_esperada = fetch_copa_esperada()
-    
+def get_target_years(df_daily):
+    """
+    Years to fetch for the salary sources: the latest year with daily data plus the previous 4,
+    to cover the annual analysis correctly.
+    """
     # Determine years to fetch based on daily data + system year
     years_present = df_daily['year'].unique().tolist()
     if not years_present:
         years_present = [datetime.now().year]
     
-    # Determine years to fetch: current plus last 4 years to cover annual analysis correctly
-    current_year = max(years_present)
+    current_year = int(max(years_present))
     target_years = [current_year - i for i in range(5)]
     
     print(f"Target Years for Salary: {target_years}")
+    return target_years
+
+def run_fetch_stage(tasks, max_workers=FETCH_WORKERS):
+    """
+    Runs the source fetches concurrently on a thread pool, honouring their dependencies.
+    
+    Args:
+        tasks (dict): {name: (func, deps, timeout)}. A task starts as soon as every task in `deps`
+            has finished and receives their results as positional arguments (in `deps` order).
+            `timeout` is the maximum number of seconds the task may run.
+    
+    Returns:
+        tuple: ({name: result}, {name: elapsed seconds})
+    
+    Raises:
+        TimeoutError: if a source runs longer than its timeout. Errors raised by a fetch are re-raised.
+    
+    A timeout only stops waiting: a worker already running cannot be cancelled and is joined at
+    interpreter exit, so every fetch must bound its own calls (db.QUERY_TIMEOUT for the databases,
+    `timeout=` for HTTP).
+    """
+    results = {}
+    timings = {}
+    started = {}
+    running = {}
+    pending = dict(tasks)
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while pending or running:
+            for name, (func, deps, _) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    started[name] = time.perf_counter()
+                    running[executor.submit(func, *[results[dep] for dep in deps])] = name
+                    del pending[name]
+                    
+            if not running:
+                raise RuntimeError(f"Dependencias sin resolver en la etapa de extracción: {sorted(pending)}")
+            
+            next_deadline = min(started[name] + tasks[name][2] for name in running.values())
+            done, _ = wait(running, timeout=max(0, next_deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                name = running.pop(future)
+                timings[name] = time.perf_counter() - started[name]
+                results[name] = future.result()
+                
+            now = time.perf_counter()
+            for name in running.values():
+                if now - started[name] > tasks[name][2]:
+                    raise TimeoutError(f"La fuente '{name}' superó el límite de {tasks[name][2]}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+    return results, timings
+
+def print_fetch_summary(timings, wall_time):
+    print("Fetch timings:")
+    for name, elapsed in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {name:<16} {elapsed:7.2f}s")
+    print(f"  {'(wall clock)':<16} {wall_time:7.2f}s  (sum of sources: {sum(timings.values()):.2f}s)")
+
+# Monitor output, split so each page loads the index plus only the periods it shows
+IPCE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', '_ipce_v1')
+
+def write_monitor_shards(json_data, out_dir=IPCE_DIR):
+    """
+    Writes the monitor output as:
+      index.json        meta (available_periods, default_period_id), annual_monitor.meta,
+                        annual, global_charts and secondary_charts
+      p/<YYYY-MM>.json  kpi + charts of one Monitor Mensual period
+      a/<YYYY>.json     kpi + charts of one Monitor Anual year
+    Shards of periods/years no longer published are removed.
+    """
+    index = {k: v for k, v in json_data.items() if k not in ('data', 'annual_monitor')}
+    annual_monitor = json_data.get('annual_monitor', {})
+    index['annual_monitor'] = {'meta': annual_monitor.get('meta', {})}
     
-    print("Fetching Monthly Salary...")
-    df_salary = fetch_masa_salarial(target_years)
+    shards = {
+        'p': json_data.get('data', {}),
+        'a': annual_monitor.get('data', {})
+    }
+    for subdir, items in shards.items():
+        shard_dir = os.path.join(out_dir, subdir)
+        os.makedirs(shard_dir, exist_ok=True)
+        for shard_id, shard in items.items():
+            write_json(os.path.join(shard_dir, f'{shard_id}.json'), shard)
+        published = {f'{shard_id}.json' for shard_id in items}
+        for name in os.listdir(shard_dir):
+            if name.endswith('.json') and name not in published:
+                remove_json(os.path.join(shard_dir, name))
+    
+    write_json(os.path.join(out_dir, 'index.json'), index)
+    print(f"  [monitor] index + {len(shards['p'])} periodos + {len(shards['a'])} años en {out_dir}")
+
+# The gasto extract is already aggregated by PostgreSQL; it is still read through a server-side
+# cursor, GASTO_ITERSIZE rows at a time, so no result set is buffered whole by the driver.
+GASTO_COLUMNS = ['periodo', 'jurisdiccion', 'tipo_financ', 'partida', 'estado', 'monto']
+GASTO_ITERSIZE = int(os.getenv('GASTO_ITERSIZE', 50000))
+
+def fetch_gasto(itersize=GASTO_ITERSIZE):
+    """
+    Reads copa_gastos aggregated and normalized in the database (build_gasto_query): one row per
+    (periodo YYYY-MM, jurisdiccion, tipo_financ, partida, estado) with its monto, the input
+    expected by build_gasto_cube.
+    """
+    query, params = build_gasto_query(
+        select=["to_char(periodo, 'YYYY-MM') AS periodo", 'jurisdiccion', 'tipo_financ', 'partida', 'estado', 'SUM(monto) AS monto'],
+        group_by=["to_char(periodo, 'YYYY-MM')", 'jurisdiccion', 'tipo_financ', 'partida', 'estado']
+    )
+    chunks = []
+    with pg_connection() as conn:
+        with conn.cursor(name='copa_gastos_stream') as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                chunk = pd.DataFrame(rows, columns=GASTO_COLUMNS)
+                chunk['monto'] = pd.to_numeric(chunk['monto'], errors='coerce').astype('float64')
+                chunks.append(chunk)
+    
+    df_gasto = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=GASTO_COLUMNS)
+    print(f"  [gasto] {len(df_gasto)} celdas de copa_gastos")
+    return df_gasto
+
+# Gasto dimensions, and the estados in their display order (unknown estados are appended sorted)
+GASTO_DIMS = ['periodo', 'jurisdiccion', 'tipo_financ', 'partida']
+GASTO_ESTADOS = ['Credito Vigente', 'Comprometido', 'Ordenado']
+
+def _gasto_estados(df_gasto):
+    return GASTO_ESTADOS + sorted(set(df_gasto['estado'].dropna()) - set(GASTO_ESTADOS))
+
+def _encode_gasto_index(index, dims):
+    """Dictionary-encodes each level of `index`: returns ({dim: members}, {dim: codes})."""
+    dictionaries = {}
+    codes = {}
+    for dim in dims:
+        level_codes, uniques = pd.factorize(index.get_level_values(dim), sort=True, use_na_sentinel=False)
+        dictionaries[dim] = [None if pd.isna(v) else v for v in uniques.tolist()]
+        codes[dim] = level_codes.tolist()
+    return dictionaries, codes
+
+def _value_lists(frame):
+    """One JSON-ready list per column, with None for missing values."""
+    return {
+        col: [None if pd.isna(v) else float(v) for v in frame[col].tolist()]
+        for col in frame.columns
+    }
+
+# gasto_cube.json: gasto pre-aggregated for the gasto page. Rolled-up dimensions carry an extra
+# 'TODAS' member (sum over all their members); flow estados also carry a year-to-date total.
+GASTO_CUBE_FORMAT = 'gasto-cube-v1'
+GASTO_TODAS = 'TODAS'
+GASTO_ROLLUP_DIMS = ['jurisdiccion', 'tipo_financ', 'partida']
+# Credito Vigente is a balance read at a single period, so it has no year-to-date total
+GASTO_FLOW_ESTADOS = ['Comprometido', 'Ordenado']
+
+def build_gasto_cube(df_gasto):
+    """
+    Builds the periodo x jurisdiccion x tipo_financ x partida x estado cube from the gasto records.
     
-    print("Fetching Provincial Recaudacion...")
-    df_reca_prov = fetch_recaudacion_provincial()
+    Every combination of rolled-up dimensions is included, so "all jurisdictions" / "all sources" /
+    "all partidas" are single cells, and a multi-selection is a sum over the few selected members.
+    `values[estado]` is the month's amount (null when no record exists);
+    `ytd[estado]` is the running total within the periodo's year for flow estados, carried through
+    months without records.
+    tipo_financ is emitted as a string ('10'..'14'), as the page's fuente filters use it.
     
-    print("Fetching IPC Nación + REM Projections...")
-    df_ipc = fetch_ipc()
+    Returns:
+        dict: {'format', 'todas', 'dims', 'dict', 'codes', 'estados', 'values', 'ytd'}
+    """
+    dims = GASTO_DIMS
+    estados = _gasto_estados(df_gasto)
+    df = df_gasto[dims + ['estado']].copy()
+    df['tipo_financ'] = df['tipo_financ'].astype(str).str.replace(r'\.0$', '', regex=True)
+    df['monto'] = pd.to_numeric(df_gasto['monto'], errors='coerce')
+    base = df.groupby(dims + ['estado'], dropna=False)['monto'].sum(min_count=1)
+    
+    # Rollups: every subset of GASTO_ROLLUP_DIMS replaced by 'TODAS'
+    parts = [base]
+    for mask in range(1, 2 ** len(GASTO_ROLLUP_DIMS)):
+        rolled = [d for i, d in enumerate(GASTO_ROLLUP_DIMS) if mask >> i & 1]
+        keep = [d for d in dims + ['estado'] if d not in rolled]
+        part = base.groupby(level=keep, dropna=False).sum(min_count=1).reset_index()
+        part = part.assign(**{d: GASTO_TODAS for d in rolled}).set_index(dims + ['estado'])['monto']
+        parts.append(part)
+    wide = pd.concat(parts).unstack('estado').reindex(columns=estados)
+    
+    # Year-to-date for flows: per cell, cumulative over the year's months (missing months count as 0)
+    ytd = {}
+    for estado in [e for e in GASTO_FLOW_ESTADOS if e in estados]:
+        monthly = wide[estado].unstack('periodo')
+        pieces = []
+        for year in sorted({str(p)[:4] for p in monthly.columns}):
+            block = monthly[[p for p in monthly.columns if str(p)[:4] == year]]
+            cum = block.fillna(0).cumsum(axis=1).where(block.notna().cumsum(axis=1) > 0)
+            pieces.append(cum.stack(future_stack=True))
+        ytd[estado] = pd.concat(pieces)
+    ytd = pd.DataFrame(ytd).dropna(how='all')
+    ytd.index = ytd.index.reorder_levels(dims)
+    
+    cube = wide.join(ytd.add_prefix('ytd:'), how='outer').sort_index()
+    ytd_cols = [c for c in cube.columns if str(c).startswith('ytd:')]
+    dictionaries, codes = _encode_gasto_index(cube.index, dims)
+    return {
+        'format': GASTO_CUBE_FORMAT,
+        'todas': GASTO_TODAS,
+        'dims': dims,
+        'dict': dictionaries,
+        'codes': codes,
+        'estados': estados,
+        'values': _value_lists(cube[estados]),
+        'ytd': {c[len('ytd:'):]: v for c, v in _value_lists(cube[ytd_cols]).items()}
+    }
+
+def main(full_refresh=False):
+    # --- Extract: independent sources run concurrently; only target_years depends on the daily data ---
+    print("Fetching sources (Daily Coparticipation, Expected, Salary, Provincial Recaudacion, IPC + REM, CBT, Salary Details)...")
+    tasks = {
+        'daily': (lambda: fetch_coparticipacion_daily(full_refresh=full_refresh), [], FETCH_TIMEOUT),
+        'esperada': (fetch_copa_esperada, [], FETCH_TIMEOUT),
+        'target_years': (get_target_years, ['daily'], FETCH_TIMEOUT),
+        'salary': (fetch_masa_salarial, ['target_years'], FETCH_TIMEOUT),
+        'reca_prov': (fetch_recaudacion_provincial, [], FETCH_TIMEOUT),
+        'ipc': (fetch_ipc, [], FETCH_TIMEOUT),
+        'cbt': (fetch_cbt, [], FETCH_TIMEOUT),
+        'salary_details': (fetch_salary_details, ['target_years'], FETCH_TIMEOUT),
+    }
+    stage_start = time.perf_counter()
+    sources, timings = run_fetch_stage(tasks)
+    print_fetch_summary(timings, time.perf_counter() - stage_start)
+    
+    df_daily = sources['daily']
+    df_esperada = sources['esperada']
+    df_salary = sources['salary']
+    df_reca_prov = sources['reca_prov']
+    df_ipc = sources['ipc']
+    df_cbt = sources['cbt']
+    df_salary_details = sources['salary_details']
+    
+    print("Indexing Periods...")
+    store = build_period_store(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov)
+    deflator = Deflator.from_frame(df_ipc)
     
     print("Processing Data...")
-    json_data = process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov)
+    json_data = process_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov, store=store, deflator=deflator)
     
     print("Processing Annual Monitor Data...")
-    json_data["annual_monitor"] = process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov)
+    json_data["annual_monitor"] = process_annual_monitor_data(df_daily, df_salary, df_ipc, df_esperada, df_reca_prov, store=store, deflator=deflator)
     
     print("Processing Annual Data...")
-    annual_data = process_annual_data(df_daily, df_ipc)
+    annual_data = process_annual_data(df_daily, df_ipc, store=store, deflator=deflator)
     json_data["annual"] = annual_data
     
     print("Processing Chart Data (Monthly Variations)...")
-    chart_data = process_chart_data(df_daily, df_ipc, df_reca_prov)
+    chart_data = process_chart_data(df_daily, df_ipc, df_reca_prov, store=store, deflator=deflator)
     json_data["global_charts"] = chart_data
     
-    print("Fetching CBT Data for Secondary Charts...")
-    df_cbt = fetch_cbt()
-    
-    print("Fetching Detailed Salary Data for Secondary Charts...")
-    df_salary_details = fetch_salary_details(target_years)
-    
     print("Processing Average Salary & Purchasing Power...")
     new_charts = process_new_charts(df_daily, df_salary_details, df_cbt)
     json_data["secondary_charts"] = new_charts
 
     print("Injecting Personal KPIs to Periods...")
-    personal_kpis = process_personal_kpis(df_salary_details, df_cbt, df_ipc)
+    personal_kpis = process_personal_kpis(df_salary_details, df_cbt, df_ipc, deflator=deflator)
     for period_id, p_data in json_data.get("data", {}).items():
         if period_id in personal_kpis:
             p_data["kpi"]["personal"] = personal_kpis[period_id]
         else:
             p_data["kpi"]["personal"] = {"salario_var_real_ia": None, "cbt_ratio": None}
 
-    # Obfuscated filename (Fix 1-B)
-    output_path = os.path.join(os.path.dirname(__file__), '..', 'data', '_data_ipce_v1.json')
-    with open(output_path, 'w') as f:
-        json.dump(json_data, f, indent=2)
-        
-    print(f"Data saved to {output_path}")
+    # Obfuscated directory name (Fix 1-B)
+    write_monitor_shards(json_data)
 
     # Dashboard de Gastos desde Postgres
     print("Processing Gasto Data from PostgreSQL...")
     
     try:
-        conn = get_pg_connection()
-        query = """
-            SELECT 
-                periodo, 
-                jurisdiccion, 
-                tipo_financ, 
-                partida, 
-                estado, 
-                monto 
-            FROM copa_gastos 
-            WHERE estado != 'Saldo' 
-              AND partida != 'Total de la Fuente' 
-              AND tipo_financ IN ('10','11','12','13','14')
-        """
-        df_gasto = pd.read_sql(query, conn)
+        df_gasto = fetch_gasto()
         
-        # Ensure periodo is YYYY-MM
-        if pd.api.types.is_datetime64_any_dtype(df_gasto['periodo']):
-            df_gasto['periodo'] = df_gasto['periodo'].dt.strftime('%Y-%m')
-        else:
-            df_gasto['periodo'] = pd.to_datetime(df_gasto['periodo'], errors='coerce').dt.strftime('%Y-%m')
-            
-        name_map = {
-            "GASTO EN PERSONAL": "GASTOS EN PERSONAL",
-            "SERVICIO DE LA DEUDA Y DISMINUCION DE OTROS": "SERVICIO DE LA DEUDA"
-        }
-        df_gasto["partida"] = df_gasto["partida"].apply(lambda x: name_map.get(x, x))
-        
-        # Mapeo de jurisdicciones debido a diferencias y truncados en la Base
-        juris_map = {
-            "MINISTERIO DE EDUCACION": "MINISTERIO DE EDUCACIÓN",
-            "MINISTERIO DE SALUD PUBLICA": "MINISTERIO DE SALUD PÚBLICA",
-            "MINISTERIO DE PRODUCCION": "MINISTERIO DE PRODUCCIÓN",
-            "MINISTERIO DE OBRAS Y SERVICIOS PUBLICOS": "MINISTERIO DE OBRAS Y SERVICIOS PÚBLICOS",
-            "MINISTERIO DE COORDINACION Y": "MINISTERIO DE COORDINACIÓN Y PLANIFICACIÓN",
-            "MINISTERIO DE JUSTICIA Y DERECHOS": "MINISTERIO DE JUSTICIA Y DERECHOS HUMANOS",
-            "MINISTERIO DE INDUSTRIA TRABAJO Y": "MINISTERIO DE INDUSTRIA TRABAJO Y COMERCIO",
-            "INSTITUTO CORRENTINO DEL AGUA Y DEL": "INSTITUTO CORRENTINO DEL AGUA Y DEL AMBIENTE",
-            "DIRECCION PROVINCIAL DE VIALIDAD": "DIRECCIÓN PROVINCIAL DEL VIALIDAD",
-            "ADMINIST. DE OBRAS SANITARIAS DE": "ADMINISTRACIÓN DE OBRAS SANITARIAS DE CORRIENTES",
-            "INSTITUTO DE DESARROLLO RURAL DE": "INSTITUTO DE DESARROLLO RURAL DE CORRIENTES",
-            "CENTRO DE ONCOLOGIA \"ANNA ROCCA DE": "CENTRO DE ONCOLOGIA 'ANNA ROCCA DE BONATTI'",
-            "AGENCIA CORRENTINA DE BIENES DEL": "AGENCIA CORRENTINA DE BIENES DEL ESTADO"
-        }
-        df_gasto["jurisdiccion"] = df_gasto["jurisdiccion"].str.strip().apply(lambda x: juris_map.get(x, x))
-        
-        gasto_data = df_gasto.to_dict(orient="records")
-        gasto_json_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'gasto_data.json')
-        
-        with open(gasto_json_path, 'w', encoding='utf-8') as f:
-            json.dump(gasto_data, f, ensure_ascii=False, indent=2)
-            
-        print(f"Gasto data saved to {gasto_json_path}")
+        gasto_cube = build_gasto_cube(df_gasto)
+        gasto_cube_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'gasto_cube.json')
+        write_json(gasto_cube_path, gasto_cube)
+        print(f"Gasto cube saved to {gasto_cube_path} ({len(gasto_cube['codes']['periodo'])} cells)")
     except Exception as e:
         print(f"Error processing Gasto data: {e}")
-    finally:
-        if 'conn' in locals() and conn:
-            conn.close()
+    
+    update_manifest()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="ETL del Tablero RON")
+    parser.add_argument('--full-refresh', action='store_true', help="Ignora la caché local y recarga todo el histórico")
+    args = parser.parse_args()
+    main(full_refresh=args.full_refresh)
@@ -1,203 +1,55 @@
-import time
 import os
-import mysql.connector
-import psycopg2
+import re
+import unicodedata
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from mysql.connector import Error
 from dotenv import load_dotenv
+from db import read_mysql
+from plantilla import load_payroll, payroll_by_period
+from deflator import Deflator, load_deflator
+from json_output import write_json, remove_json, update_manifest
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-# DB Configuration from Environment Variables (Fix 1-C: Remove hardcoded defaults)
-DB_CONFIG = {
-    'user': os.getenv('DB_USER'),
-    'host': os.getenv('DB_HOST'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_DATABASE'),
-    'port': int(os.getenv('DB_PORT', 3306)),
-    'connect_timeout': 20
-}
-
-def get_connection(max_retries=3):
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            conn = mysql.connector.connect(**DB_CONFIG)
-            if conn.is_connected():
-                return conn
-        except Error as e:
-            print(f"Connection attempt {retry_count + 1} failed: {e}")
-            retry_count += 1
-            if retry_count < max_retries:
-                print("Retrying in 5 seconds...")
-                time.sleep(5)
-            else:
-                print("Max retries reached. Exiting.")
-                raise e
-
-def get_pg_ipc_connection():
-    return psycopg2.connect(
-        host=os.getenv("PG_HOST"),
-        port=os.getenv("PG_PORT"),
-        user=os.getenv("PG_USER"),
-        password=os.getenv("PG_PASSWORD"),
-        dbname="datalake_economico"
-    )
+# Análisis Personal by jurisdiction: index.json + j/<slug>.json, one shard per jurisdiction
+JURISDICCIONES_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', '_personal_v1')
+SIN_JURISDICCION = 'Sin jurisdicción'
 
 def fetch_data():
-    query = """
-    SELECT 
-        anio, 
-        mes, 
-        jurisdiccion, 
-        liquidacion, 
-        total_gral, 
-        importe_gral 
-    FROM plantilla_personal_provincia
-    """
-    
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
-        df = pd.DataFrame(data, columns=columns)
-        return df
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        conn.close()
+    # Payroll measures by period of plantilla_personal_provincia (aggregated by MySQL)
+    return load_payroll().copy()
 
-def fetch_rem_projections():
-    """
-    Fetch REM monthly CPI projections from PostgreSQL (latest survey).
-    Returns dict: {(year, month): decimal_variation}
-    """
-    query = """
-    SELECT fecha, mediana
-    FROM rem_precios_minoristas
-    WHERE fecha_consulta = (SELECT MAX(fecha_consulta) FROM rem_precios_minoristas)
-    ORDER BY fecha ASC
-    """
-    conn = get_pg_ipc_connection()
-    try:
-        df = pd.read_sql(query, conn)
-        projections = {}
-        for _, row in df.iterrows():
-            fecha = pd.to_datetime(row['fecha'])
-            projections[(fecha.year, fecha.month)] = float(row['mediana']) / 100
-        print(f"  REM: Loaded {len(projections)} monthly projections")
-        return projections
-    except Exception as e:
-        print(f"  WARNING: Could not fetch REM projections: {e}")
-        return {}
-    finally:
-        conn.close()
+def fetch_data_jurisdicciones():
+    # Same payroll measures by period and jurisdiction
+    return load_payroll(by_jurisdiccion=True).copy()
 
 def fetch_ipc_nacion():
-    # Fetch IPC data for Region 1 (Nación), Category 1 (General), Division 1
-    # Fills missing months with REM projections
-    query = """
-    SELECT 
-        EXTRACT(YEAR FROM fecha)::int as anio, 
-        EXTRACT(MONTH FROM fecha)::int as mes, 
-        valor as ipc_valor,
-        var_mensual as ipc_var_mensual
-    FROM ipc
-    WHERE id_region = 1 AND id_categoria = 1 AND id_division = 1
-    ORDER BY fecha
-    """
-    conn = get_pg_ipc_connection()
-    try:
-        df = pd.read_sql(query, conn)
-        
-        # Fill missing months with REM projections
-        rem_projections = fetch_rem_projections()
-        
-        if df.empty:
-            return df
-            
-        last_row = df.iloc[-1]
-        last_year = int(last_row['anio'])
-        last_month = int(last_row['mes'])
-        current_val = float(last_row['ipc_valor'])
-        
-        print(f"  IPC: Last official data: {last_year}-{last_month:02d}")
-        
-        new_rows = []
-        curr_y, curr_m = last_year, last_month
-        
-        while True:
-            curr_m += 1
-            if curr_m > 12:
-                curr_m = 1
-                curr_y += 1
-            
-            if (curr_y, curr_m) in rem_projections:
-                monthly_var = rem_projections[(curr_y, curr_m)]
-                current_val = current_val * (1 + monthly_var)
-                new_rows.append({
-                    'anio': curr_y,
-                    'mes': curr_m,
-                    'ipc_valor': current_val,
-                    'ipc_var_mensual': monthly_var
-                })
-                print(f"  IPC: Projected {curr_y}-{curr_m:02d} with REM {monthly_var*100:.1f}%")
-            else:
-                break
-        
-        if new_rows:
-            df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
-        
-        return df
-    finally:
-        conn.close()
+    # IPC data for Region 1 (Nación), Category 1 (General), Division 1,
+    # with missing months filled with REM projections (shared with etl_main)
+    return load_deflator().to_frame(year_col='anio', month_col='mes')[['anio', 'mes', 'ipc_valor', 'ipc_var_mensual']]
 
 def fetch_ripte():
     query = "SELECT YEAR(fecha) as anio, MONTH(fecha) as mes, valor as ripte_valor FROM ripte ORDER BY fecha"
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
-        df = pd.DataFrame(data, columns=columns)
-        # Calculate monthly variation for RIPTE
-        df['ripte_var_mensual'] = df['ripte_valor'].pct_change()
-        return df
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        conn.close()
+    df = read_mysql(query, {'anio': 'int16', 'mes': 'int8', 'ripte_valor': 'float64'})
+    # Calculate monthly variation for RIPTE
+    df['ripte_var_mensual'] = df['ripte_valor'].pct_change()
+    return df
 
 def process_data(df_personnel, df_ipc, df_ripte):
     # --- Personnel Data Processing ---
-    df_personnel['total_gral'] = pd.to_numeric(df_personnel['total_gral'], errors='coerce').fillna(0)
-    df_personnel['importe_gral'] = pd.to_numeric(df_personnel['importe_gral'], errors='coerce').fillna(0)
+    # Payroll detail rows are aggregated here; load_payroll frames come already aggregated
+    if 'liquidacion' in df_personnel.columns:
+        df_personnel['total_gral'] = pd.to_numeric(df_personnel['total_gral'], errors='coerce').fillna(0)
+        df_personnel['importe_gral'] = pd.to_numeric(df_personnel['importe_gral'], errors='coerce').fillna(0)
     
+    # One groupby on tipo_liquidacion gives the three measures:
     # 1. Total Wage Bill: Sum EVERYTHING (including SAC) as requested by user
-    masa_salarial_total = df_personnel.groupby(['anio', 'mes'])['importe_gral'].sum().reset_index()
-    masa_salarial_total.rename(columns={'importe_gral': 'masa_salarial'}, inplace=True)
-
-    # 2. Filter out SAC for Average Salary calculation
-    sac_terms = r'SAC|S\.A\.C|sac|s\.a\.c|Cuota\s*SAC|Aguinaldo'
-    df_no_sac = df_personnel[~df_personnel['liquidacion'].str.contains(sac_terms, case=False, na=False)].copy()
-    
-    # 3. Employee Count: from sueldo rows (excluding SAC)
-    df_empleados = df_no_sac[df_no_sac['liquidacion'].str.contains('sueldo', case=False, na=False)].copy()
-    empleados_grouped = df_empleados.groupby(['anio', 'mes'])['total_gral'].sum().reset_index()
-    empleados_grouped.rename(columns={'total_gral': 'cantidad_empleados'}, inplace=True)
-    
-    # 4. Wage amount for Average Salary: exclude SAC
-    masa_sin_sac = df_no_sac.groupby(['anio', 'mes'])['importe_gral'].sum().reset_index()
-    masa_sin_sac.rename(columns={'importe_gral': 'masa_sin_sac'}, inplace=True)
-    
-    # Merge Measures
-    df_dashboard = pd.merge(empleados_grouped, masa_salarial_total, on=['anio', 'mes'], how='outer')
-    df_dashboard = pd.merge(df_dashboard, masa_sin_sac, on=['anio', 'mes'], how='outer')
+    # 2. Employee Count: from sueldo rows (excluding SAC)
+    # 3. Wage amount for Average Salary: exclude SAC
+    df_dashboard = payroll_by_period(df_personnel)
+    df_dashboard = df_dashboard[['anio', 'mes', 'cantidad_empleados', 'masa_salarial', 'masa_sin_sac']]
     
     # Calculate Average Salary using masa_sin_sac (without SAC)
     df_dashboard['salario_promedio'] = df_dashboard['masa_sin_sac'] / df_dashboard['cantidad_empleados']
@@ -215,8 +67,8 @@ def process_data(df_personnel, df_ipc, df_ripte):
     # 2. Interannual Variations (Self-Join)
     df_dashboard['anio_prev'] = df_dashboard['anio'] - 1
     
-    df_prev = df_dashboard[['anio', 'mes', 'salario_promedio', 'ipc_valor']].copy()
-    df_prev.columns = ['anio_prev', 'mes', 'salario_promedio_prev', 'ipc_valor_prev']
+    df_prev = df_dashboard[['anio', 'mes', 'salario_promedio']].copy()
+    df_prev.columns = ['anio_prev', 'mes', 'salario_promedio_prev']
     
     df_dashboard = pd.merge(df_dashboard, df_prev, on=['anio_prev', 'mes'], how='left')
     
@@ -224,7 +76,8 @@ def process_data(df_personnel, df_ipc, df_ripte):
     df_dashboard['var_nominal_ia'] = (df_dashboard['salario_promedio'] / df_dashboard['salario_promedio_prev']) - 1
     
     # Calculate IPC interannual variation
-    df_dashboard['var_ipc_ia'] = (df_dashboard['ipc_valor'] / df_dashboard['ipc_valor_prev']) - 1
+    deflator = Deflator.from_frame(df_ipc, year_col='anio', month_col='mes')
+    df_dashboard['var_ipc_ia'] = deflator.yoy_factor(df_dashboard['anio'].to_numpy(), df_dashboard['mes'].to_numpy()) - 1
     
     # Real Variation
     df_dashboard['var_real_ia'] = ((1 + df_dashboard['var_nominal_ia']) / (1 + df_dashboard['var_ipc_ia'])) - 1
@@ -234,8 +87,104 @@ def process_data(df_personnel, df_ipc, df_ripte):
 
     return df_dashboard
 
-import json
 
+def process_jurisdicciones(df_juris, df_ipc):
+    """
+    Payroll analytics per jurisdiction and month in one vectorized pass over the
+    (jurisdiccion, anio, mes) aggregate: average salary (without SAC) and its nominal and
+    real year-over-year variation, looked up by index instead of a self-join.
+    """
+    # Names that only differ in surrounding spaces are the same jurisdiction
+    jurisdiccion = df_juris['jurisdiccion'].astype(object).where(df_juris['jurisdiccion'].notna(), SIN_JURISDICCION)
+    df = (
+        df_juris.assign(jurisdiccion=jurisdiccion.str.strip())
+        .groupby(['jurisdiccion', 'anio', 'mes'], sort=True)[['cantidad_empleados', 'masa_salarial', 'masa_sin_sac']]
+        .sum(min_count=1)
+        .reset_index()
+    )
+    
+    df['salario_promedio'] = df['masa_sin_sac'] / df['cantidad_empleados'].replace(0, np.nan)
+    
+    # Same month of the previous year, same jurisdiction
+    salario = pd.Series(df['salario_promedio'].to_numpy(), index=pd.MultiIndex.from_arrays(
+        [df['jurisdiccion'], df['anio'].astype(int), df['mes'].astype(int)]))
+    prev_index = pd.MultiIndex.from_arrays([df['jurisdiccion'], df['anio'].astype(int) - 1, df['mes'].astype(int)])
+    df['salario_promedio_prev'] = salario.reindex(prev_index).to_numpy()
+    df['var_nominal_ia'] = df['salario_promedio'] / df['salario_promedio_prev'] - 1
+    
+    deflator = Deflator.from_frame(df_ipc, year_col='anio', month_col='mes')
+    var_ipc_ia = deflator.yoy_factor(df['anio'].to_numpy(), df['mes'].to_numpy()) - 1
+    df['var_real_ia'] = (1 + df['var_nominal_ia']) / (1 + var_ipc_ia) - 1
+    
+    return df
+
+def _slug(name):
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or 'jurisdiccion'
+
+def write_jurisdiccion_shards(df, out_dir=JURISDICCIONES_DIR):
+    """
+    Writes the per-jurisdiction output of process_jurisdicciones as:
+      index.json      meta (available_periods, default_period_id) and the list of
+                      jurisdictions with their shard id and latest-period figures
+      j/<slug>.json   the monthly series of one jurisdiction, one array per measure
+    Shards of jurisdictions no longer present are removed.
+    """
+    MONTH_NAMES = {
+        1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+        7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+    }
+    df = df.assign(periodo=[f"{int(y)}-{int(m):02d}" for y, m in zip(df['anio'], df['mes'])])
+    periods = df[['anio', 'mes', 'periodo']].drop_duplicates().sort_values(['anio', 'mes'])
+    default_period_id = periods['periodo'].iloc[-1] if len(periods) else None
+    
+    shard_dir = os.path.join(out_dir, 'j')
+    os.makedirs(shard_dir, exist_ok=True)
+    
+    jurisdicciones = []
+    used = set()
+    for name, group in df.groupby('jurisdiccion', sort=True):
+        shard_id = _slug(name)
+        suffix = 2
+        while shard_id in used:
+            shard_id = f"{_slug(name)}-{suffix}"
+            suffix += 1
+        used.add(shard_id)
+        
+        write_json(os.path.join(shard_dir, f'{shard_id}.json'), {
+            "jurisdiccion": name,
+            "periodos": group['periodo'].tolist(),
+            "empleados": group['cantidad_empleados'].tolist(),
+            "masa_salarial": (group['masa_salarial'] / 1_000_000).tolist(),
+            "salario_promedio": group['salario_promedio'].tolist(),
+            "var_nominal_ia": (group['var_nominal_ia'] * 100).tolist(),
+            "var_real_ia": (group['var_real_ia'] * 100).tolist()
+        })
+        
+        last = group.iloc[-1]
+        jurisdicciones.append({
+            "id": shard_id,
+            "label": name,
+            "ultimo_periodo": last['periodo'],
+            "empleados": last['cantidad_empleados'],
+            "masa_salarial": last['masa_salarial'] / 1_000_000
+        })
+    
+    for file_name in os.listdir(shard_dir):
+        if file_name.endswith('.json') and file_name[:-len('.json')] not in used:
+            remove_json(os.path.join(shard_dir, file_name))
+    
+    write_json(os.path.join(out_dir, 'index.json'), {
+        "meta": {
+            "available_periods": [
+                {"id": pid, "label": MONTH_NAMES.get(int(m), str(m)), "month": int(m), "year": int(y)}
+                for y, m, pid in periods.itertuples(index=False)
+            ],
+            "default_period_id": default_period_id
+        },
+        "jurisdicciones": jurisdicciones
+    })
+    print(f"  [personal] index + {len(jurisdicciones)} jurisdicciones en {out_dir}")
 
 def generate_json(df):
     MONTH_NAMES = {
@@ -331,8 +280,7 @@ def generate_json(df):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_path = os.path.join(script_dir, '..', 'data', 'data_personal_v1.json')
     
-    with open(output_path, 'w') as f:
-        json.dump(final_data, f, indent=2, ensure_ascii=False)
+    write_json(output_path, final_data)
     print(f"Generated {output_path} with updated logic")
 
 def main():
@@ -349,6 +297,15 @@ def main():
     df_dashboard = process_data(df_personnel, df_ipc, df_ripte)
     
     generate_json(df_dashboard)
+    
+    print("Processing Jurisdiction Data...")
+    try:
+        df_juris = process_jurisdicciones(fetch_data_jurisdicciones(), df_ipc)
+        write_jurisdiccion_shards(df_juris)
+    except Exception as e:
+        print(f"Error processing jurisdiction data: {e}")
+    
+    update_manifest()
 
 
 if __name__ == "__main__":
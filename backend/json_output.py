@@ -0,0 +1,201 @@
+import os
+import gzip
+import json
+import math
+import hashlib
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ETL_JSON_PRETTY=1 writes indented JSON (debugging); production output is compact
+PRETTY = os.getenv('ETL_JSON_PRETTY', '0') == '1'
+
+# Decimals kept per field family, matched by substring of the key (first match wins).
+# Keys outside every family are amounts (pesos or millions of pesos) and keep DEFAULT_DECIMALS.
+FIELD_ROUNDING = [
+    (('ipc',), 6),  # IPC variations, used client-side as deflators
+    (('var', 'pct', 'cobertura', 'percentage', 'ratio'), 4),  # percentages
+]
+DEFAULT_DECIMALS = 2
+
+# data/manifest.json maps every file written under data/ to its content hash and size,
+# so the frontend can request it as <file>?v=<hash> and let browsers cache it for long
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+MANIFEST_PATH = os.path.join(DATA_DIR, 'manifest.json')
+MANIFEST_FORMAT = 'data-manifest-v1'
+HASH_LENGTH = 12
+# Private files (denied by .htaccess) are never listed in the public manifest
+MANIFEST_EXCLUDE = {'users.json', 'config.json'}
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+_warned_brotli = False
+# Manifest entries recorded since the last update_manifest() (None = file removed)
+_manifest_updates = {}
+
+
+def _decimals_for(key, rounding, default, cache):
+    if key not in cache:
+        cache[key] = default
+        if isinstance(key, str):
+            for patterns, decimals in rounding:
+                if any(p in key for p in patterns):
+                    cache[key] = decimals
+                    break
+    return cache[key]
+
+
+def normalize(obj, rounding=FIELD_ROUNDING, default=DEFAULT_DECIMALS):
+    """
+    Returns a copy of `obj` ready to serialize: NaN/inf/NA become None, numpy and pandas
+    scalars become Python types, and floats are rounded by the family of the nearest dict key.
+    `default=None` leaves floats outside every family unrounded.
+    """
+    cache = {}
+
+    def walk(value, key):
+        if isinstance(value, dict):
+            return {(k.item() if isinstance(k, np.generic) else k): walk(v, k) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [walk(v, key) for v in value]
+        if isinstance(value, np.ndarray):
+            return [walk(v, key) for v in value.tolist()]
+        if isinstance(value, (bool, np.bool_)):
+            return bool(value)
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        if isinstance(value, (float, np.floating)):
+            value = float(value)
+            if not math.isfinite(value):
+                return None
+            decimals = _decimals_for(key, rounding, default, cache)
+            return value if decimals is None else round(value, decimals)
+        if value is None or value is pd.NA or value is pd.NaT:
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.isoformat()
+        return value
+
+    return walk(obj, None)
+
+
+def dumps(data, rounding=FIELD_ROUNDING, default=DEFAULT_DECIMALS):
+    """Serializes `data` to UTF-8 bytes with orjson when available, stdlib json otherwise."""
+    data = normalize(data, rounding, default)
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if PRETTY:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if PRETTY:
+        text = json.dumps(data, ensure_ascii=False, indent=2, allow_nan=False)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    return text.encode('utf-8')
+
+
+def write_compressed(path, payload):
+    """Writes `path`.gz (and `path`.br when brotli is installed) so the static host can serve them as-is."""
+    global _warned_brotli
+    # mtime=0 keeps the .gz byte-identical when the content does not change
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(payload, quality=BROTLI_QUALITY))
+    elif not _warned_brotli:
+        print("  [json] WARNING: brotli no está instalado, no se generan los .br")
+        _warned_brotli = True
+
+
+def _manifest_key(path):
+    """Path relative to data/ ('_ipce_v1/p/2026-01.json'), or None for files outside it or private."""
+    rel = os.path.relpath(os.path.normpath(os.path.abspath(path)), DATA_DIR)
+    if rel.startswith('..') or os.path.isabs(rel):
+        return None
+    rel = rel.replace(os.sep, '/')
+    return None if rel in MANIFEST_EXCLUDE else rel
+
+
+def _same_content(path, payload):
+    if not os.path.exists(path) or os.path.getsize(path) != len(payload):
+        return False
+    with open(path, 'rb') as f:
+        return f.read() == payload
+
+
+def write_json(path, data, rounding=FIELD_ROUNDING, default=DEFAULT_DECIMALS, compress=True):
+    """
+    Writes `data` to `path` as compact JSON (see dumps), plus its precompressed siblings.
+    Files whose content did not change are left untouched. Files under data/ are recorded
+    for the manifest (see update_manifest).
+    Returns True if `path` was (re)written.
+    """
+    payload = dumps(data, rounding, default)
+    changed = not _same_content(path, payload)
+    if changed:
+        with open(path, 'wb') as f:
+            f.write(payload)
+    siblings = [path + '.gz'] + ([path + '.br'] if brotli is not None else [])
+    if compress and (changed or not all(os.path.exists(s) for s in siblings)):
+        write_compressed(path, payload)
+    key = _manifest_key(path)
+    if key is not None:
+        _manifest_updates[key] = {
+            'hash': hashlib.sha256(payload).hexdigest()[:HASH_LENGTH],
+            'bytes': len(payload)
+        }
+    return changed
+
+
+def remove_json(path):
+    """Removes `path` and its precompressed siblings, if present."""
+    for candidate in (path,) + tuple(path + s for s in COMPRESSED_SUFFIXES):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+    key = _manifest_key(path)
+    if key is not None:
+        _manifest_updates[key] = None
+
+
+def update_manifest(path=MANIFEST_PATH):
+    """
+    Merges the entries recorded by write_json/remove_json into data/manifest.json.
+    Entries of files not written in this run (other scripts, failed steps) are kept.
+    """
+    if not _manifest_updates:
+        return
+    files = {}
+    try:
+        with open(path, 'rb') as f:
+            files = json.loads(f.read()).get('files', {})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"  [manifest] WARNING: no se pudo leer {path}, se regenera: {e}")
+    for key in MANIFEST_EXCLUDE:
+        files.pop(key, None)
+    for key, entry in _manifest_updates.items():
+        if entry is None:
+            files.pop(key, None)
+        else:
+            files[key] = entry
+    _manifest_updates.clear()
+
+    manifest = {'format': MANIFEST_FORMAT, 'files': dict(sorted(files.items()))}
+    payload = dumps(manifest, default=None)
+    if not _same_content(path, payload):
+        with open(path, 'wb') as f:
+            f.write(payload)
+        print(f"  [manifest] {len(files)} archivos en {path}")
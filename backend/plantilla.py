@@ -0,0 +1,265 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+import mysql.connector
+from db import read_mysql
+
+# plantilla_personal_provincia feeds fetch_masa_salarial, fetch_salary_details (etl_main) and
+# fetch_data (etl_personal) through load_payroll, normally aggregated by MySQL.
+# The full extract (load_plantilla) is read at most once per run: within a process it is kept
+# in memory; between the scripts of the same run it goes through a Parquet file that is
+# reused while younger than PLANTILLA_CACHE_MAX_AGE.
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', '.cache')
+PLANTILLA_CACHE_PATH = os.path.join(CACHE_DIR, 'plantilla_personal.parquet')
+PLANTILLA_CACHE_MAX_AGE = int(os.getenv('PLANTILLA_CACHE_MAX_AGE', 6 * 3600))
+
+PLANTILLA_QUERY = """
+SELECT
+    anio,
+    mes,
+    jurisdiccion,
+    liquidacion,
+    total_gral,
+    importe_gral
+FROM plantilla_personal_provincia
+"""
+PLANTILLA_DTYPES = {
+    'anio': 'int16',
+    'mes': 'int8',
+    'jurisdiccion': 'category',
+    'liquidacion': 'category',
+    'total_gral': 'float64',
+    'importe_gral': 'float64'
+}
+PLANTILLA_COLUMNS = ['anio', 'mes', 'jurisdiccion', 'liquidacion', 'tipo_liquidacion', 'total_gral', 'importe_gral']
+
+# tipo_liquidacion: 'sac' rows (aguinaldo) are left out of the average salary,
+# 'sueldo' rows (not SAC) give the headcount, everything else is 'otro'
+TIPOS_LIQUIDACION = ['sueldo', 'sac', 'otro']
+SAC_PATTERN = r'SAC|S\.A\.C|sac|s\.a\.c|Cuota\s*SAC|Aguinaldo'
+SUELDO_PATTERN = 'sueldo'
+
+# Payroll aggregation (load_payroll): 'sql' pushes it to MySQL, 'pandas' computes it from the extract
+PAYROLL_AGGREGATION = os.getenv('PAYROLL_AGGREGATION', 'sql')
+PAYROLL_MEASURES = ['masa_salarial', 'masa_sin_sac', 'cantidad_empleados']
+
+_extract = None
+_extract_lock = threading.Lock()
+_payroll = {}
+_payroll_lock = threading.Lock()
+
+
+def _read_mysql():
+    # Typed as it is read: small ints for the period, categories for the repeated labels.
+    # NULL amounts stay NaN; each consumer decides how to fill them.
+    df = read_mysql(PLANTILLA_QUERY, PLANTILLA_DTYPES)
+    df['tipo_liquidacion'] = classify_liquidacion(df['liquidacion'])
+    return df[PLANTILLA_COLUMNS]
+
+
+def classify_liquidacion(liquidacion):
+    """
+    Maps each liquidacion to a categorical tipo_liquidacion (TIPOS_LIQUIDACION).
+    The patterns are evaluated once per distinct value, not once per row; NULL is 'otro'.
+    """
+    codes, names = pd.factorize(liquidacion)
+    names = pd.Series(np.asarray(names, dtype=object)).astype(str)
+    is_sac = names.str.contains(SAC_PATTERN, case=False).to_numpy()
+    is_sueldo = names.str.contains(SUELDO_PATTERN, case=False).to_numpy()
+    tipo_codes = np.where(is_sac, TIPOS_LIQUIDACION.index('sac'),
+                          np.where(is_sueldo, TIPOS_LIQUIDACION.index('sueldo'), TIPOS_LIQUIDACION.index('otro')))
+    # factorize marks NULL with -1, which picks the trailing 'otro'
+    tipo_codes = np.append(tipo_codes, TIPOS_LIQUIDACION.index('otro')).astype('int8')
+    return pd.Series(
+        pd.Categorical.from_codes(tipo_codes[codes], categories=TIPOS_LIQUIDACION),
+        index=liquidacion.index,
+        name='tipo_liquidacion'
+    )
+
+
+def payroll_by_period(df, by_jurisdiccion=False):
+    """
+    Aggregates payroll rows by (anio, mes[, jurisdiccion]) with a single groupby on tipo_liquidacion:
+      masa_salarial       importe_gral of every row (SAC included)
+      masa_sin_sac        importe_gral of 'sueldo' + 'otro' rows (average salary numerator)
+      cantidad_empleados  total_gral of 'sueldo' rows
+    A measure is NaN in periods without rows of the tipos it uses.
+    Frames that are already aggregated (load_payroll) are returned unchanged.
+    """
+    if 'liquidacion' not in df.columns and set(PAYROLL_MEASURES) <= set(df.columns):
+        return df
+    if 'tipo_liquidacion' not in df.columns:
+        df = df.assign(tipo_liquidacion=classify_liquidacion(df['liquidacion']))
+    keys = _payroll_keys(by_jurisdiccion)
+    sums = df.groupby(keys + ['tipo_liquidacion'], observed=True, dropna=False)[['importe_gral', 'total_gral']].sum()
+    importe = sums['importe_gral'].unstack('tipo_liquidacion').reindex(columns=TIPOS_LIQUIDACION)
+    total = sums['total_gral'].unstack('tipo_liquidacion').reindex(columns=TIPOS_LIQUIDACION)
+    return pd.DataFrame({
+        'masa_salarial': importe.sum(axis=1, min_count=1),
+        'masa_sin_sac': importe[['sueldo', 'otro']].sum(axis=1, min_count=1),
+        'cantidad_empleados': total['sueldo']
+    }).reset_index()
+
+
+def _payroll_keys(by_jurisdiccion):
+    return ['anio', 'mes', 'jurisdiccion'] if by_jurisdiccion else ['anio', 'mes']
+
+
+def build_payroll_query(by_jurisdiccion=False):
+    """
+    The payroll_by_period aggregation done by MySQL: tipo_liquidacion is derived with the same
+    patterns as classify_liquidacion (case-insensitive via LOWER; NULL is 'otro') and each measure is a
+    conditional SUM. Amounts are COALESCEd like the pandas sums, so a measure is NULL only when
+    the period has no rows of its tipos.
+    
+    Returns:
+        tuple: (sql, params)
+    """
+    keys = ', '.join(_payroll_keys(by_jurisdiccion))
+    sql = f"""
+    SELECT
+        {keys},
+        SUM(COALESCE(importe_gral, 0)) AS masa_salarial,
+        SUM(CASE WHEN tipo_liquidacion IN ('sueldo', 'otro') THEN COALESCE(importe_gral, 0) END) AS masa_sin_sac,
+        SUM(CASE WHEN tipo_liquidacion = 'sueldo' THEN COALESCE(total_gral, 0) END) AS cantidad_empleados
+    FROM (
+        SELECT
+            anio,
+            mes,
+            jurisdiccion,
+            importe_gral,
+            total_gral,
+            CASE
+                WHEN LOWER(liquidacion) REGEXP %s THEN 'sac'
+                WHEN LOWER(liquidacion) REGEXP %s THEN 'sueldo'
+                ELSE 'otro'
+            END AS tipo_liquidacion
+        FROM plantilla_personal_provincia
+    ) p
+    GROUP BY {keys}
+    ORDER BY {keys}
+    """
+    return sql, (_sql_pattern(SAC_PATTERN), _sql_pattern(SUELDO_PATTERN))
+
+
+def _sql_pattern(pattern):
+    """
+    A Python pattern for `LOWER(col) REGEXP`, which works on MySQL 5.7/8 and MariaDB alike:
+    lowercased (case-insensitive whatever the collation) and with POSIX classes for \\s.
+    """
+    return pattern.lower().replace(r'\s', '[[:space:]]')
+
+
+def _read_payroll_mysql(by_jurisdiccion):
+    sql, params = build_payroll_query(by_jurisdiccion)
+    dtypes = {'anio': 'int16', 'mes': 'int8', 'jurisdiccion': 'category'}
+    dtypes.update({measure: 'float64' for measure in PAYROLL_MEASURES})
+    return read_mysql(sql, dtypes, params=params)
+
+
+def load_payroll(by_jurisdiccion=False, refresh=False):
+    """
+    Returns the payroll measures (PAYROLL_MEASURES) by (anio, mes[, jurisdiccion]), as
+    payroll_by_period would compute them from the extract. With PAYROLL_AGGREGATION='sql'
+    (default) MySQL aggregates and only a few hundred rows are transferred; with 'pandas',
+    or if the server rejects the aggregate query, they are computed from load_plantilla(). Thread-safe; read once per process.
+    Callers must not modify the returned frame in place.
+    """
+    key = bool(by_jurisdiccion)
+    with _payroll_lock:
+        if key not in _payroll or refresh:
+            df = None
+            if PAYROLL_AGGREGATION == 'sql':
+                print(f"  [plantilla] Agregando plantilla_personal_provincia en MySQL{' por jurisdicción' if key else ''}...")
+                try:
+                    df = _read_payroll_mysql(key)
+                    print(f"  [plantilla] {len(df)} filas agregadas")
+                except mysql.connector.Error as e:
+                    print(f"  [plantilla] WARNING: La agregación en MySQL falló ({e}); se agrega el extracto en pandas")
+            if df is None:
+                df = payroll_by_period(load_plantilla(refresh=refresh), by_jurisdiccion=key)
+            _payroll[key] = df
+        return _payroll[key]
+
+
+def check_payroll_parity(by_jurisdiccion=False, rtol=1e-9):
+    """
+    Compares the MySQL aggregation with payroll_by_period over the full extract.
+    Returns True when both give the same rows and measures (within `rtol`).
+    """
+    keys = _payroll_keys(by_jurisdiccion)
+    sql_side = _read_payroll_mysql(by_jurisdiccion)
+    pandas_side = payroll_by_period(load_plantilla(refresh=True), by_jurisdiccion=by_jurisdiccion)
+    
+    def normalized(df):
+        df = df.astype({'anio': int, 'mes': int})
+        if by_jurisdiccion:
+            df['jurisdiccion'] = df['jurisdiccion'].astype(object)
+        return df.set_index(keys)[PAYROLL_MEASURES].sort_index()
+    
+    try:
+        pd.testing.assert_frame_equal(normalized(sql_side), normalized(pandas_side), check_dtype=False, rtol=rtol)
+    except AssertionError as e:
+        print(f"  [plantilla] Paridad SQL/pandas FALLÓ: {e}")
+        return False
+    print(f"  [plantilla] Paridad SQL/pandas OK ({len(sql_side)} filas)")
+    return True
+
+
+def _load_cache():
+    """Returns the Parquet extract if it is recent enough, otherwise None."""
+    try:
+        age = time.time() - os.path.getmtime(PLANTILLA_CACHE_PATH)
+    except OSError:
+        return None
+    if age > PLANTILLA_CACHE_MAX_AGE:
+        return None
+    try:
+        df = pd.read_parquet(PLANTILLA_CACHE_PATH)
+        print(f"  [plantilla] Usando extracto de hace {age / 60:.0f} min ({len(df)} filas)")
+        return df[PLANTILLA_COLUMNS]
+    except Exception as e:
+        print(f"  [plantilla] WARNING: No se pudo leer {PLANTILLA_CACHE_PATH}: {e}")
+        return None
+
+
+def _save_cache(df):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(PLANTILLA_CACHE_PATH, index=False)
+    except Exception as e:
+        print(f"  [plantilla] WARNING: No se pudo escribir {PLANTILLA_CACHE_PATH}: {e}")
+
+
+def load_plantilla(refresh=False):
+    """
+    Returns the plantilla_personal_provincia extract with columns PLANTILLA_COLUMNS
+    (anio int16, mes int8, jurisdiccion/liquidacion categorical, amounts float64).
+    Thread-safe: concurrent callers wait for a single read. `refresh=True` ignores
+    both the in-memory copy and the Parquet cache.
+    Callers must not modify the returned frame in place.
+    """
+    global _extract
+    with _extract_lock:
+        if _extract is None or refresh:
+            df = None if refresh else _load_cache()
+            if df is None:
+                print("  [plantilla] Leyendo plantilla_personal_provincia desde MySQL...")
+                df = _read_mysql()
+                print(f"  [plantilla] {len(df)} filas cargadas")
+                _save_cache(df)
+            _extract = df
+        return _extract
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Verifica que la agregación de la plantilla en MySQL coincida con la de pandas")
+    parser.add_argument('--por-jurisdiccion', action='store_true', help="Compara también el desglose por jurisdicción")
+    args = parser.parse_args()
+    ok = check_payroll_parity()
+    if args.por_jurisdiccion:
+        ok = check_payroll_parity(by_jurisdiccion=True) and ok
+    raise SystemExit(0 if ok else 1)
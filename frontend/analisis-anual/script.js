@@ -1,5 +1,7 @@
 // Global state to hold fetched data
 let dashboardData = null;
+// Último año pedido: descarta renders de selecciones anteriores que terminan tarde
+let requestedPeriodId = null;
 
 // Global Chart.js Legend Click Override - "Solo" Behavior
 const customLegendClick = function (e, legendItem, legend) {
@@ -131,8 +133,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Use an absolute-relative path based on the current domain to avoid nested folder 404s
     const basePath = new URL('.', window.location.href).pathname === '/' ? '/' : new URL('..', window.location.href).pathname;
 
-    fetch('../../data/_data_ipce_v1.json')
-        .then(response => response.json())
+    IpceData.loadIndex()
         .then(data => {
             dashboardData = data.annual_monitor;
             initYearSelector(dashboardData.meta.available_periods);
@@ -192,8 +193,16 @@ function initYearSelector(periods) {
     const initialOption = selector.selectedOptions[0];
 }
 
-function renderDashboard(periodId) {
-    if (!dashboardData || !dashboardData.data[periodId]) return;
+async function renderDashboard(periodId) {
+    if (!dashboardData) return;
+    requestedPeriodId = periodId;
+    try {
+        await IpceData.loadYears(dashboardData, [periodId]);
+    } catch (error) {
+        console.error('Error loading data:', error);
+        return;
+    }
+    if (requestedPeriodId !== periodId || !dashboardData.data[periodId]) return;
 
     const periodData = dashboardData.data[periodId];
     const iterYear = parseInt(periodId);
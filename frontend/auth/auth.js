@@ -10,36 +10,17 @@ const Auth = (function () {
     const CONFIG = {
         SESSION_KEY: 'copa_auth_session',
         SESSION_DURATION: 8 * 60 * 60 * 1000, // 8 hours in milliseconds
+        LOG_BATCH_SIZE: 10, // Telemetry events sent per request
+        LOG_FLUSH_MS: 3000, // Max time an event waits before being sent
     };
 
     // User credentials (will be loaded from JSON)
     let USERS = null;
     let API_CONFIG = null;
 
-    /**
-     * Helper to get the absolute URL to the /data/ folder.
-     * Works regardless of whether the server is started from the project root or from /frontend/.
-     */
-    function getDataUrl(filename) {
-        const origin = window.location.origin;
-        const path = window.location.pathname;
-
-        // Case 1: server runs from project root → path includes /frontend/
-        if (path.includes('/frontend/')) {
-            // Find everything up to and including the root of the project (before /frontend/)
-            const rootPath = path.substring(0, path.indexOf('/frontend/'));
-            return `${origin}${rootPath}/data/${filename}`;
-        }
-
-        // Case 2: server runs from /frontend/ directory → no /frontend/ in path
-        // The data/ folder is one level up (../data/), but since we're at origin root, try /data/ first
-        // We resolve relative to current page
-        const segments = path.split('/');
-        // Remove everything after the first subfolder (e.g. /main/ → go up to /)
-        const depth = segments.filter(s => s.length > 0).length;
-        const ups = depth > 1 ? '../'.repeat(depth - 1) : '';
-        return `${origin}/${ups}data/${filename}`.replace(/([^:]\/)\/+/g, '$1');
-    }
+    // Telemetry events waiting to be sent together
+    const pendingLogs = [];
+    let flushTimer = null;
 
     /**
      * Load configuration from the synchronized data file
@@ -47,7 +28,7 @@ const Auth = (function () {
     async function loadConfig() {
         if (API_CONFIG) return API_CONFIG;
         try {
-        const response = await fetch(getDataUrl('config.json'));
+        const response = await fetch(await DataFiles.getVersionedUrl('config.json'));
             if (response.ok) {
                 API_CONFIG = await response.json();
             } else {
@@ -60,13 +41,45 @@ const Auth = (function () {
         return API_CONFIG;
     }
 
+    /**
+     * Batch endpoint: API_URL_POST_BATCH from config.json, or API_URL_POST + '/batch'
+     */
+    function getBatchUrl(config) {
+        return config.API_URL_POST_BATCH || `${config.API_URL_POST.replace(/\/$/, '')}/batch`;
+    }
+
+    /**
+     * Send every queued telemetry event in a single request.
+     * keepalive lets the request complete while the page is being unloaded.
+     */
+    function sendPendingLogs(config) {
+        clearTimeout(flushTimer);
+        flushTimer = null;
+        if (pendingLogs.length === 0) return Promise.resolve();
+
+        const eventos = pendingLogs.splice(0, pendingLogs.length);
+        return fetch(getBatchUrl(config), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ eventos: eventos }),
+            keepalive: true
+        }).catch(err => {
+            console.warn("Telemetry not sent:", err.message);
+        });
+    }
+
+    async function flushLogs() {
+        const config = await loadConfig();
+        return sendPendingLogs(config);
+    }
+
     /**
      * Load users from the synchronized data file
      */
     async function loadUsers() {
         if (USERS) return USERS;
         try {
-        const response = await fetch(getDataUrl('users.json'));
+        const response = await fetch(await DataFiles.getVersionedUrl('users.json'));
             if (!response.ok) throw new Error('Could not load users database');
             USERS = await response.json();
         } catch (error) {
@@ -248,28 +261,43 @@ const Auth = (function () {
          * @param {string} accion - Type of action (e.g., 'Filtrar', 'Descargar')
          * @param {Object} detalle - Additional data as JSON
          */
-        logActivity: async function (seccion, accion, detalle = {}) {
+        logActivity: function (seccion, accion, detalle = {}) {
             const user = this.getCurrentUser();
-            if (!user || !user.id) return;
+            if (!user || !user.id) return Promise.resolve();
 
-            const logData = {
+            pendingLogs.push({
                 id_usuario: user.id,
                 seccion_tablero: seccion,
                 accion: accion,
                 detalle_interaccion: detalle
-            };
+            });
 
-            const config = await loadConfig();
+            // Events are sent in batches: when enough are queued or after LOG_FLUSH_MS
+            if (pendingLogs.length >= CONFIG.LOG_BATCH_SIZE) {
+                return flushLogs();
+            }
+            if (!flushTimer) {
+                loadConfig(); // So the config is ready if the page is closed before the timer fires
+                flushTimer = setTimeout(flushLogs, CONFIG.LOG_FLUSH_MS);
+            }
+            return Promise.resolve();
+        },
 
-            // Point to the centralized API
-            try {
-                return await fetch(config.API_URL_POST, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(logData)
-                });
-            } catch (err) {
-                console.warn("Telemetry not sent:", err.message);
+        /**
+         * Send queued activity now (e.g. right before navigating away)
+         */
+        flushActivity: function () {
+            return flushLogs();
+        },
+
+        /**
+         * Flush queued activity when the page is hidden or closed
+         */
+        flushActivityOnExit: function () {
+            if (API_CONFIG) {
+                sendPendingLogs(API_CONFIG);
+            } else {
+                flushLogs();
             }
         }
     };
@@ -292,6 +320,14 @@ ACTIVITY_EVENTS.forEach(event => {
     document.addEventListener(event, resetActivityTimer, true);
 });
 
+// Don't lose batched telemetry when the user navigates away or closes the tab
+window.addEventListener('pagehide', () => Auth.flushActivityOnExit());
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+        Auth.flushActivityOnExit();
+    }
+});
+
 // Export for use in modules (if needed)
 if (typeof module !== 'undefined' && module.exports) {
     module.exports = Auth;
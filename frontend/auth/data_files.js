@@ -0,0 +1,71 @@
+/**
+ * Data Files Module
+ * Resolves URLs to the /data/ folder and versions them with the content hash
+ * published by the ETL in data/manifest.json (file.json?v=<hash>), so the
+ * browser only downloads a file again when its content changed.
+ */
+
+const DataFiles = (function () {
+    'use strict';
+
+    let manifestRequest = null;
+
+    /**
+     * Absolute URL to a file in the /data/ folder.
+     * Works regardless of whether the server is started from the project root or from /frontend/.
+     */
+    function getDataUrl(filename) {
+        const origin = window.location.origin;
+        const path = window.location.pathname;
+
+        // Case 1: server runs from project root → path includes /frontend/
+        if (path.includes('/frontend/')) {
+            // Find everything up to and including the root of the project (before /frontend/)
+            const rootPath = path.substring(0, path.indexOf('/frontend/'));
+            return `${origin}${rootPath}/data/${filename}`;
+        }
+
+        // Case 2: server runs from /frontend/ directory → no /frontend/ in path
+        // The data/ folder is one level up (../data/), but since we're at origin root, try /data/ first
+        // We resolve relative to current page
+        const segments = path.split('/');
+        // Remove everything after the first subfolder (e.g. /main/ → go up to /)
+        const depth = segments.filter(s => s.length > 0).length;
+        const ups = depth > 1 ? '../'.repeat(depth - 1) : '';
+        return `${origin}/${ups}data/${filename}`.replace(/([^:]\/)\/+/g, '$1');
+    }
+
+    /**
+     * El manifest siempre se revalida; si falta, los archivos se piden sin versión.
+     */
+    function loadManifest() {
+        if (!manifestRequest) {
+            manifestRequest = fetch(getDataUrl('manifest.json'), { cache: 'no-cache' })
+                .then(response => response.ok ? response.json() : { files: {} })
+                .catch(() => ({ files: {} }));
+        }
+        return manifestRequest;
+    }
+
+    /**
+     * URL of `filename` (relative to data/, e.g. '_ipce_v1/index.json') with its content hash
+     */
+    async function getVersionedUrl(filename) {
+        const manifest = await loadManifest();
+        const entry = manifest.files && manifest.files[filename];
+        const url = getDataUrl(filename);
+        return entry ? `${url}?v=${entry.hash}` : url;
+    }
+
+    async function fetchJson(filename) {
+        const response = await fetch(await getVersionedUrl(filename));
+        if (!response.ok) throw new Error(`No se pudo cargar ${filename} (${response.status})`);
+        return response.json();
+    }
+
+    return {
+        getDataUrl,
+        getVersionedUrl,
+        fetchJson,
+    };
+})();
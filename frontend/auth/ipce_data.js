@@ -0,0 +1,48 @@
+/**
+ * IPCE Data Module
+ * Loads the monitor output split by period: index.json once, and each
+ * period (p/) or year (a/) only when a page needs it.
+ */
+
+const IpceData = (function () {
+    'use strict';
+
+    const BASE_DIR = '_ipce_v1/';
+
+    // Un request por archivo, compartido entre llamadas
+    const requests = {};
+
+    function load(path) {
+        if (!requests[path]) {
+            requests[path] = DataFiles.fetchJson(BASE_DIR + path)
+                .catch(error => {
+                    delete requests[path];
+                    throw error;
+                });
+        }
+        return requests[path];
+    }
+
+    /**
+     * Trae los archivos de `ids` que aún no están en target.data y los guarda por id,
+     * de modo que target.data[id] tenga la misma forma que en el JSON completo.
+     */
+    function fill(target, dir, ids) {
+        target.data = target.data || {};
+        const missing = ids.filter(id => !target.data[id]);
+        return Promise.all(missing.map(id =>
+            load(`${dir}/${id}.json`).then(shard => {
+                target.data[id] = shard;
+            })
+        ));
+    }
+
+    return {
+        // meta (available_periods, default_period_id), annual_monitor.meta, annual, global_charts, secondary_charts
+        loadIndex: () => load('index.json'),
+        // Períodos del Monitor Mensual ("2026-01")
+        loadPeriods: (target, ids) => fill(target, 'p', ids),
+        // Años del Monitor Anual ("2025")
+        loadYears: (target, ids) => fill(target, 'a', ids),
+    };
+})();
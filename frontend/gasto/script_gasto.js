@@ -1,5 +1,5 @@
 // gasto/script_gasto.js
-let rawData = [];
+let cube = null; // gasto_cube.json (etl_main.build_gasto_cube)
 let ratioChartInstance = null;
 let waterfallChartInstance = null;
 
@@ -88,6 +88,48 @@ function format1M(val) {
 
 const tsInstances = {};
 
+// Cubo pre-agregado: una fila por (periodo, jurisdiccion, fuente, partida), con el miembro 'TODAS'
+// en jurisdiccion/fuente/partida. values[estado] = monto del mes (null = sin registros),
+// ytd[estado] = acumulado del año hasta ese periodo (Comprometido y Ordenado).
+function indexGastoCube(payload) {
+    const { dims, codes } = payload;
+    const cells = new Map();
+    const n = codes[dims[0]].length;
+    for (let i = 0; i < n; i++) {
+        cells.set(dims.map(d => payload.dict[d][codes[d][i]]).join('|'), i);
+    }
+    return { ...payload, cells };
+}
+
+function cubeCell(periodo, juris, fuente, partida, estado, field = 'values') {
+    const i = cube.cells.get(`${periodo}|${juris}|${fuente}|${partida}`);
+    const col = cube[field][estado];
+    return (i === undefined || !col) ? null : col[i];
+}
+
+// Suma de celdas sobre los miembros seleccionados; una lista null equivale a TODAS
+function cubeSum(periodos, jurisList, fuenteList, partida, estado, field = 'values') {
+    const js = jurisList || [cube.todas];
+    const fs = fuenteList || [cube.todas];
+    let total = 0;
+    periodos.forEach(p => js.forEach(j => fs.forEach(f => {
+        total += cubeCell(p, j, f, partida, estado, field) || 0;
+    })));
+    return total;
+}
+
+function setToList(set) {
+    return set ? [...set] : null;
+}
+
+function cubePeriodos() {
+    return cube.dict.periodo.filter(p => p).sort();
+}
+
+function cubeJurisdicciones() {
+    return new Set(cube.dict.jurisdiccion.filter(j => j && j !== cube.todas));
+}
+
 document.addEventListener('DOMContentLoaded', () => initDashboard());
 
 async function initDashboard() {
@@ -97,9 +139,7 @@ async function initDashboard() {
         return;
     }
     try {
-        const response = await fetch('../../data/gasto_data.json');
-        if (!response.ok) throw new Error('Error loading gasto data');
-        rawData = await response.json();
+        cube = indexGastoCube(await DataFiles.fetchJson('gasto_cube.json'));
 
         // --- FIX Bug sesión: mostrar usuario y conectar botón salir ---
         const currentUser = Auth.getCurrentUser();
@@ -263,14 +303,13 @@ function getMultiValues(selId) {
     return new Set(vals);
 }
 
-function matchFuenteMulti(d, fuenteSet) {
-    if (!fuenteSet) return true;
-    return fuenteSet.has(String(d.tipo_financ));
-}
-
-function matchJurisMulti(d, jurisSet) {
-    if (!jurisSet) return true;
-    return jurisSet.has((d.jurisdiccion || '').trim());
+// Vigente del último periodo y Comprometido/Ordenado sumados sobre los periodos, por partida
+function sumByPartida(periodos, maxPeriodo, jurisList, fuenteList, gV, gC, gO) {
+    ORDEN_PARTIDAS.forEach(p => {
+        gV[p] = maxPeriodo ? cubeSum([maxPeriodo], jurisList, fuenteList, p, 'Credito Vigente') : 0;
+        gC[p] = cubeSum(periodos, jurisList, fuenteList, p, 'Comprometido');
+        gO[p] = cubeSum(periodos, jurisList, fuenteList, p, 'Ordenado');
+    });
 }
 
 function getSimpleVal(selId) {
@@ -278,11 +317,6 @@ function getSimpleVal(selId) {
     return el ? el.value : '';
 }
 
-function matchFuenteSingle(d, fuenteVal) {
-    if (fuenteVal === 'TODAS') return true;
-    return String(d.tipo_financ) === fuenteVal;
-}
-
 function formatPeriodo(isoStr) {
     const parts = isoStr.split('-');
     if (parts.length !== 2) return isoStr;
@@ -295,8 +329,8 @@ function formatPeriodo(isoStr) {
 // POPULATE ALL FILTERS
 // ========================
 function populateAllFilters() {
-    const periodos = [...new Set(rawData.map(d => d.periodo))].sort();
-    const jurisVistasEnBD = new Set(rawData.map(d => (d.jurisdiccion || '').trim()));
+    const periodos = cubePeriodos();
+    const jurisVistasEnBD = cubeJurisdicciones();
     const jurisdicciones = ORDEN_JURISDICCIONES.filter(j => jurisVistasEnBD.has(j));
     const lastPeriodo = periodos.length > 0 ? periodos[periodos.length - 1] : '';
     const currentYear = lastPeriodo ? lastPeriodo.split('-')[0] : '';
@@ -433,7 +467,7 @@ function updateHeatmap() {
     const jurisGroup = getSimpleVal('hm-juris-group') || 'MINISTERIOS';
     const fuenteSet = getMultiValues('hm-fuente');
 
-    const periodos = [...new Set(rawData.map(d => d.periodo))].sort();
+    const periodos = cubePeriodos();
     const ultimoPeriodo = periodos[periodos.length - 1];
     
     // Update Title
@@ -442,20 +476,20 @@ function updateHeatmap() {
         hmTitle.textContent = `Mapa de Calor de Compromiso por Jurisdicción Acumulado hasta ${formatPeriodo(ultimoPeriodo)}`;
     }
 
-    const jurisVistasEnBD = new Set(rawData.map(d => (d.jurisdiccion || '').trim()));
+    const jurisVistasEnBD = cubeJurisdicciones();
     const jurisdicciones = ORDEN_JURISDICCIONES.filter(j => jurisVistasEnBD.has(j));
-    const anioActual = ultimoPeriodo ? ultimoPeriodo.split('-')[0] : '';
+    const fuenteList = setToList(fuenteSet);
 
+    // Acumulado del año hasta el último periodo (ytd) vs. Crédito Vigente de ese periodo
     const estadoAcum = {};
     const vigente = {};
-    rawData.forEach(d => {
-        if (!matchFuenteMulti(d, fuenteSet)) return;
-        if (d.periodo.split('-')[0] !== anioActual) return;
-        const j = (d.jurisdiccion || '').trim();
-        const key = `${d.partida}|${j}`;
-        if (d.estado === estado) estadoAcum[key] = (estadoAcum[key] || 0) + d.monto;
-        if (d.estado === 'Credito Vigente' && d.periodo === ultimoPeriodo) vigente[key] = (vigente[key] || 0) + d.monto;
-    });
+    if (ultimoPeriodo) {
+        jurisdicciones.forEach(j => ORDEN_PARTIDAS.forEach(p => {
+            const key = `${p}|${j}`;
+            estadoAcum[key] = cubeSum([ultimoPeriodo], [j], fuenteList, p, estado, 'ytd');
+            vigente[key] = cubeSum([ultimoPeriodo], [j], fuenteList, p, 'Credito Vigente');
+        }));
+    }
 
     let visibleJuris = jurisdicciones.filter(j => {
         if (jurisGroup === 'TODAS') return true;
@@ -519,7 +553,7 @@ function interpolateColor(c1, c2, t) {
 function updateTable() {
     // Leer periodos seleccionados del multi-select
     const periodoSet = getMultiValues('tbl-periodo');
-    const allPeriodos = [...new Set(rawData.map(d => d.periodo))].sort();
+    const allPeriodos = cubePeriodos();
     let selectedPeriodos = allPeriodos; // si es null (TODAS), usar todos
     if (periodoSet) {
         selectedPeriodos = allPeriodos.filter(p => periodoSet.has(p));
@@ -541,16 +575,8 @@ function updateTable() {
 
     // Vigente: solo del último periodo seleccionado
     // Comp y Ord: sumar todos los periodos seleccionados
-    const matchPeriodo = (d) => !periodoSet || periodoSet.has(d.periodo);
-    const dataV = rawData.filter(d => d.periodo === maxPeriodo && d.estado === 'Credito Vigente' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-    const dataC = rawData.filter(d => matchPeriodo(d) && d.estado === 'Comprometido' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-    const dataO = rawData.filter(d => matchPeriodo(d) && d.estado === 'Ordenado' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-
     const gV = {}, gC = {}, gO = {};
-    ORDEN_PARTIDAS.forEach(p => { gV[p] = 0; gC[p] = 0; gO[p] = 0; });
-    dataV.forEach(d => { if (gV[d.partida] !== undefined) gV[d.partida] += d.monto; });
-    dataC.forEach(d => { if (gC[d.partida] !== undefined) gC[d.partida] += d.monto; });
-    dataO.forEach(d => { if (gO[d.partida] !== undefined) gO[d.partida] += d.monto; });
+    sumByPartida(selectedPeriodos, maxPeriodo, setToList(jurisSet), setToList(fuenteSet), gV, gC, gO);
 
     let tV = 0, tC = 0, tO = 0;
     const rows = ORDEN_PARTIDAS.map(p => {
@@ -592,7 +618,7 @@ function updateTable() {
 function updateRatioChart() {
     // Leer periodos seleccionados
     const periodoSet = getMultiValues('av-periodo');
-    const allPeriodos = [...new Set(rawData.map(d => d.periodo))].sort();
+    const allPeriodos = cubePeriodos();
     let selectedPeriodos = allPeriodos;
     if (periodoSet) {
         selectedPeriodos = allPeriodos.filter(p => periodoSet.has(p));
@@ -614,17 +640,8 @@ function updateRatioChart() {
         }
     }
 
-    // Filtros
-    const matchP = (d) => !periodoSet || periodoSet.has(d.periodo);
-    const fC = rawData.filter(d => matchP(d) && d.estado === 'Comprometido' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-    const fV = rawData.filter(d => d.periodo === maxPeriodo && d.estado === 'Credito Vigente' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-    const fO = rawData.filter(d => matchP(d) && d.estado === 'Ordenado' && matchJurisMulti(d, jurisSet) && matchFuenteMulti(d, fuenteSet));
-
     const gC = {}, gV = {}, gO = {};
-    ORDEN_PARTIDAS.forEach(p => { gC[p] = 0; gV[p] = 0; gO[p] = 0; });
-    fC.forEach(d => { if (gC[d.partida] !== undefined) gC[d.partida] += d.monto; });
-    fV.forEach(d => { if (gV[d.partida] !== undefined) gV[d.partida] += d.monto; });
-    fO.forEach(d => { if (gO[d.partida] !== undefined) gO[d.partida] += d.monto; });
+    sumByPartida(selectedPeriodos, maxPeriodo, setToList(jurisSet), setToList(fuenteSet), gV, gC, gO);
 
     const active = ORDEN_PARTIDAS.filter(p => gV[p] > 0 || gC[p] > 0 || gO[p] > 0);
     const rC = active.map(p => gV[p] > 0 ? (gC[p] / gV[p]) * 100 : 0);
@@ -678,10 +695,10 @@ function updateWaterfallChart() {
     const partidaFilter = getSimpleVal('wf-partida') || 'TODAS';
     const fuente = getSimpleVal('wf-fuente') || 'TODAS';
 
-    const mj = (d) => jurisFilter === 'TODAS' || (d.jurisdiccion || '').trim() === jurisFilter;
-    const mp = (d) => partidaFilter === 'TODAS' || d.partida === partidaFilter;
+    // Un único miembro por filtro ('TODAS' incluido): cada valor es una celda del cubo
+    const cell = (periodo, est) => cubeCell(periodo, jurisFilter, fuente, partidaFilter, est);
 
-    const periodos = [...new Set(rawData.map(d => d.periodo))].sort();
+    const periodos = cubePeriodos();
     if (periodos.length === 0) return;
     
     let year = getSimpleVal('wf-anio');
@@ -691,17 +708,13 @@ function updateWaterfallChart() {
     if (periodosDelAnio.length === 0) return;
     const lastPeriod = periodosDelAnio[periodosDelAnio.length - 1];
 
-    const vigData = rawData.filter(d => d.periodo === lastPeriod && d.estado === 'Credito Vigente' && mj(d) && mp(d) && matchFuenteSingle(d, fuente));
-    const creditoVigente = vigData.reduce((s, d) => s + d.monto, 0);
+    const creditoVigente = cell(lastPeriod, 'Credito Vigente') || 0;
 
     const mesesNombres = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'];
     const periodoKeys = [];
     for (let m = 1; m <= 12; m++) periodoKeys.push(`${year}-${String(m).padStart(2, '0')}`);
 
-    const monthlyData = periodoKeys.map(pk => {
-        const rows = rawData.filter(d => d.periodo === pk && d.estado === estado && mj(d) && mp(d) && matchFuenteSingle(d, fuente));
-        return rows.reduce((s, d) => s + d.monto, 0);
-    });
+    const monthlyData = periodoKeys.map(pk => cell(pk, estado) || 0);
 
     const floatingBars = monthlyData.map((monto, idx) => {
         const base = idx / 12;
@@ -709,7 +722,7 @@ function updateWaterfallChart() {
         return [base, base + height];
     });
 
-    const hasData = periodoKeys.map(pk => rawData.some(d => d.periodo === pk && d.estado === estado && mj(d) && mp(d) && matchFuenteSingle(d, fuente)));
+    const hasData = periodoKeys.map(pk => cell(pk, estado) !== null);
     const barData = floatingBars.map((bar, idx) => hasData[idx] ? bar : null);
 
     const lineDatasets = [];
@@ -161,8 +161,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const basePath = new URL('.', window.location.href).pathname === '/' ? '/' : new URL('..', window.location.href).pathname;
 
     Promise.all([
-        fetch('../../data/_data_ipce_v1.json').then(res => res.json()),
-        fetch('../../data/data_personal_v1.json').then(res => res.json())
+        IpceData.loadIndex(),
+        DataFiles.fetchJson('data_personal_v1.json')
     ])
         .then(([mainData, personalData]) => {
             // Log access to the main dashboard
@@ -170,6 +170,22 @@ document.addEventListener('DOMContentLoaded', () => {
 
             let currentPeriodId = mainData.meta.default_period_id;
 
+            // Renders the dashboard once the selected period's file is loaded
+            const renderPeriod = (periodId) => {
+                IpceData.loadPeriods(mainData, [periodId])
+                    .then(() => {
+                        // A later selection already took over
+                        if (periodId !== currentPeriodId) return;
+                        renderKPIs(mainData, personalData, periodId);
+
+                        // Re-render ALL charts when period changes
+                        renderChart(mainData);
+                        renderPurchasingPowerChart(mainData);
+                        renderCoverageChart(mainData, periodId);
+                    })
+                    .catch(error => console.error('Error loading dashboard data:', error));
+            };
+
             // Setup selector
             const selector = document.getElementById('monthSelector');
             if (selector && mainData.meta.available_periods) {
@@ -213,12 +229,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         selector.style.color = ''; // Default
                     }
                     currentPeriodId = e.target.value;
-                    renderKPIs(mainData, personalData, currentPeriodId);
-
-                    // Re-render ALL charts when period changes
-                    renderChart(mainData);
-                    renderPurchasingPowerChart(mainData);
-                    renderCoverageChart(mainData, currentPeriodId);
+                    renderPeriod(currentPeriodId);
                 });
 
                 // Set initial color
@@ -229,10 +240,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             // Initial render
-            renderKPIs(mainData, personalData, currentPeriodId);
-            renderChart(mainData);
-            renderPurchasingPowerChart(mainData);
-            renderCoverageChart(mainData, currentPeriodId);
+            renderPeriod(currentPeriodId);
         })
         .catch(error => console.error('Error loading dashboard data:', error));
 
@@ -533,8 +541,12 @@ function renderPurchasingPowerChart(mainData) {
     });
 }
 
-function renderCoverageChart(mainData, periodId) {
+// Último período pedido al gráfico de cobertura
+let coveragePeriodId = null;
+
+async function renderCoverageChart(mainData, periodId) {
     if (!mainData.data[periodId] || !mainData.meta.available_periods) return;
+    coveragePeriodId = periodId;
 
     // Obtener los períodos cronológicamente
     const periods = mainData.meta.available_periods;
@@ -549,6 +561,10 @@ function renderCoverageChart(mainData, periodId) {
     const startIndex = Math.max(0, selectedIdx - (numMonths - 1));
     const chartPeriods = periods.slice(startIndex, selectedIdx + 1);
 
+    // Cargar los meses de la ventana; los que no estén publicados se omiten abajo
+    await Promise.allSettled(chartPeriods.map(p => IpceData.loadPeriods(mainData, [p.id])));
+    if (coveragePeriodId !== periodId) return;
+
     const labels = [];
     const masaSalarialPctData = [];
     const municipiosPctData = [];
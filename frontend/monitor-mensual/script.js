@@ -1,5 +1,7 @@
 // Global state to hold fetched data
 let dashboardData = null;
+// Último período pedido: descarta renders de selecciones anteriores que terminan tarde
+let requestedPeriodId = null;
 
 // Global Chart.js Legend Click Override - "Solo" Behavior
 const customLegendClick = function (e, legendItem, legend) {
@@ -103,8 +105,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const basePath = new URL('.', window.location.href).pathname === '/' ? '/' : new URL('..', window.location.href).pathname;
 
-    fetch('../../data/_data_ipce_v1.json')
-        .then(response => response.json())
+    IpceData.loadIndex()
         .then(data => {
             dashboardData = data;
             initMonthSelector(data.meta.available_periods);
@@ -165,8 +166,16 @@ function initMonthSelector(periods) {
     const initialOption = selector.selectedOptions[0];
 }
 
-function renderDashboard(periodId) {
-    if (!dashboardData || !dashboardData.data[periodId]) return;
+async function renderDashboard(periodId) {
+    if (!dashboardData) return;
+    requestedPeriodId = periodId;
+    try {
+        await IpceData.loadPeriods(dashboardData, [periodId]);
+    } catch (error) {
+        console.error('Error loading data:', error);
+        return;
+    }
+    if (requestedPeriodId !== periodId || !dashboardData.data[periodId]) return;
 
     const periodData = dashboardData.data[periodId];
 
@@ -1092,7 +1101,7 @@ function renderBrechaChart(dataCopa, monthName, currentYear) {
 let chartCopaRealInstance = null;
 let chartMasaRealInstance = null;
 
-function renderRealEvolutionCharts(periodId) {
+async function renderRealEvolutionCharts(periodId) {
     if (!dashboardData || !dashboardData.meta.available_periods) return;
 
     const periods = dashboardData.meta.available_periods;
@@ -1103,6 +1112,10 @@ function renderRealEvolutionCharts(periodId) {
     const startIndex = Math.max(0, selectedIdx - 2);
     const chartPeriods = periods.slice(startIndex, selectedIdx + 1);
 
+    // Períodos que no estén publicados se omiten abajo
+    await Promise.allSettled(chartPeriods.map(p => IpceData.loadPeriods(dashboardData, [p.id])));
+    if (requestedPeriodId !== periodId) return;
+
     // Update subtitles to 'Últimos 3 meses'
     const subCopa = document.querySelector('#chartCopaRealEvol').closest('.chart-container').querySelector('.section-subtitle');
     if (subCopa) subCopa.textContent = `Evolución últimos 3 meses (Pesos constantes)`;
@@ -1,26 +1,18 @@
 import os
-import psycopg2
-from dotenv import load_dotenv
+import sys
 
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-load_dotenv(dotenv_path)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+from db import pg_connection
 
 def inspect_columns(table_name):
     print(f"Inspecting columns for {table_name}...")
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('PG_HOST'),
-            port=os.getenv('PG_PORT'),
-            user=os.getenv('PG_USER'),
-            password=os.getenv('PG_PASSWORD'),
-            database=os.getenv('PG_DATABASE')
-        )
-        cur = conn.cursor()
-        cur.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table_name}';")
-        cols = cur.fetchall()
-        for c in cols:
-            print(f"- {c[0]} ({c[1]})")
-        conn.close()
+        with pg_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table_name}';")
+            cols = cur.fetchall()
+            for c in cols:
+                print(f"- {c[0]} ({c[1]})")
     except Exception as e:
         print(f"Error: {e}")
 